@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+# Measures the overhead that prpy.bind adds to attribute access on bound
+# OpenRAVE objects, e.g. robot.GetActiveDOFValues() on a PrPy robot.
+
+# Copyright (c) 2016, Carnegie Mellon University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# - Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# - Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# - Neither the name of Carnegie Mellon University nor the names of its
+#   contributors may be used to endorse or promote products derived from this
+#   software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import print_function
+import argparse
+import timeit
+import openravepy
+from prpy.bind import InstanceDeduplicator, bind_subclass
+
+
+class BoundRobot(openravepy.Robot):
+    def __init__(self):
+        pass
+
+
+def baseline_get_canonical(instance):
+    """
+    Exception-based lookup used by InstanceDeduplicator.get_canonical before
+    the fast path was added.
+    """
+    cls = InstanceDeduplicator
+
+    # Try looking for a cached value on the object.
+    try:
+        canonical_instance = object.__getattribute__(
+            instance, cls.ATTRIBUTE_CANONICAL)
+    # If it's not available, fall back on doing the full lookup.
+    except AttributeError:
+        try:
+            object.__getattribute__(instance, cls.ATTRIBUTE_IS_CANONICAL)
+            canonical_instance = instance
+        except AttributeError:
+            userdata_getter, _ = cls.get_storage_methods(instance)
+            try:
+                canonical_instance = userdata_getter(cls.USERDATA_CANONICAL)
+
+                # ...and cache the value for future queries.
+                if canonical_instance is instance:
+                    object.__setattr__(
+                        instance, cls.ATTRIBUTE_IS_CANONICAL, True)
+                else:
+                    object.__setattr__(
+                        instance, cls.ATTRIBUTE_CANONICAL, canonical_instance)
+            except KeyError:
+                canonical_instance = None
+
+    return canonical_instance
+
+
+def baseline_intercept(self, name):
+    """
+    InstanceDeduplicator.intercept before the fast path was added.
+    """
+    canonical_instance = baseline_get_canonical(self)
+
+    # Objects without a canonical instance take the same (slow) clone lookup
+    # as before. The bound objects benchmarked below never reach it.
+    if canonical_instance is None:
+        canonical_instance = InstanceDeduplicator.resolve_canonical(self)
+
+    try:
+        return object.__getattribute__(canonical_instance, name)
+    except AttributeError:
+        if hasattr(canonical_instance, '__getattr__'):
+            return canonical_instance.__getattr__(name)
+        else:
+            raise
+
+
+def benchmark(label, robot, number, baseline=None):
+    seconds = timeit.timeit(lambda: robot.GetActiveDOFValues(),
+                            number=number)
+    per_call = 1e6 * seconds / number
+
+    if baseline is None:
+        print('{:32s} {:8.3f} us/call'.format(label, per_call))
+    else:
+        print('{:32s} {:8.3f} us/call ({:+.3f} us overhead)'.format(
+            label, per_call, per_call - baseline))
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark attribute access on bound OpenRAVE objects.')
+    parser.add_argument('--env', default='wamtest1.env.xml',
+                        help='OpenRAVE environment to load')
+    parser.add_argument('--number', type=int, default=100000,
+                        help='number of calls to time')
+    args = parser.parse_args()
+
+    openravepy.RaveInitialize(True)
+    openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+    env = openravepy.Environment()
+    try:
+        env.Load(args.env)
+        robot = env.GetRobots()[0]
+        unbound = env.GetRobots()[0]
+
+        with env:
+            baseline = benchmark('unbound', unbound, args.number)
+
+            bind_subclass(robot, BoundRobot)
+            wrapper = env.GetRobot(robot.GetName())
+
+            benchmark('canonical instance', robot, args.number, baseline)
+            benchmark('other wrapper', wrapper, args.number, baseline)
+
+            # Swap in the interceptor from before the fast path to measure
+            # the previous overhead. bind_subclass installs the interceptor on
+            # openravepy.Robot, which BoundRobot inherits.
+            openravepy.Robot.__getattribute__ = baseline_intercept
+            try:
+                benchmark('canonical instance (baseline)', robot,
+                          args.number, baseline)
+                benchmark('other wrapper (baseline)', wrapper,
+                          args.number, baseline)
+            finally:
+                openravepy.Robot.__getattribute__ = \
+                    InstanceDeduplicator.intercept
+    finally:
+        env.Destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -30,6 +30,6 @@
 
 import base, dependency_manager, logger, ik_ranking, planning, perception, simulation, tsr, viz
 from named_config import ConfigurationLibrary
-from clone import Clone, Cloned
+from clone import Clone, ClonePool, Cloned
 from bind import bind_subclass
 import compatibility
\ No newline at end of file
@@ -29,7 +29,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 import collections
 import functools, logging, openravepy, numpy
-from .. import bind, named_config, exceptions, util
+from .. import bind, futures, metrics, named_config, exceptions, util
 from ..clone import Clone, Cloned
 from tsr.tsrlibrary import TSRLibrary
 from ..planning.base import Sequence, Tags
@@ -144,6 +144,20 @@ class Robot(openravepy.Robot):
             def wrapper_method(*args, **kw_args):
                 return delegate_method(canonical, *args, **kw_args)
             return wrapper_method
+        elif name.endswith('Async') and len(name) > len('Async'):
+            # Expose an asyncio-compatible variant of every method, e.g.
+            # robot.PlanToConfigurationAsync(goal) runs PlanToConfiguration
+            # on the default executor and returns an awaitable future.
+            # Cancelling that future cancels the planning call.
+            delegate_method = getattr(canonical, name[:-len('Async')])
+
+            @functools.wraps(delegate_method)
+            def wrapper_method(*args, **kw_args):
+                executor = kw_args.pop('executor', None)
+                loop = kw_args.pop('loop', None)
+                return futures.run_async(delegate_method, args, kw_args,
+                                         executor=executor, loop=loop)
+            return wrapper_method
 
         raise AttributeError('{0:s} is missing method "{1:s}".'
                              .format(repr(canonical), name))
@@ -498,12 +512,14 @@ class Robot(openravepy.Robot):
         # Get the limits that pertain to this trajectory
         all_velocity_limits = self.GetDOFVelocityLimits()
         traj_indices = util.GetTrajectoryIndices(traj)
-        velocity_limits = [all_velocity_limits[idx] for idx in traj_indices]
+        velocity_limits = numpy.array(
+            [all_velocity_limits[idx] for idx in traj_indices])
 
         # Get the velocity group from the configuration specification so
         #  that we know the offset and number of dofs
         config_spec = traj.GetConfigurationSpecification()
-        num_waypoints = traj.GetNumWaypoints()
+        waypoints = util.GetWaypointArray(traj)
+        num_waypoints = waypoints.shape[0]
 
         # Check for the velocity group
         has_velocity_group = True
@@ -513,44 +529,53 @@ class Robot(openravepy.Robot):
             logging.warn('Trajectory does not have joint velocities defined')
             has_velocity_group = False
 
-        # Now check all the waypoints
-        for idx in range(0, num_waypoints):
-
-            wpt = traj.GetWaypoint(idx)
-
-            if has_velocity_group:
-                # First check the velocities defined for the waypoint
-                velocities = config_spec.ExtractJointValues(wpt, self, traj_indices, 1)
-                for vidx in range(len(velocities)):
-                    if (velocities[vidx] > velocity_limits[vidx]):
-                        logging.warn('Velocity for waypoint %d joint %d violates limits (value: %0.3f, limit: %0.3f)' % 
-                                     (idx, vidx, velocities[vidx], velocity_limits[vidx]))
-                        return True
-
-            # Now check the velocities calculated by differencing positions
-            dt = config_spec.ExtractDeltaTime(wpt)
-            values = config_spec.ExtractJointValues(wpt, self, traj_indices, 0)
-
-            if idx > 0:
-                diff_velocities = numpy.fabs(values - prev_values)/(dt - prev_dt)
-                for vidx in range(len(diff_velocities)):
-                    if (diff_velocities[vidx] > velocity_limits[vidx]):
-                        logging.warn('Velocity for waypoint %d joint %d violates limits (value: %0.3f, limit: %0.3f)' % 
-                                     (idx, vidx, diff_velocities[vidx], velocity_limits[vidx]))
-                        return True
-
-            # Set current to previous
-            prev_dt = dt
-            prev_values = values
-
-        return False
+        # Check the velocities defined for each waypoint and the velocities
+        # calculated by differencing positions. The first violation along
+        # the trajectory is reported.
+        violations = []
+
+        if has_velocity_group:
+            velocities = util.ExtractJointValuesArray(
+                config_spec, waypoints, self, traj_indices, 1)
+            violations.append((velocities, 0, velocities > velocity_limits))
+
+        if num_waypoints > 1:
+            deltatime_group = config_spec.GetGroupFromName('deltatime')
+            dt = waypoints[:, deltatime_group.offset]
+            values = util.ExtractJointValuesArray(
+                config_spec, waypoints, self, traj_indices, 0)
+
+            # Differences are stored at the index of the second waypoint.
+            diff_velocities = numpy.zeros(values.shape)
+            diff_velocities[1:] = (numpy.fabs(numpy.diff(values, axis=0))
+                                   / numpy.diff(dt)[:, numpy.newaxis])
+            diff_violations = diff_velocities > velocity_limits
+            diff_violations[0] = False
+            violations.append((diff_velocities, 1, diff_violations))
+
+        first_violation = None
+        for values, order, violated in violations:
+            if violated.any():
+                idx, vidx = numpy.argwhere(violated)[0]
+                candidate = (idx, order, vidx, values[idx, vidx])
+                if first_violation is None or candidate < first_violation:
+                    first_violation = candidate
+
+        if first_violation is None:
+            return False
+
+        idx, _, vidx, value = first_violation
+        logging.warn('Velocity for waypoint %d joint %d violates limits (value: %0.3f, limit: %0.3f)' %
+                     (idx, vidx, value, velocity_limits[vidx]))
+        return True
 
     def _PlanWrapper(self, planning_method, args, kw_args):
         config_spec = self.GetActiveConfigurationSpecification('linear')
 
         # Call the planner.
         from ..util import Timer
-        with Timer() as timer:
+        with Timer() as timer, \
+                metrics.timed('robot', self.GetName(), planning_method.__name__):
             result = planning_method(self, *args, **kw_args)
         SetTrajectoryTags(result, {Tags.PLAN_TIME: timer.get_duration()}, append=True)
 
@@ -29,6 +29,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import logging
+import weakref
 from clone import CloneException
 
 logger = logging.getLogger(__name__)
@@ -43,12 +44,67 @@ class InstanceDeduplicator(object):
     USERDATA_CHILDREN = '__children__'
     USERDATA_DESTRUCTOR = '__destructor__'
     USERDATA_CANONICAL = 'canonical_instance'
+    USERDATA_REFERRERS = '__referrers__'
     ATTRIBUTE_CANONICAL = '_canonical_instance'
     ATTRIBUTE_IS_CANONICAL = '_is_canonical_instance'
+    ATTRIBUTE_CLONED_FROM = '_cloned_from'
     KINBODY_TYPE, LINK_TYPE, JOINT_TYPE, MANIPULATOR_TYPE = range(4)
 
+    # Only attributes of bound objects are tracked by track_reference. Set
+    # this to True to also scan the heap for other references to the bound
+    # objects of a removed body (e.g. from lists, dicts, or objects that are
+    # not bound). This is slow, since it scans the whole heap once for every
+    # bound object.
+    clear_untracked_referrers = False
+
     @staticmethod
     def intercept(self, name):
+        # Fast path: use the canonical instance cached by get_canonical. Read
+        # __dict__ directly since raising an AttributeError on every attribute
+        # access is expensive.
+        instance_dict = object.__getattribute__(self, '__dict__')
+
+        if InstanceDeduplicator.ATTRIBUTE_IS_CANONICAL in instance_dict:
+            canonical_instance = self
+        else:
+            canonical_instance = instance_dict.get(
+                InstanceDeduplicator.ATTRIBUTE_CANONICAL)
+
+            if canonical_instance is None:
+                canonical_instance = InstanceDeduplicator.resolve_canonical(
+                    self)
+
+        try:
+            return object.__getattribute__(canonical_instance, name)
+        except AttributeError:
+            # We have to manually call __getattr__ in case it is overriden in
+            # the canonical_instance's class or one of its superclasses. This
+            # is not handled by the recursive call to __getattribute__ because
+            # we explicitly invoke it on object.
+            if hasattr(canonical_instance, '__getattr__'):
+                return canonical_instance.__getattr__(name)
+            else:
+                raise
+
+    @staticmethod
+    def intercept_setattr(self, name, value):
+        object.__setattr__(self, name, value)
+
+        # Clone parents are cleared when the clone is destroyed.
+        if name != 'clone_parent':
+            InstanceDeduplicator.track_reference(self, name, value)
+
+    @staticmethod
+    def resolve_canonical(self):
+        """
+        Find the canonical instance of an object without a cached one.
+
+        If the object has no canonical instance, but is the clone of an object
+        that does, then CloneBindings is called to create one.
+
+        @param self object to resolve
+        @return canonical instance, or self if there is none
+        """
         canonical_instance = InstanceDeduplicator.get_canonical(self)
 
         # This object has no canonical instance. However, it may be the clone
@@ -94,6 +150,14 @@ class InstanceDeduplicator(object):
                     clone_method(canonical_parent)
                     canonical_class.__getattribute__ = InstanceDeduplicator.intercept
 
+                    # Remember what the bindings were cloned from, so
+                    # has_stale_bindings can tell when they are out of date.
+                    parent_dict = object.__getattribute__(
+                        canonical_parent, '__dict__')
+                    object.__setattr__(
+                        child, InstanceDeduplicator.ATTRIBUTE_CLONED_FROM,
+                        (weakref.ref(canonical_parent), dict(parent_dict)))
+
                 canonical_parent = canonical_child
 
             # Update our canonical instance in case we were able to clone a
@@ -103,49 +167,143 @@ class InstanceDeduplicator(object):
         if canonical_instance is None:
             canonical_instance = self
 
-        try:
-            return object.__getattribute__(canonical_instance, name)
-        except AttributeError:
-            # We have to manually call __getattr__ in case it is overriden in
-            # the canonical_instance's class or one of its superclasses. This
-            # is not handled by the recursive call to __getattribute__ because
-            # we explicitly invoke it on object.
-            if hasattr(canonical_instance, '__getattr__'):
-                return canonical_instance.__getattr__(name)
-            else:
-                raise
+        return canonical_instance
 
     @classmethod
     def get_canonical(cls, instance):
         # Try looking for a cached value on the object.
-        try:
-            canonical_instance = object.__getattribute__(instance, cls.ATTRIBUTE_CANONICAL)
-        # If it's not available, fall back on doing the full lookup not
-        # available, fall back on doing the full lookup
-        except AttributeError:
+        instance_dict = object.__getattribute__(instance, '__dict__')
+
+        if cls.ATTRIBUTE_IS_CANONICAL in instance_dict:
+            return instance
+
+        canonical_instance = instance_dict.get(cls.ATTRIBUTE_CANONICAL)
+
+        # If it's not available, fall back on doing the full lookup.
+        if canonical_instance is None:
+            userdata_getter, userdata_setter = cls.get_storage_methods(instance)
             try:
-                is_canonical_instance = object.__getattribute__(instance, cls.ATTRIBUTE_IS_CANONICAL)
-                canonical_instance = instance
-            except AttributeError:
-                userdata_getter, userdata_setter = cls.get_storage_methods(instance)
-                try:
-                    canonical_instance = userdata_getter(cls.USERDATA_CANONICAL)
+                canonical_instance = userdata_getter(cls.USERDATA_CANONICAL)
 
-                    # ...and cache the value for future queries.
-                    if canonical_instance is instance:
-                        object.__setattr__(instance, cls.ATTRIBUTE_IS_CANONICAL, True)
-                    else:
-                        object.__setattr__(instance, cls.ATTRIBUTE_CANONICAL, canonical_instance)
-                except KeyError:
-                    canonical_instance = None
+                # ...and cache the value for future queries.
+                if canonical_instance is instance:
+                    object.__setattr__(instance, cls.ATTRIBUTE_IS_CANONICAL, True)
+                else:
+                    object.__setattr__(instance, cls.ATTRIBUTE_CANONICAL, canonical_instance)
+            except KeyError:
+                canonical_instance = None
 
         return canonical_instance
 
+    @classmethod
+    def has_stale_bindings(cls, instance, parent):
+        """
+        Check whether the bindings of a clone are out of date.
+
+        Bindings are out of date if the canonical instance of parent was
+        replaced or any of its attributes were set or deleted since
+        CloneBindings was called. Objects that were modified in place are not
+        detected.
+
+        @param instance cloned object
+        @param parent clone parent of instance
+        @return True if instance has bindings that are out of date
+        """
+        canonical_instance = cls.get_canonical(instance)
+        if canonical_instance is None:
+            return False
+
+        instance_dict = object.__getattribute__(canonical_instance, '__dict__')
+        cloned_from = instance_dict.get(cls.ATTRIBUTE_CLONED_FROM)
+        if cloned_from is None:
+            return True
+
+        canonical_parent_ref, parent_dict = cloned_from
+        canonical_parent = cls.get_canonical(parent)
+        if (canonical_parent is None
+                or canonical_parent is not canonical_parent_ref()):
+            return True
+
+        current_dict = object.__getattribute__(canonical_parent, '__dict__')
+        if len(current_dict) != len(parent_dict):
+            return True
+
+        missing = object()
+        return any(current_dict.get(name, missing) is not value
+                   for name, value in parent_dict.iteritems())
+
     @classmethod
     def add_canonical(cls, instance):
         _, userdata_setter = cls.get_storage_methods(instance)
         userdata_setter(cls.USERDATA_CANONICAL, instance)
+        object.__setattr__(instance, cls.ATTRIBUTE_IS_CANONICAL, True)
         instance.__class__.__getattribute__ = cls.intercept
+        instance.__class__.__setattr__ = cls.intercept_setattr
+
+    @classmethod
+    def track_reference(cls, referrer, name, value):
+        """
+        Record that the attribute name of referrer refers to value.
+
+        If value is an OpenRAVE object, then a weak reference to referrer is
+        stored with the KinBody that owns value. The attribute is deleted when
+        that KinBody is removed from its environment, which breaks reference
+        cycles that pass through Boost.Python without scanning the heap.
+
+        Only attributes of bound objects are tracked. References that are
+        stored elsewhere, e.g. in a list or by an object that is not bound,
+        are not cleared unless clear_untracked_referrers is True.
+
+        @param referrer object whose attribute was set
+        @param name name of the attribute
+        @param value new value of the attribute
+        """
+        owner = cls.get_owner(value)
+        if owner is None:
+            return
+
+        # Only bodies in environments with bindings are cleaned up.
+        user_data = object.__getattribute__(owner, 'GetEnv')().GetUserData()
+        if not isinstance(user_data, dict):
+            return
+
+        owner_key = (cls.USERDATA_PREFIX, cls.KINBODY_TYPE,
+                     object.__getattribute__(owner, 'GetName')())
+        owner_dict = user_data.setdefault(owner_key, dict())
+        owner_dict.setdefault(cls.USERDATA_CHILDREN, set()).add(owner_key)
+        references = owner_dict.setdefault(cls.USERDATA_REFERRERS, set())
+
+        # The reference removes itself once the referrer is garbage collected.
+        # Overwritten attributes are checked for in cleanup_callback.
+        try:
+            referrer_ref = weakref.ref(
+                referrer, lambda ref: references.discard((ref, name)))
+            references.add((referrer_ref, name))
+        except TypeError:
+            logger.debug('Unable to track reference from %s.', referrer)
+
+    @classmethod
+    def get_owner(cls, value):
+        """
+        Return the KinBody that owns an OpenRAVE object.
+
+        @param value any object
+        @return owning KinBody, or None if value is not a KinBody, link,
+                joint, or manipulator
+        """
+        import openravepy
+
+        if isinstance(value, openravepy.KinBody):
+            owner = value
+        elif isinstance(value, (openravepy.KinBody.Link,
+                                openravepy.KinBody.Joint)):
+            owner = object.__getattribute__(value, 'GetParent')()
+        elif isinstance(value, openravepy.Robot.Manipulator):
+            owner = object.__getattribute__(value, 'GetRobot')()
+        else:
+            return None
+
+        return owner
 
     @classmethod
     def get_environment_id(cls, target, recurse=False):
@@ -202,21 +360,41 @@ class InstanceDeduplicator(object):
             # Remove any storage (e.g. canonical_instance) bound to
             # this object.
             children, canonical_instance = InstanceDeduplicator.get_bound_children(owner)
+            referrers = InstanceDeduplicator.get_referrers(owner)
             InstanceDeduplicator.remove_storage(owner)
 
             # Remove circular references that pass through Boost.Python.
-            # A normal iterator can't be used here because clear_referrers
-            # will delete the child from children causing elements to be
-            # skipped
-            while children:
-                child = children.pop()
+            # Clear the attributes bound to each child, then delete the
+            # tracked attributes of other objects that refer to this body.
+            # This is proportional to the number of bound objects, unlike
+            # clear_referrers, which scans the whole heap.
+            for child in children:
                 logger.debug(child)
-                clear_referrers(child)
-                # NOTE: this is also an acceptable body for the loop :)
-                # clear_referrers(children[0])
-            logger.debug(owner)
-            if canonical_instance != None:
-                clear_referrers(canonical_instance)
+                if child is not None:
+                    object.__getattribute__(child, '__dict__').clear()
+
+            for referrer_ref, name in referrers:
+                referrer = referrer_ref()
+                if referrer is None:
+                    continue
+
+                # The attribute may have been overwritten since it was set.
+                referrer_dict = object.__getattribute__(referrer, '__dict__')
+                value = referrer_dict.get(name)
+                if (value is not None
+                        and InstanceDeduplicator.get_owner(value) == owner):
+                    del referrer_dict[name]
+
+            # Optionally scan the heap for references that were not tracked.
+            # A normal iterator can't be used here because clear_referrers
+            # deletes the child from children.
+            if InstanceDeduplicator.clear_untracked_referrers:
+                while children:
+                    child = children.pop()
+                    if child is not None:
+                        clear_referrers(child)
+                if canonical_instance is not None:
+                    clear_referrers(canonical_instance)
 
     @classmethod
     def get_storage_methods(cls, target):
@@ -290,6 +468,16 @@ class InstanceDeduplicator(object):
                 canonical_instance = canonical_child
         return children, canonical_instance
 
+    @classmethod
+    def get_referrers(cls, owner):
+        env, _, owner_key = cls.get_environment_id(owner)
+        user_data = env.GetUserData()
+        if not isinstance(user_data, dict):
+            return []
+
+        return list(user_data.get(owner_key, dict()).get(
+            cls.USERDATA_REFERRERS, ()))
+
     @classmethod
     def remove_storage(cls, kinbody):
         env, owner, owner_key = cls.get_environment_id(kinbody)
@@ -28,8 +28,12 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import collections
+import multiprocessing
+import numpy
 import openravepy
 import threading
+from .util import ComputeEnabledAABB, ComputeReachAABB, GetGeometricState
 
 
 class CloneException(Exception):
@@ -41,7 +45,8 @@ class Clone(object):
 
     def __init__(self, parent_env, clone_env=None, destroy_on_exit=None,
                  lock=True, unlock=None,
-                 options=openravepy.CloningOptions.Bodies):
+                 options=openravepy.CloningOptions.Bodies,
+                 incremental=False, pool=None, region=None):
         """
         Context manager that clones the parent environment.
 
@@ -58,39 +63,95 @@ class Clone(object):
         passed if cloned_env.Unlock() is manually called inside the
         with-statement).
 
+        If incremental is True and clone_env was last cloned from parent_env
+        with the same options, then only the bodies whose state differs from
+        the parent are updated instead of re-cloning the whole environment.
+        The state of a body consists of its transform, DOF values, DOF limits,
+        velocity, acceleration, and torque limits, DOF weights and resolutions,
+        enabled links, active DOFs, and grabbed bodies. A full clone is
+        performed if a body was added, removed, or changed its kinematics.
+        Reused bodies keep their bindings unless the bindings of their parent
+        changed (see InstanceDeduplicator.has_stale_bindings). Stale bindings
+        are cleared, so CloneBindings is called again when they are next
+        accessed.
+
+        If pool is specified and clone_env is not, then the environment is
+        checked out of the ClonePool, synced incrementally, and checked back
+        into the pool on exit instead of being destroyed.
+
+        If region is specified, then only robots, the bodies they grab, and
+        bodies whose enabled AABB intersects region are cloned. Region may be
+        an AABB or a robot in parent_env, in which case the region is the
+        robot's reachable workspace (see util.ComputeReachAABB). Bodies with
+        no enabled links are always cloned.
+
         @param parent_env environment to clone
         @param clone_env environment to clone into (optional)
         @param destroy_on_exit whether to destroy the clone on __exit__
         @param lock locks cloned environment in a with-block, default is True
         @param unlock unlock the environment when exiting the with-block
         @param options bitmask of CloningOptions
+        @param incremental only update bodies that changed since the last clone
+        @param pool ClonePool to check clone_env out of (optional)
+        @param region AABB or robot that limits which bodies are cloned
         """
         self.clone_parent = parent_env
         self.options = options
+        self.region = region
 
         self.lock = lock
         self.unlock = unlock if unlock is not None else lock
 
+        self.pool = pool if clone_env is None else None
+
+        if self.pool is not None:
+            clone_env = self.pool.checkout(parent_env)
+            incremental = True
+
         self.clone_env = clone_env or openravepy.Environment()
         self.__class__.get_envs().append(self.clone_env)
 
-        if destroy_on_exit is not None:
+        if self.pool is not None:
+            self.destroy_on_exit = False
+        elif destroy_on_exit is not None:
             self.destroy_on_exit = destroy_on_exit
         else:
             # By default, only destroy the environment if we implicitly created
             # it. Otherwise, the user might expect it to still be around.
             self.destroy_on_exit = clone_env is None
 
+        try:
+            self._Clone(incremental)
+        except:
+            # Return the environment to the pool. The next checkout re-syncs
+            # whatever state was left behind.
+            if self.pool is not None:
+                self.__class__.get_envs().pop()
+                self.pool.checkin(self.clone_env)
+            raise
+
+    def _Clone(self, incremental):
         # Actually clone.
         with self.clone_env:
-            # Clear user-data. Otherwise, cloning into into the same target
-            # environment multiple times may not cause CloneBindings to get
-            # called again.
-            self.clone_env.SetUserData(None)
-
-            if self.clone_env != self.clone_parent:
+            stale_bodies = incremental and self._SyncIncremental()
+            synced = stale_bodies is not False
+
+            if synced:
+                # Clear the bindings that no longer match their parent, so
+                # CloneBindings is called again.
+                _ClearBindings(self.clone_env, stale_bodies)
+            else:
+                # Clear user-data. Otherwise, cloning into into the same target
+                # environment multiple times may not cause CloneBindings to get
+                # called again.
+                self.clone_env.SetUserData(None)
+
+            if not synced and self.clone_env != self.clone_parent:
                 with self.clone_parent:
-                    self.clone_env.Clone(self.clone_parent, self.options)
+                    if self.region is None:
+                        self.clone_env.Clone(self.clone_parent, self.options)
+                    else:
+                        self._ClonePartial()
 
                     # Due to a bug in the OpenRAVE clone API, we need to regrab
                     # objects in cloned environments because they might have
@@ -121,17 +182,11 @@ class Clone(object):
             # Required for InstanceDeduplicator to call CloneBindings for
             # PrPy-annotated classes.
             setattr(self.clone_env, 'clone_parent', self.clone_parent)
+            setattr(self.clone_env, 'clone_options', self.options)
 
-            # Set cloned parent on all bodies, manipulators and links
-            for body in parent_env.GetBodies():
-                cloned_body = Cloned(body, into=self.clone_env)
-
-                if body.IsRobot():
-                    for m in body.GetManipulators():
-                        Cloned(m, into=self.clone_env)
-
-                for link in body.GetLinks():
-                    Cloned(link, into=self.clone_env)
+            # Set cloned parent on all bodies, manipulators and links and
+            # build the lookup table used by Cloned.
+            _BuildClonedLookup(self.clone_parent, self.clone_env)
 
 
             # Convenience method to get references from Clone environment.
@@ -139,6 +194,128 @@ class Clone(object):
                 return Cloned(*instances, into=self.clone_env)
             setattr(self.clone_env, 'Cloned', ClonedWrapper)
 
+    def _SyncIncremental(self):
+        """
+        Update clone_env in place to match the parent environment.
+
+        @return list of cloned bodies whose bindings are stale if clone_env
+                was synced, False if a full clone is needed
+        """
+        clone_parent = getattr(self.clone_env, 'clone_parent', None)
+        if (clone_parent is None
+                or getattr(self.clone_env, 'clone_options', None)
+                != self.options
+                or openravepy.RaveGetEnvironmentId(clone_parent)
+                != openravepy.RaveGetEnvironmentId(self.clone_parent)
+                or self.clone_env == self.clone_parent):
+            return False
+
+        with self.clone_parent:
+            bodies = self._GetBodiesToClone()
+            cloned_bodies = dict((body.GetName(), body)
+                                 for body in self.clone_env.GetBodies())
+
+            if len(bodies) != len(cloned_bodies):
+                return False
+
+            # Match bodies by name. Fall back on a full clone if the set of
+            # bodies or their kinematics changed.
+            pairs = []
+            for body in bodies:
+                cloned_body = cloned_bodies.get(body.GetName())
+                if (cloned_body is None
+                        or cloned_body.IsRobot() != body.IsRobot()
+                        or cloned_body.GetKinematicsGeometryHash()
+                        != body.GetKinematicsGeometryHash()):
+                    return False
+                pairs.append((body, cloned_body))
+
+            # Release grabbed bodies that changed before moving anything. They
+            # are regrabbed once all of the bodies are in their new state.
+            regrab = []
+            for body, cloned_body in pairs:
+                if body.IsRobot() and (_GetGrabState(body)
+                                       != _GetGrabState(cloned_body)):
+                    cloned_body.ReleaseAllGrabbed()
+                    regrab.append((body, cloned_body))
+
+            for body, cloned_body in pairs:
+                _SyncBody(body, cloned_body)
+
+            # Grabbed bodies move with the robot that grabs them, so restore
+            # their transforms after all of the robots were updated.
+            for body, cloned_body in pairs:
+                if cloned_body.IsRobot():
+                    for grabbed in cloned_body.GetGrabbed():
+                        parent_grabbed = self.clone_parent.GetKinBody(
+                            grabbed.GetName())
+                        grabbed.SetTransform(parent_grabbed.GetTransform())
+
+            for robot, cloned_robot in regrab:
+                if len(robot.GetGrabbed()):
+                    if robot.CheckSelfCollision():
+                        raise CloneException(
+                            'Unable to compute self-collisions'
+                            ' correctly. Robot {:s} was cloned'
+                            ' while in collision.'
+                            .format(robot.GetName())
+                        )
+
+                    for grab_info in robot.GetGrabbedInfo():
+                        item_to_grab = self.clone_env.GetKinBody(
+                            grab_info._grabbedname)
+                        grablink = cloned_robot.GetLink(
+                            grab_info._robotlinkname)
+                        linkstoignore = grab_info._setRobotLinksToIgnore
+                        cloned_robot.Grab(item_to_grab, grablink=grablink,
+                                          linkstoignore=linkstoignore)
+
+            if not isinstance(self.clone_env.GetUserData(), dict):
+                return []
+
+            import prpy.bind
+            return [cloned_body for body, cloned_body in pairs
+                    if prpy.bind.InstanceDeduplicator.has_stale_bindings(
+                        cloned_body, body)]
+
+    def _GetBodiesToClone(self):
+        bodies = self.clone_parent.GetBodies()
+        if self.region is None:
+            return bodies
+
+        region = self.region
+        if isinstance(region, openravepy.Robot):
+            region = ComputeReachAABB(region)
+
+        grabbed_names = set(grabbed.GetName()
+                            for robot in self.clone_parent.GetRobots()
+                            for grabbed in robot.GetGrabbed())
+
+        selected = []
+        for body in bodies:
+            if (body.IsRobot()
+                    or body.GetName() in grabbed_names
+                    or _IntersectsAABB(ComputeEnabledAABB(body), region)):
+                selected.append(body)
+        return selected
+
+    def _ClonePartial(self):
+        """
+        Clone the bodies returned by _GetBodiesToClone into clone_env.
+        """
+        self.clone_env.Reset()
+
+        for body in self._GetBodiesToClone():
+            if body.IsRobot():
+                cloned_body = openravepy.RaveCreateRobot(
+                    self.clone_env, body.GetXMLId())
+            else:
+                cloned_body = openravepy.RaveCreateKinBody(
+                    self.clone_env, body.GetXMLId())
+
+            cloned_body.Clone(body, self.options)
+            self.clone_env.Add(cloned_body, False)
+
     def __enter__(self):
         if self.lock:
             self.clone_env.Lock()
@@ -154,21 +331,12 @@ class Clone(object):
         else:
             self.__class__.get_envs().pop()
 
+            if self.pool is not None:
+                self.pool.checkin(self.clone_env)
+
     def Destroy(self):
         self.__class__.get_envs().pop()
-
-        # Manually Remove() all objects from the environment. This forces
-        # OpenRAVE to call functions registered to RegisterBodyCallback.
-        # Otherwise, these functions are only called when the environment is
-        # destructed. This is too late for prpy.bind to cleanup circular
-        # references.
-        # TODO: Make this the default behavior in OpenRAVE.
-        for body in self.clone_env.GetBodies():
-            import prpy.bind
-            prpy.bind.InstanceDeduplicator.cleanup_callback(body, flag=0)
-
-        openravepy.Environment.Destroy(self.clone_env)
-        self.clone_env.SetUserData(None)
+        _DestroyEnvironment(self.clone_env)
 
     @classmethod
     def get_env(cls):
@@ -186,6 +354,341 @@ class Clone(object):
         return cls.local.environments
 
 
+class ClonePool(object):
+    def __init__(self, size=None, options=openravepy.CloningOptions.Bodies):
+        """
+        Pool of environments that are reused as clones of a parent environment.
+
+        Creating and destroying an OpenRAVE environment is expensive. A pool
+        keeps up to size idle environments per parent environment. Each one
+        was last cloned from that parent, so checking it out only requires an
+        incremental sync (see Clone). Environments that are checked in when
+        the pool is full, or whose parent environment was destroyed, are
+        destroyed. Idle environments of destroyed parents are destroyed the
+        next time the pool is used. Use the pool through Clone, e.g.:
+
+            with Clone(env, pool=pool) as cloned_env:
+                ...
+
+        This is safe to use from multiple threads; each concurrent Clone gets
+        its own environment.
+
+        @param size maximum number of idle environments per parent environment
+        @param options bitmask of CloningOptions used to warm environments
+        """
+        if size is None:
+            size = multiprocessing.cpu_count()
+        if size < 1:
+            raise ValueError('size must be positive.')
+
+        self.size = size
+        self.options = options
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def warm(self, parent_env, count=None):
+        """
+        Fill the pool with environments cloned from parent_env.
+
+        @param parent_env environment to clone
+        @param count number of environments to create, defaults to size
+        """
+        if count is None:
+            count = self.size
+
+        self._PruneDestroyed()
+
+        with self._lock:
+            missing = count - len(self._idle[self._GetKey(parent_env)])
+
+        for _ in xrange(missing):
+            clone_env = openravepy.Environment()
+            with Clone(parent_env, clone_env=clone_env, lock=False,
+                       options=self.options):
+                pass
+            self.checkin(clone_env)
+
+    def checkout(self, parent_env):
+        """
+        Take an idle environment out of the pool.
+
+        The returned environment was last cloned from parent_env if one was
+        available. Otherwise, a new, empty environment is created. Either way,
+        the caller is responsible for cloning parent_env into it.
+
+        @param parent_env environment that will be cloned
+        @return environment to clone into
+        """
+        self._PruneDestroyed()
+
+        with self._lock:
+            idle = self._idle.get(self._GetKey(parent_env))
+            if idle:
+                return idle.pop()
+
+        return openravepy.Environment()
+
+    def checkin(self, clone_env):
+        """
+        Return an environment to the pool.
+
+        @param clone_env environment returned by checkout
+        """
+        clone_parent = getattr(clone_env, 'clone_parent', None)
+        env_ids = self._PruneDestroyed()
+
+        with self._lock:
+            if (clone_parent is not None
+                    and self._GetKey(clone_parent) in env_ids):
+                idle = self._idle[self._GetKey(clone_parent)]
+                if len(idle) < self.size:
+                    idle.append(clone_env)
+                    return
+
+        _DestroyEnvironment(clone_env)
+
+    def clear(self, parent_env=None):
+        """
+        Destroy idle environments.
+
+        @param parent_env only destroy clones of this environment (optional)
+        """
+        with self._lock:
+            if parent_env is None:
+                envs = [env for idle in self._idle.itervalues()
+                        for env in idle]
+                self._idle.clear()
+            else:
+                envs = self._idle.pop(self._GetKey(parent_env), [])
+
+        for env in envs:
+            _DestroyEnvironment(env)
+
+    def _PruneDestroyed(self):
+        # Destroy the idle environments of parents that no longer exist.
+        # Environment IDs are not reused, so a new environment can not
+        # inherit them.
+        env_ids = set(openravepy.RaveGetEnvironmentId(env)
+                      for env in openravepy.RaveGetEnvironments())
+
+        with self._lock:
+            envs = []
+            for key in self._idle.keys():
+                if key not in env_ids:
+                    envs.extend(self._idle.pop(key))
+
+        for env in envs:
+            _DestroyEnvironment(env)
+
+        return env_ids
+
+    @staticmethod
+    def _GetKey(parent_env):
+        return openravepy.RaveGetEnvironmentId(parent_env)
+
+
+_default_clone_pool = None
+_default_clone_pool_lock = threading.Lock()
+
+
+def get_default_clone_pool():
+    """
+    Return a process-wide ClonePool shared by PrPy.
+
+    The pool is created on first use and keeps one idle environment per CPU
+    for each parent environment.
+
+    @return the shared ClonePool
+    """
+    global _default_clone_pool
+
+    with _default_clone_pool_lock:
+        if _default_clone_pool is None:
+            _default_clone_pool = ClonePool()
+        return _default_clone_pool
+
+
+def _DestroyEnvironment(env):
+    # Manually Remove() all objects from the environment. This forces
+    # OpenRAVE to call functions registered to RegisterBodyCallback.
+    # Otherwise, these functions are only called when the environment is
+    # destructed. This is too late for prpy.bind to cleanup circular
+    # references.
+    # TODO: Make this the default behavior in OpenRAVE.
+    for body in env.GetBodies():
+        import prpy.bind
+        prpy.bind.InstanceDeduplicator.cleanup_callback(body, flag=0)
+
+    openravepy.Environment.Destroy(env)
+    env.SetUserData(None)
+
+
+def _ClearBindings(env, bodies):
+    # Clear the bindings of bodies in the environment, as if they were removed
+    # from it (see _DestroyEnvironment).
+    if not bodies or not isinstance(env.GetUserData(), dict):
+        return
+
+    import prpy.bind
+    for body in bodies:
+        prpy.bind.InstanceDeduplicator.cleanup_callback(body, flag=0)
+
+
+def _IntersectsAABB(aabb, region):
+    extents = aabb.extents()
+
+    # Bodies without any enabled links have an empty AABB. Clone them anyway,
+    # since their links may be enabled in the cloned environment.
+    if not numpy.all(numpy.isfinite(extents)) or numpy.any(extents < 0.):
+        return True
+
+    return numpy.all(numpy.abs(aabb.pos() - region.pos())
+                     <= extents + region.extents())
+
+
+def _GetClonedKey(instance):
+    if isinstance(instance, openravepy.Robot):
+        return ('Robot', instance.GetName())
+    elif isinstance(instance, openravepy.KinBody):
+        return ('KinBody', instance.GetName())
+    elif isinstance(instance, openravepy.KinBody.Link):
+        return ('Link', instance.GetParent().GetName(), instance.GetName())
+    elif isinstance(instance, openravepy.Robot.Manipulator):
+        return ('Manipulator', instance.GetRobot().GetName(),
+                instance.GetName())
+    else:
+        return None
+
+
+def _BuildClonedLookup(parent_env, clone_env):
+    """
+    Build the table that Cloned uses to find instances in clone_env.
+
+    The table maps a key computed by _GetClonedKey for an instance in
+    parent_env to the corresponding instance in clone_env. Links and
+    manipulators are matched by index, since cloning preserves their order.
+    The table is cleared when a body is added to or removed from clone_env.
+    Environments without RegisterBodyCallback do not use a table.
+    """
+    if not hasattr(clone_env, 'RegisterBodyCallback'):
+        for body in parent_env.GetBodies():
+            # Bodies outside of the cloned region are missing.
+            if clone_env.GetKinBody(body.GetName()) is None:
+                continue
+
+            Cloned(body, into=clone_env)
+
+            if body.IsRobot():
+                for m in body.GetManipulators():
+                    Cloned(m, into=clone_env)
+
+            for link in body.GetLinks():
+                Cloned(link, into=clone_env)
+        return
+
+    lookup = getattr(clone_env, 'cloned_lookup', None)
+    if lookup is None:
+        lookup = dict()
+        handle = clone_env.RegisterBodyCallback(
+            lambda body, flag: lookup.clear())
+        setattr(clone_env, 'cloned_lookup', lookup)
+        setattr(clone_env, 'cloned_lookup_handle', handle)
+    else:
+        lookup.clear()
+
+    for body in parent_env.GetBodies():
+        name = body.GetName()
+
+        if body.IsRobot():
+            cloned_body = clone_env.GetRobot(name)
+        else:
+            cloned_body = clone_env.GetKinBody(name)
+
+        # Bodies outside of the cloned region are missing.
+        if cloned_body is None:
+            continue
+
+        cloned_body.clone_parent = body
+        lookup[('KinBody', name)] = cloned_body
+
+        if body.IsRobot():
+            lookup[('Robot', name)] = cloned_body
+
+            for m, cloned_m in zip(body.GetManipulators(),
+                                   cloned_body.GetManipulators()):
+                cloned_m.clone_parent = m
+                lookup[('Manipulator', name, m.GetName())] = cloned_m
+
+        for link, cloned_link in zip(body.GetLinks(),
+                                     cloned_body.GetLinks()):
+            cloned_link.clone_parent = link
+            lookup[('Link', name, link.GetName())] = cloned_link
+
+
+def _GetGrabState(robot):
+    return sorted((grab_info._grabbedname, grab_info._robotlinkname,
+                   tuple(sorted(grab_info._setRobotLinksToIgnore)))
+                  for grab_info in robot.GetGrabbedInfo())
+
+
+# Per-DOF properties that are copied by _SyncBody if they differ.
+_SYNCED_DOF_PROPERTIES = [
+    ('GetDOFVelocityLimits', 'SetDOFVelocityLimits'),
+    ('GetDOFAccelerationLimits', 'SetDOFAccelerationLimits'),
+    ('GetDOFTorqueLimits', 'SetDOFTorqueLimits'),
+    ('GetDOFWeights', 'SetDOFWeights'),
+    ('GetDOFResolutions', 'SetDOFResolutions'),
+]
+
+
+def _SyncBody(body, cloned_body):
+    """
+    Copy the state of body to cloned_body if the two differ.
+    """
+    # GetGeometricState compares transforms, DOF values, enabled links and
+    # grabbed bodies. Use a tight tolerance; this is a copy, not a cache key.
+    if (GetGeometricState(body, decimals=12)
+            != GetGeometricState(cloned_body, decimals=12)):
+        for link, cloned_link in zip(body.GetLinks(), cloned_body.GetLinks()):
+            if link.IsEnabled() != cloned_link.IsEnabled():
+                cloned_link.Enable(link.IsEnabled())
+
+        cloned_body.SetTransform(body.GetTransform())
+
+        if body.GetDOF() > 0:
+            cloned_body.SetDOFValues(
+                body.GetDOFValues(), range(body.GetDOF()),
+                openravepy.KinBody.CheckLimitsAction.Nothing)
+
+    if body.GetDOF() > 0:
+        lower, upper = body.GetDOFLimits()
+        cloned_lower, cloned_upper = cloned_body.GetDOFLimits()
+        if not ((lower == cloned_lower).all()
+                and (upper == cloned_upper).all()):
+            cloned_body.SetDOFLimits(lower, upper)
+
+        for getter_name, setter_name in _SYNCED_DOF_PROPERTIES:
+            value = getattr(body, getter_name)()
+            if not (value == getattr(cloned_body, getter_name)()).all():
+                getattr(cloned_body, setter_name)(value)
+
+    if body.IsRobot():
+        active_dof_indices = body.GetActiveDOFIndices()
+        affine_dofs = body.GetAffineDOF()
+        if (affine_dofs != cloned_body.GetAffineDOF()
+                or list(active_dof_indices)
+                != list(cloned_body.GetActiveDOFIndices())):
+            cloned_body.SetActiveDOFs(active_dof_indices, affine_dofs,
+                                      body.GetAffineRotationAxis())
+
+        manipulator = body.GetActiveManipulator()
+        if manipulator is not None:
+            cloned_manipulator = cloned_body.GetActiveManipulator()
+            if (cloned_manipulator is None
+                    or cloned_manipulator.GetName() != manipulator.GetName()):
+                cloned_body.SetActiveManipulator(manipulator.GetName())
+
+
 def Cloned(*instances, **kwargs):
     """
     Retrieve corresponding OpenRAVE object instances(s) in another environment.
@@ -205,6 +708,7 @@ def Cloned(*instances, **kwargs):
     """
     clone_env = kwargs.get('into') or Clone.get_env()
     clone_instances = list()
+    lookup = getattr(clone_env, 'cloned_lookup', None)
 
     for instance in instances:
         # Check if an instance is `NoneType`.
@@ -213,6 +717,16 @@ def Cloned(*instances, **kwargs):
             clone_instances.append(None)
             continue
 
+        # Use the lookup table built by Clone, if there is one.
+        if lookup:
+            key = _GetClonedKey(instance)
+            clone_instance = lookup.get(key)
+
+            if clone_instance is not None:
+                clone_instance.clone_parent = instance
+                clone_instances.append(clone_instance)
+                continue
+
         # Clone each instance based on its type.
         if isinstance(instance, openravepy.Robot):
             clone_instance = clone_env.GetRobot(instance.GetName())
@@ -26,18 +26,159 @@
 # CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
+import collections
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import numpy
 from openravepy import (
     CollisionOptions,
     CollisionOptionsStateSaver,
     CollisionReport,
+    KinBody,
     RaveCreateKinBody,
+    RaveFindDatabaseFile,
+    RaveGetEnvironmentId,
+    RaveGetEnvironments,
     openrave_exception,
   )
 from prpy.exceptions import PrPyException
 from prpy.planning.exceptions import (
     CollisionPlanningError,
+    PlanningError,
     SelfCollisionPlanningError,
 )
+from prpy.clone import Clone, Cloned, get_default_clone_pool
+from prpy.futures import get_default_executor
+from prpy.util import (
+    ComputeEnabledAABB,
+    GetCollisionCheckPts,
+    GetGeometricState,
+    GetLinearCollisionCheckSchedule,
+    IsTimedTrajectory,
+    SampleTimeGenerator,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _CheckCollisionBatch(robot, check_collision, configs, early_exit,
+                         dof_indices):
+    """
+    Collision check a batch of configurations of a robot.
+
+    The robot's state is saved once and restored after all configurations
+    are checked.
+
+    @param robot robot to set the configurations of
+    @param check_collision function that returns True on collision
+    @param configs list of configurations
+    @param early_exit stop checking after the first collision
+    @param dof_indices DOF indices of configs, defaults to the active DOFs
+    @return boolean array that is True for configurations in collision
+    """
+    in_collision = numpy.zeros(len(configs), dtype=bool)
+
+    if dof_indices is None:
+        set_values = robot.SetActiveDOFValues
+    else:
+        set_values = lambda q: robot.SetDOFValues(q, dof_indices)
+
+    with robot.CreateRobotStateSaver(
+            KinBody.SaveParameters.LinkTransformation):
+        for i, q in enumerate(configs):
+            set_values(q)
+
+            if check_collision():
+                in_collision[i] = True
+
+                if early_exit:
+                    in_collision[i + 1:] = True
+                    break
+
+    return in_collision
+
+
+def _ComputeFingerprint(robot, checker_name, collision_options, decimals):
+    """
+    Hash the state of the environment, ignoring the robot's active DOFs.
+
+    Bodies grabbed by the robot move with its active DOFs, so their
+    transforms relative to the grabbing link are hashed instead of their
+    world transforms.
+
+    @param robot robot whose active DOFs are ignored
+    @param checker_name name of the checker that the hash is used for
+    @param collision_options collision options of the checker
+    @param decimals decimals used to round the geometric state
+    @return hexadecimal MD5 digest
+    """
+    env = robot.GetEnv()
+    active_indices = set(robot.GetActiveDOFIndices())
+    ignore_transform = bool(robot.GetAffineDOF())
+    robot_name = robot.GetName()
+    states = []
+
+    grabbed_transforms = dict(
+        (grab_info._grabbedname, (
+            grab_info._robotlinkname,
+            tuple(numpy.round(grab_info._trelative, decimals).ravel().tolist())
+        ))
+        for grab_info in robot.GetGrabbedInfo())
+
+    for body in env.GetBodies():
+        state = GetGeometricState(body, decimals=decimals)
+
+        if body.GetName() == robot_name:
+            dof_values = tuple(
+                None if i in active_indices else value
+                for i, value in enumerate(state[3]))
+            transform = None if ignore_transform else state[2]
+            state = state[:2] + (transform, dof_values) + state[4:]
+        elif body.GetName() in grabbed_transforms:
+            state = (state[:2] + (grabbed_transforms[body.GetName()],)
+                     + state[3:])
+
+        states.append(state)
+
+    key = (
+        robot_name,
+        checker_name,
+        int(collision_options),
+        sorted(states),
+    )
+    return hashlib.md5(pickle.dumps(key, 2)).hexdigest()
+
+
+def _BakeRobot(robot, checker, kb_type):
+    """
+    Bake the environment and self collision checks of a robot.
+
+    The collision options of the checker must already be set.
+
+    @param robot robot to bake the checks of
+    @param checker collision checker that supports baking
+    @param kb_type KinBody type returned by 'BakeGetType'
+    @return baked KinBody
+    """
+    env = robot.GetEnv()
+
+    # This "bakes" the following Env and Self checks.
+    # (after the bake, the composite check is stored in the baked KinBody)
+    checker.SendCommand('BakeBegin')
+
+    env.CheckCollision(robot)
+    robot.CheckSelfCollision()
+
+    baked_kinbody = RaveCreateKinBody(env, kb_type)
+    if baked_kinbody is None:
+        raise PrPyException('Failed to create baked KinBody.')
+
+    checker.SendCommand('BakeEnd')
+
+    return baked_kinbody
 
 
 class SimpleRobotCollisionChecker(object):
@@ -87,6 +228,27 @@ class SimpleRobotCollisionChecker(object):
         elif self.robot.CheckSelfCollision(report=report):
             raise SelfCollisionPlanningError.FromReport(report)
 
+    def CheckCollisionBatch(self, configs, early_exit=True, dof_indices=None):
+        """
+        Check a list of configurations for collision.
+
+        If early_exit is True, then the configurations after the first
+        collision are not checked and are marked as in collision. The index
+        of the first collision is numpy.argmax(in_collision).
+
+        @param configs list of configurations
+        @param early_exit stop checking after the first collision
+        @param dof_indices DOF indices of configs, defaults to the active DOFs
+        @return boolean array that is True for configurations in collision
+        """
+        env_check = self.env.CheckCollision
+        self_check = self.robot.CheckSelfCollision
+        robot = self.robot
+
+        return _CheckCollisionBatch(
+            robot, lambda: env_check(robot) or self_check(),
+            configs, early_exit, dof_indices)
+
 
 class BakedRobotCollisionChecker(object):
     """RobotCollisionChecker which uses a baked collision interface.
@@ -133,18 +295,7 @@ class BakedRobotCollisionChecker(object):
         # TODO: How should we handle exceptions that are thrown below?
         self.collision_saver.__enter__()
 
-        # This "bakes" the following Env and Self checks.
-        # (after the bake, the composite check is stored in self.baked_kinbody)
-        self.checker.SendCommand('BakeBegin')
-
-        self.env.CheckCollision(self.robot)
-        self.robot.CheckSelfCollision()
-
-        self.baked_kinbody = RaveCreateKinBody(self.env, kb_type)
-        if self.baked_kinbody is None:
-            raise PrPyException('Failed to create baked KinBody.')
-
-        self.checker.SendCommand('BakeEnd')
+        self.baked_kinbody = _BakeRobot(self.robot, self.checker, kb_type)
 
         return self
 
@@ -172,6 +323,28 @@ class BakedRobotCollisionChecker(object):
         if self.CheckCollision(report=report):
             raise CollisionPlanningError.FromReport(report)
 
+    def CheckCollisionBatch(self, configs, early_exit=True, dof_indices=None):
+        """
+        Check a list of configurations for collision.
+
+        See SimpleRobotCollisionChecker.CheckCollisionBatch.
+
+        @param configs list of configurations
+        @param early_exit stop checking after the first collision
+        @param dof_indices DOF indices of configs, defaults to the active DOFs
+        @return boolean array that is True for configurations in collision
+        """
+        if self.baked_kinbody is None:
+            raise PrPyException(
+                'No baked KinBody is available. Did you call __enter__?')
+
+        check_self_collision = self.checker.CheckSelfCollision
+        baked_kinbody = self.baked_kinbody
+
+        return _CheckCollisionBatch(
+            self.robot, lambda: check_self_collision(baked_kinbody),
+            configs, early_exit, dof_indices)
+
 
 class SimpleRobotCollisionCheckerFactory(object):
     def __init__(self, collision_options=CollisionOptions.ActiveDOFs):
@@ -190,3 +363,1292 @@ class BakedRobotCollisionCheckerFactory(object):
 
 
 DefaultRobotCollisionCheckerFactory = SimpleRobotCollisionCheckerFactory()
+
+
+class DistanceCertificateRobotCollisionChecker(object):
+    """RobotCollisionChecker which skips configurations that are provably free.
+
+    When a configuration is checked and found collision-free, this checker
+    also computes a lower bound on the robot's clearance: the distance from
+    the robot to the rest of the environment and the distance between its
+    non-adjacent links. Each active DOF is assigned a Lipschitz bound on how
+    far any point of the robot can move per unit of joint motion. Every
+    configuration whose Lipschitz-weighted L1 distance to the checked
+    configuration is less than the clearance is certified collision-free and
+    is skipped by CheckCollisionBatch.
+
+    The clearance is queried from the environment's collision checker if it
+    supports CollisionOptions.Distance. Otherwise, it is computed by
+    approximating each link with its bounding sphere and each of the other
+    bodies with its AABB. Environment and self collision are certified
+    separately. Self collision is never certified by the sphere
+    approximation while the robot is grabbing an object.
+    """
+
+    DISTANCE_METHODS = ('auto', 'checker', 'spheres')
+
+    def __init__(self, robot, collision_options=CollisionOptions.ActiveDOFs,
+                 distance_method='auto', safety_margin=0.005):
+        """
+        @param robot robot to check
+        @param collision_options collision options used for all checks
+        @param distance_method 'checker', 'spheres', or 'auto' to use the
+                               collision checker's distance query if possible
+        @param safety_margin distance subtracted from every clearance
+        """
+        if distance_method not in self.DISTANCE_METHODS:
+            raise ValueError('Unknown distance method "{:s}".'.format(
+                distance_method))
+
+        self.robot = robot
+        self.env = robot.GetEnv()
+
+        self.checker = self.env.GetCollisionChecker()
+        if self.checker is None:
+            raise PrPyException('No collision checker found on environment')
+
+        self.distance_method = distance_method
+        self.safety_margin = safety_margin
+        self.use_checker_distance = None
+        self.num_checked = 0
+        self.num_certified = 0
+
+        self._collision_options = collision_options
+        self.collision_saver = None
+
+    @property
+    def collision_options(self):
+        return self._collision_options
+
+    def __enter__(self):
+        if self.collision_saver is not None:
+            raise PrPyException(
+                'Collision options are already saved. Did you call __enter__'
+                ' twice or forget to call __exit__?')
+
+        self.use_checker_distance = False
+
+        if self.distance_method != 'spheres':
+            try:
+                self.collision_saver = CollisionOptionsStateSaver(
+                    self.checker,
+                    self._collision_options | CollisionOptions.Distance)
+                self.collision_saver.__enter__()
+                self.use_checker_distance = True
+            except openrave_exception:
+                if self.distance_method == 'checker':
+                    raise PrPyException(
+                        'Collision checker does not support distance'
+                        ' queries.')
+
+        if not self.use_checker_distance:
+            self.collision_saver = CollisionOptionsStateSaver(
+                self.checker, self._collision_options)
+            self.collision_saver.__enter__()
+
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self.collision_saver is None:
+            raise PrPyException(
+                'No collision options are saved. Did you call __exit__'
+                ' without calling __enter__ first?')
+
+        self.collision_saver.__exit__(type, value, traceback)
+        self.collision_saver = None
+
+    def CheckCollision(self, report=None):
+        if self.env.CheckCollision(self.robot, report=report):
+            return True
+        elif self.robot.CheckSelfCollision(report=report):
+            return True
+        return False
+
+    def VerifyCollisionFree(self):
+        report = CollisionReport()
+        if self.env.CheckCollision(self.robot, report=report):
+            raise CollisionPlanningError.FromReport(report)
+        elif self.robot.CheckSelfCollision(report=report):
+            raise SelfCollisionPlanningError.FromReport(report)
+
+    def CheckCollisionBatch(self, configs, early_exit=True, dof_indices=None):
+        """
+        Check a list of configurations for collision.
+
+        See SimpleRobotCollisionChecker.CheckCollisionBatch. Configurations
+        that are certified collision-free by an earlier check are skipped.
+        Configurations that are close together should be passed in order
+        along the path to make the most of each certificate.
+
+        @param configs list of configurations
+        @param early_exit stop checking after the first collision
+        @param dof_indices DOF indices of configs, defaults to the active DOFs
+        @return boolean array that is True for configurations in collision
+        """
+        if self.collision_saver is None:
+            raise PrPyException(
+                'Collision options are not set. Did you call __enter__?')
+
+        robot = self.robot
+        in_collision = numpy.zeros(len(configs), dtype=bool)
+
+        # Lipschitz bounds are only computed for joints.
+        if dof_indices is None and robot.GetAffineDOF():
+            return _CheckCollisionBatch(
+                robot, self.CheckCollision, configs, early_exit, dof_indices)
+
+        if dof_indices is None:
+            dof_indices = robot.GetActiveDOFIndices()
+            set_values = robot.SetActiveDOFValues
+        else:
+            set_values = lambda q: robot.SetDOFValues(q, dof_indices)
+
+        with robot.CreateRobotStateSaver(
+                KinBody.SaveParameters.LinkTransformation):
+            spheres = self._GetLinkSpheres()
+            lipschitz = self._ComputeLipschitzBounds(spheres, dof_indices)
+            obstacles = None
+            self_pairs = None
+
+            if not self.use_checker_distance:
+                obstacles = self._GetObstacleAABBs()
+                moving = self._GetMovingSpheres(spheres, dof_indices)
+                if not robot.GetGrabbed():
+                    self_pairs = self._GetSelfCollisionPairs(
+                        spheres, dof_indices)
+
+            env_certificates = []
+            self_certificates = []
+
+            for i, q in enumerate(configs):
+                q = numpy.asarray(q, dtype=float)
+                check_env = not self._IsCertified(
+                    env_certificates, q, lipschitz)
+                check_self = not self._IsCertified(
+                    self_certificates, q, lipschitz)
+
+                if not check_env and not check_self:
+                    self.num_certified += 1
+                    continue
+
+                self.num_checked += 1
+                set_values(q)
+
+                env_clearance = None
+                self_clearance = None
+                colliding = False
+
+                if check_env:
+                    colliding, env_clearance = self._CheckEnvCollision()
+                if check_self and not colliding:
+                    colliding, self_clearance = self._CheckSelfCollision()
+
+                if colliding:
+                    in_collision[i] = True
+
+                    if early_exit:
+                        in_collision[i + 1:] = True
+                        break
+                    continue
+
+                if not self.use_checker_distance:
+                    centers = self._GetSphereCenters(spheres)
+                    if check_env:
+                        env_clearance = self._ComputeEnvClearance(
+                            spheres, centers, moving, obstacles)
+                    if check_self and self_pairs is not None:
+                        self_clearance = self._ComputeSelfClearance(
+                            spheres, centers, self_pairs)
+
+                if env_clearance is not None:
+                    self._AddCertificate(env_certificates, q, env_clearance)
+                if self_clearance is not None:
+                    # Both links may move towards each other.
+                    self._AddCertificate(
+                        self_certificates, q, self_clearance / 2.)
+
+        return in_collision
+
+    def _CheckEnvCollision(self):
+        report = CollisionReport()
+        if self.env.CheckCollision(self.robot, report=report):
+            return True, None
+        elif self.use_checker_distance:
+            return False, report.minDistance
+        else:
+            return False, None
+
+    def _CheckSelfCollision(self):
+        report = CollisionReport()
+        if self.robot.CheckSelfCollision(report=report):
+            return True, None
+        elif self.use_checker_distance:
+            return False, report.minDistance
+        else:
+            return False, None
+
+    def _AddCertificate(self, certificates, q, clearance):
+        radius = clearance - self.safety_margin
+        if radius > 0.:
+            certificates.append((q, radius))
+
+    def _IsCertified(self, certificates, q, lipschitz):
+        # Check the most recent certificates first.
+        for q_certified, radius in reversed(certificates):
+            if numpy.dot(lipschitz, numpy.abs(q - q_certified)) < radius:
+                return True
+        return False
+
+    def _GetJointIndices(self, dof_indices):
+        robot = self.robot
+        return set(robot.GetJointFromDOFIndex(dof_index).GetJointIndex()
+                   for dof_index in dof_indices)
+
+    def _GetLinkSpheres(self):
+        """
+        Compute a bounding sphere for each enabled link.
+
+        Grabbed bodies are included in the sphere of the link that grabs
+        them. The center of each sphere is stored in the link frame, so the
+        spheres are valid in any configuration.
+
+        @return list of (link, center in the link frame, radius)
+        """
+        robot = self.robot
+        links = [link for link in robot.GetLinks() if link.IsEnabled()]
+
+        grabbed_aabbs = collections.defaultdict(list)
+        for body in robot.GetGrabbed():
+            link = robot.IsGrabbing(body)
+            if link is not None:
+                grabbed_aabbs[link.GetIndex()].append(
+                    ComputeEnabledAABB(body))
+
+        spheres = []
+        for link in links:
+            aabbs = [link.ComputeAABB()] + grabbed_aabbs[link.GetIndex()]
+            min_corner = numpy.array([numpy.PINF] * 3)
+            max_corner = numpy.array([numpy.NINF] * 3)
+
+            for aabb in aabbs:
+                if numpy.all(numpy.isfinite(aabb.extents())):
+                    min_corner = numpy.minimum(
+                        min_corner, aabb.pos() - aabb.extents())
+                    max_corner = numpy.maximum(
+                        max_corner, aabb.pos() + aabb.extents())
+
+            if not numpy.all(min_corner <= max_corner):
+                continue
+
+            center = (min_corner + max_corner) / 2.
+            radius = numpy.linalg.norm(max_corner - center)
+
+            T_link = link.GetTransform()
+            center_link = numpy.dot(T_link[0:3, 0:3].T, center - T_link[0:3, 3])
+            spheres.append((link, center_link, radius))
+
+        return spheres
+
+    def _GetMovingSpheres(self, spheres, dof_indices):
+        # Links that do not move keep the collision state they had in the
+        # configuration that a certificate was computed in.
+        robot = self.robot
+        joint_indices = self._GetJointIndices(dof_indices)
+        return numpy.array([
+            any(robot.DoesAffect(joint_index, link.GetIndex())
+                for joint_index in joint_indices)
+            for link, _, _ in spheres], dtype=bool)
+
+    def _GetSphereCenters(self, spheres):
+        centers = numpy.zeros((len(spheres), 3))
+        for i, (link, center_link, _) in enumerate(spheres):
+            T_link = link.GetTransform()
+            centers[i, :] = numpy.dot(T_link[0:3, 0:3], center_link) \
+                + T_link[0:3, 3]
+        return centers
+
+    def _ComputeLipschitzBounds(self, spheres, dof_indices):
+        """
+        Bound how far any point of the robot moves per unit of joint motion.
+
+        For a revolute joint, this is the distance from the joint's anchor to
+        the farthest point of any link that it moves. The distance is bounded
+        by the sum of the distances between consecutive joint anchors along
+        the chain to that link, which does not depend on the configuration.
+        Prismatic joints along the chain add their range of motion. Joints
+        that are not revolute or prismatic, and mimic joints, are not
+        supported and disable certificates.
+
+        @param spheres bounding spheres returned by _GetLinkSpheres
+        @param dof_indices DOF indices to compute bounds for
+        @return array of Lipschitz bounds, one per DOF index
+        """
+        robot = self.robot
+        lipschitz = numpy.zeros(len(dof_indices))
+
+        joints = list(robot.GetJoints()) + list(robot.GetPassiveJoints())
+        if any(joint.IsMimic() for joint in joints):
+            lipschitz[:] = numpy.PINF
+            return lipschitz
+
+        for i, dof_index in enumerate(dof_indices):
+            joint = robot.GetJointFromDOFIndex(dof_index)
+            joint_index = joint.GetJointIndex()
+
+            if joint.GetDOF() != 1:
+                lipschitz[i] = numpy.PINF
+                continue
+            elif joint.IsPrismatic(0):
+                lipschitz[i] = 1.
+                continue
+            elif not joint.IsRevolute(0):
+                lipschitz[i] = numpy.PINF
+                continue
+
+            child_link = joint.GetHierarchyChildLink()
+
+            for link, center_link, radius in spheres:
+                if not robot.DoesAffect(joint_index, link.GetIndex()):
+                    continue
+
+                chain = robot.GetChain(child_link.GetIndex(), link.GetIndex(),
+                                       returnjoints=True)
+                points = [joint.GetAnchor()] \
+                    + [chain_joint.GetAnchor() for chain_joint in chain]
+
+                T_link = link.GetTransform()
+                points.append(numpy.dot(T_link[0:3, 0:3], center_link)
+                              + T_link[0:3, 3])
+
+                reach = radius + sum(
+                    numpy.linalg.norm(p2 - p1)
+                    for p1, p2 in zip(points[:-1], points[1:]))
+
+                for chain_joint in chain:
+                    if chain_joint.IsPrismatic(0):
+                        lower, upper = chain_joint.GetLimits()
+                        reach += numpy.max(upper - lower)
+
+                lipschitz[i] = max(lipschitz[i], reach)
+
+        return lipschitz
+
+    def _GetObstacleAABBs(self):
+        robot = self.robot
+        ignored = set([robot.GetName()])
+        ignored.update(body.GetName() for body in robot.GetGrabbed())
+
+        aabbs = []
+        for body in self.env.GetBodies():
+            if body.GetName() in ignored or not body.IsEnabled():
+                continue
+
+            aabb = ComputeEnabledAABB(body)
+            if numpy.all(numpy.isfinite(aabb.extents())):
+                aabbs.append(numpy.concatenate((aabb.pos(), aabb.extents())))
+
+        return numpy.array(aabbs).reshape((-1, 6))
+
+    def _GetSelfCollisionPairs(self, spheres, dof_indices):
+        robot = self.robot
+        joint_indices = self._GetJointIndices(dof_indices)
+
+        adjacent_options = KinBody.AdjacentOptions.Enabled
+        if self._collision_options & CollisionOptions.ActiveDOFs:
+            adjacent_options |= KinBody.AdjacentOptions.ActiveDOFs
+
+        sphere_indices = dict(
+            (link.GetIndex(), i) for i, (link, _, _) in enumerate(spheres))
+
+        pairs = []
+        for pair in robot.GetNonAdjacentLinks(adjacent_options):
+            link1, link2 = pair & 0xffff, pair >> 16
+
+            # Links without a sphere have no geometry to collide with.
+            if link1 not in sphere_indices or link2 not in sphere_indices:
+                continue
+
+            # Skip pairs of links that move rigidly together.
+            if all(robot.DoesAffect(joint_index, link1)
+                   == robot.DoesAffect(joint_index, link2)
+                   for joint_index in joint_indices):
+                continue
+
+            pairs.append((sphere_indices[link1], sphere_indices[link2]))
+
+        return numpy.array(pairs, dtype=int).reshape((-1, 2))
+
+    def _ComputeEnvClearance(self, spheres, centers, moving, obstacles):
+        if not moving.any() or len(obstacles) == 0:
+            return numpy.PINF
+
+        radii = numpy.array([radius for _, _, radius in spheres])[moving]
+        centers = centers[moving]
+
+        # Distance from each sphere center to each AABB.
+        offsets = numpy.abs(centers[:, numpy.newaxis, :]
+                            - obstacles[numpy.newaxis, :, 0:3])
+        offsets = numpy.maximum(offsets - obstacles[numpy.newaxis, :, 3:6], 0.)
+        distances = numpy.sqrt(numpy.sum(offsets ** 2, axis=2))
+
+        return numpy.min(distances - radii[:, numpy.newaxis])
+
+    def _ComputeSelfClearance(self, spheres, centers, pairs):
+        if len(pairs) == 0:
+            return numpy.PINF
+
+        radii = numpy.array([radius for _, _, radius in spheres])
+        distances = numpy.linalg.norm(
+            centers[pairs[:, 0]] - centers[pairs[:, 1]], axis=1)
+
+        return numpy.min(distances - radii[pairs[:, 0]] - radii[pairs[:, 1]])
+
+
+class DistanceCertificateRobotCollisionCheckerFactory(object):
+    def __init__(self, collision_options=CollisionOptions.ActiveDOFs,
+                 distance_method='auto', safety_margin=0.005):
+        self.collision_options = collision_options
+        self.distance_method = distance_method
+        self.safety_margin = safety_margin
+
+    def __call__(self, robot):
+        return DistanceCertificateRobotCollisionChecker(
+            robot, self.collision_options,
+            distance_method=self.distance_method,
+            safety_margin=self.safety_margin)
+
+
+class CachedRobotCollisionChecker(object):
+    """RobotCollisionChecker which memoizes the results of another checker.
+
+    This RobotCollisionChecker wraps a RobotCollisionChecker created by
+    another factory. Results are stored in the cache of the
+    CachedRobotCollisionCheckerFactory that created it, keyed on the robot's
+    DOF values quantized at DOF resolution and a fingerprint of the rest of
+    the environment. The fingerprint is computed by the first check after
+    __enter__. Only the robot's active DOFs may change while the checker is
+    entered. Robots with affine DOFs are not cached.
+    """
+
+    def __init__(self, robot, checker, factory):
+        self.robot = robot
+        self.env = robot.GetEnv()
+        self.inner_checker = checker
+        self.factory = factory
+        self.fingerprint = None
+
+    @property
+    def collision_options(self):
+        return self.inner_checker.collision_options
+
+    def __enter__(self):
+        self.inner_checker.__enter__()
+        self.fingerprint = None
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.fingerprint = None
+        return self.inner_checker.__exit__(type, value, traceback)
+
+    def CheckCollision(self, report=None):
+        # Reports must be filled in by the underlying checker.
+        if report is not None:
+            return self.inner_checker.CheckCollision(report=report)
+
+        key = self._GetKey(self.robot.GetActiveDOFValues(), None)
+        in_collision = self.factory.lookup(key)
+
+        if in_collision is None:
+            in_collision = bool(self.inner_checker.CheckCollision())
+            self.factory.store(key, in_collision)
+
+        return in_collision
+
+    def VerifyCollisionFree(self):
+        key = self._GetKey(self.robot.GetActiveDOFValues(), None)
+        in_collision = self.factory.lookup(key)
+
+        if in_collision is False:
+            return
+
+        # Let the underlying checker raise an exception that describes the
+        # collision. This also happens on a cache hit for a collision.
+        try:
+            self.inner_checker.VerifyCollisionFree()
+        except PlanningError:
+            self.factory.store(key, True)
+            raise
+
+        self.factory.store(key, False)
+
+    def CheckCollisionBatch(self, configs, early_exit=True, dof_indices=None):
+        """
+        Check a list of configurations for collision.
+
+        See SimpleRobotCollisionChecker.CheckCollisionBatch.
+
+        @param configs list of configurations
+        @param early_exit stop checking after the first collision
+        @param dof_indices DOF indices of configs, defaults to the active DOFs
+        @return boolean array that is True for configurations in collision
+        """
+        keys = [self._GetKey(q, dof_indices) for q in configs]
+        cached = [self.factory.lookup(key) for key in keys]
+        misses = [i for i, value in enumerate(cached) if value is None]
+
+        # Stop before checking configurations that follow a cached collision.
+        if early_exit and True in cached:
+            first_collision = cached.index(True)
+            misses = [i for i in misses if i < first_collision]
+
+        in_collision = numpy.array([bool(value) for value in cached])
+
+        if misses:
+            miss_collision = self.inner_checker.CheckCollisionBatch(
+                [configs[i] for i in misses], early_exit=early_exit,
+                dof_indices=dof_indices)
+
+            for i, colliding in zip(misses, miss_collision):
+                in_collision[i] = colliding
+                self.factory.store(keys[i], bool(colliding))
+
+                # Results after the first collision were not checked.
+                if colliding and early_exit:
+                    break
+
+        if early_exit and in_collision.any():
+            in_collision[numpy.argmax(in_collision):] = True
+
+        return in_collision
+
+    def _GetKey(self, q, dof_indices):
+        if self.fingerprint is None:
+            self.fingerprint = self._ComputeFingerprint()
+
+        # Affine DOFs do not have a resolution to quantize at.
+        if self.robot.GetAffineDOF():
+            return None
+
+        # The fingerprint ignores all active DOFs. Those that are not being
+        # checked keep their current values.
+        active_indices = self.robot.GetActiveDOFIndices()
+        if dof_indices is None:
+            dof_indices = active_indices
+        else:
+            dof_indices = list(dof_indices)
+            other_indices = [i for i in active_indices
+                             if i not in dof_indices]
+            if other_indices:
+                dof_indices = dof_indices + other_indices
+                q = numpy.concatenate((
+                    q, self.robot.GetDOFValues(other_indices)))
+
+        resolutions = self.robot.GetDOFResolutions()[dof_indices]
+
+        quantized = numpy.round(numpy.asarray(q) / resolutions).astype(int)
+        return (self.fingerprint, tuple(dof_indices),
+                tuple(quantized.tolist()))
+
+    def _ComputeFingerprint(self):
+        return _ComputeFingerprint(
+            self.robot, type(self.inner_checker).__name__,
+            self.collision_options, self.factory.decimals)
+
+
+class CachedRobotCollisionCheckerFactory(object):
+    def __init__(self, robot_checker_factory=None, max_size=100000,
+                 decimals=6):
+        """
+        Factory for checkers that memoize collision checking results.
+
+        The cache is shared by all checkers created by this factory and holds
+        at most max_size results. The least recently used result is evicted
+        when it is full. Configurations are quantized at DOF resolution.
+
+        @param robot_checker_factory factory of the checkers to memoize
+        @param max_size maximum number of cached results
+        @param decimals decimals used to round the environment fingerprint
+        """
+        if robot_checker_factory is None:
+            robot_checker_factory = DefaultRobotCollisionCheckerFactory
+        if max_size < 1:
+            raise ValueError('max_size must be positive.')
+
+        self.robot_checker_factory = robot_checker_factory
+        self.max_size = max_size
+        self.decimals = decimals
+
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.clear_statistics()
+
+    def __call__(self, robot):
+        return CachedRobotCollisionChecker(
+            robot, self.robot_checker_factory(robot), self)
+
+    def lookup(self, key):
+        if key is None:
+            return None
+
+        with self._lock:
+            value = self._cache.pop(key, None)
+            if value is None:
+                self.misses += 1
+            else:
+                self._cache[key] = value
+                self.hits += 1
+            return value
+
+    def store(self, key, in_collision):
+        if key is None:
+            return
+
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = in_collision
+
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def clear_statistics(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_statistics(self):
+        """
+        Get the cache counters.
+
+        @return dictionary of counters, hit rate and the current cache size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.,
+                'size': len(self._cache),
+            }
+
+
+class AutoRobotCollisionChecker(object):
+    """RobotCollisionChecker which bakes the collision check when it pays off.
+
+    Baking a collision check takes time up front and makes every following
+    check faster. This checker starts out checking collision through the
+    standard OpenRAVE interface and switches to a baked check once the
+    number of expected checks reaches the bake_threshold of the
+    AutoRobotCollisionCheckerFactory that created it. The number of expected
+    checks is the num_checks hint passed to the factory, the size of a
+    batch passed to CheckCollisionBatch, or the number of single checks
+    performed so far.
+
+    Baked KinBodies are stored by the factory and are reused by later
+    checkers of the same robot and collision checker until the environment
+    fingerprint changes.
+    Falls back to the standard interface if the collision checker does not
+    support baking.
+    """
+
+    def __init__(self, robot, factory, num_checks=None):
+        self.robot = robot
+        self.env = robot.GetEnv()
+        self.factory = factory
+        self.num_checks = num_checks
+
+        self.checker = self.env.GetCollisionChecker()
+        if self.checker is None:
+            raise PrPyException('No collision checker found on environment')
+
+        self.simple_checker = SimpleRobotCollisionChecker(
+            robot, factory.collision_options)
+        self.baked_kinbody = None
+        self.num_single_checks = 0
+        self.entered = False
+
+    @property
+    def collision_options(self):
+        return self.simple_checker.collision_options
+
+    @property
+    def is_baked(self):
+        return self.baked_kinbody is not None
+
+    def __enter__(self):
+        if self.entered:
+            raise PrPyException(
+                'Checker is already entered. Did you call __enter__ twice or'
+                ' forget to call __exit__?')
+
+        self.simple_checker.__enter__()
+        self.entered = True
+
+        if self.num_checks is not None:
+            self._MaybeBake(self.num_checks)
+
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if not self.entered:
+            raise PrPyException(
+                'Checker is not entered. Did you call __exit__ without'
+                ' calling __enter__ first?')
+
+        # The baked KinBody is owned by the factory.
+        self.baked_kinbody = None
+        self.entered = False
+        self.simple_checker.__exit__(type, value, traceback)
+
+    def CheckCollision(self, report=None):
+        self.num_single_checks += 1
+        self._MaybeBake(self.num_single_checks)
+
+        if self.baked_kinbody is not None:
+            return self.checker.CheckSelfCollision(self.baked_kinbody, report)
+        return self.simple_checker.CheckCollision(report=report)
+
+    def VerifyCollisionFree(self):
+        self.num_single_checks += 1
+        self._MaybeBake(self.num_single_checks)
+
+        if self.baked_kinbody is None:
+            return self.simple_checker.VerifyCollisionFree()
+
+        report = CollisionReport()
+        if self.checker.CheckSelfCollision(self.baked_kinbody, report):
+            # The baked check does not describe the collision; let the
+            # standard interface raise a more descriptive exception.
+            self.simple_checker.VerifyCollisionFree()
+            raise CollisionPlanningError.FromReport(report)
+
+    def CheckCollisionBatch(self, configs, early_exit=True, dof_indices=None):
+        """
+        Check a list of configurations for collision.
+
+        See SimpleRobotCollisionChecker.CheckCollisionBatch. The check is
+        baked if the batch is large enough.
+
+        @param configs list of configurations
+        @param early_exit stop checking after the first collision
+        @param dof_indices DOF indices of configs, defaults to the active DOFs
+        @return boolean array that is True for configurations in collision
+        """
+        self._MaybeBake(len(configs))
+
+        if self.baked_kinbody is None:
+            return self.simple_checker.CheckCollisionBatch(
+                configs, early_exit=early_exit, dof_indices=dof_indices)
+
+        check_self_collision = self.checker.CheckSelfCollision
+        baked_kinbody = self.baked_kinbody
+
+        return _CheckCollisionBatch(
+            self.robot, lambda: check_self_collision(baked_kinbody),
+            configs, early_exit, dof_indices)
+
+    def _MaybeBake(self, num_checks):
+        if not self.entered:
+            raise PrPyException(
+                'Checker is not entered. Did you call __enter__?')
+
+        if (self.baked_kinbody is None
+                and num_checks >= self.factory.bake_threshold):
+            self.baked_kinbody = self.factory.get_baked_kinbody(
+                self.robot, self.checker)
+
+
+class AutoRobotCollisionCheckerFactory(object):
+    def __init__(self, collision_options=CollisionOptions.ActiveDOFs,
+                 bake_threshold=100, decimals=6):
+        """
+        Factory for checkers that decide whether to bake collision checks.
+
+        The factory keeps the most recent baked KinBody of each robot and
+        reuses it for as long as the environment's collision checker and
+        fingerprint are unchanged. KinBodies of destroyed environments are
+        released the next time a KinBody is baked. Call clear() to release
+        all of them.
+
+        @param collision_options collision options used for all checks
+        @param bake_threshold number of expected checks to bake at
+        @param decimals decimals used to round the environment fingerprint
+        """
+        self.collision_options = collision_options
+        self.bake_threshold = bake_threshold
+        self.decimals = decimals
+
+        self._baked = {}
+        self._unsupported = set()
+        self._lock = threading.Lock()
+        self.clear_statistics()
+
+    def __call__(self, robot, num_checks=None):
+        """
+        Create a checker for a robot.
+
+        @param robot robot to check
+        @param num_checks expected number of checks, if known
+        @return AutoRobotCollisionChecker
+        """
+        return AutoRobotCollisionChecker(robot, self, num_checks=num_checks)
+
+    def get_baked_kinbody(self, robot, checker):
+        """
+        Get a baked KinBody for a robot, baking a new one if necessary.
+
+        The collision options must already be set on the checker.
+
+        @param robot robot to bake the checks of
+        @param checker collision checker of the robot's environment
+        @return baked KinBody, or None if the checker does not support baking
+        """
+        checker_name = checker.GetXMLId()
+
+        with self._lock:
+            if checker_name in self._unsupported:
+                return None
+
+        key = (
+            RaveGetEnvironmentId(robot.GetEnv()),
+            robot.GetName(),
+            tuple(robot.GetActiveDOFIndices()),
+            robot.GetAffineDOF(),
+        )
+        fingerprint = _ComputeFingerprint(
+            robot, checker_name, self.collision_options, self.decimals)
+
+        # A KinBody is only valid for the checker instance that baked it.
+        with self._lock:
+            cached = self._baked.get(key)
+            if (cached is not None and cached[0] == fingerprint
+                    and cached[1] == checker):
+                self.reuses += 1
+                return cached[2]
+
+        try:
+            kb_type = checker.SendCommand('BakeGetType')
+        except openrave_exception:
+            with self._lock:
+                self._unsupported.add(checker_name)
+            return None
+
+        baked_kinbody = _BakeRobot(robot, checker, kb_type)
+
+        with self._lock:
+            self._PruneDestroyed()
+            self._baked[key] = (fingerprint, checker, baked_kinbody)
+            self.bakes += 1
+
+        return baked_kinbody
+
+    def _PruneDestroyed(self):
+        # Baked KinBodies keep their environment alive.
+        env_ids = set(RaveGetEnvironmentId(env)
+                      for env in RaveGetEnvironments())
+
+        for key in self._baked.keys():
+            if key[0] not in env_ids:
+                del self._baked[key]
+
+    def clear(self):
+        with self._lock:
+            self._baked.clear()
+            self._unsupported.clear()
+
+    def clear_statistics(self):
+        self.bakes = 0
+        self.reuses = 0
+
+    def get_statistics(self):
+        """
+        Get the number of baked KinBodies that were created and reused.
+
+        @return dictionary of counters and the number of stored KinBodies
+        """
+        with self._lock:
+            return {
+                'bakes': self.bakes,
+                'reuses': self.reuses,
+                'size': len(self._baked),
+            }
+
+
+class ParallelPathValidator(object):
+    def __init__(self, num_workers=None, chunk_size=32,
+                 robot_checker_factory=None, clone_pool=None, executor=None):
+        """
+        Collision check a path on several cloned environments in parallel.
+
+        The check points of the path are split into chunks of chunk_size
+        consecutive configurations. Each worker thread checks chunks in its
+        own cloned environment, in order along the path, until a collision is
+        found. This relies on OpenRAVE releasing the GIL while checking
+        collisions. Paths with few check points are checked serially.
+
+        @param num_workers number of worker threads, defaults to one per CPU
+        @param chunk_size number of configurations checked per chunk
+        @param robot_checker_factory factory used to check each chunk
+        @param clone_pool ClonePool that provides the cloned environments,
+                          defaults to prpy.clone.get_default_clone_pool()
+        @param executor ThreadPoolExecutor, defaults to the shared executor
+        """
+        if executor is None:
+            executor = get_default_executor()
+        if num_workers is None:
+            num_workers = executor.max_workers
+        if robot_checker_factory is None:
+            robot_checker_factory = DefaultRobotCollisionCheckerFactory
+        if clone_pool is None:
+            clone_pool = get_default_clone_pool()
+
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.robot_checker_factory = robot_checker_factory
+        self.clone_pool = clone_pool
+        self.executor = executor
+
+    def CheckCollision(self, robot, traj):
+        """
+        Check if any configuration along a trajectory is in collision.
+
+        @param robot robot that executes the trajectory
+        @param traj linear or timed trajectory
+        @return True if the trajectory is in collision
+        """
+        return self.FindFirstCollision(robot, traj) is not None
+
+    def VerifyCollisionFree(self, robot, traj):
+        """
+        Raise an exception if a trajectory is in collision.
+
+        @param robot robot that executes the trajectory
+        @param traj linear or timed trajectory
+        @throws CollisionPlanningError that describes the first collision
+        """
+        first_collision = self.FindFirstCollision(robot, traj)
+        if first_collision is None:
+            return
+
+        # Re-check the first collision to generate a report.
+        _, q = first_collision
+        env = robot.GetEnv()
+        cspec = traj.GetConfigurationSpecification()
+
+        with env, robot.CreateRobotStateSaver(
+                KinBody.SaveParameters.LinkTransformation):
+            dof_indices, _ = cspec.ExtractUsedIndices(robot)
+            robot.SetDOFValues(q, dof_indices)
+
+            with self.robot_checker_factory(robot) as robot_checker:
+                robot_checker.VerifyCollisionFree()
+
+        # Both checks should agree. Fail conservatively if they do not.
+        raise CollisionPlanningError(None, None)
+
+    def FindFirstCollision(self, robot, traj):
+        """
+        Find the first configuration along a trajectory that is in collision.
+
+        @param robot robot that executes the trajectory
+        @param traj linear or timed trajectory
+        @return (t, q) of the first collision, or None if there is none
+        """
+        env = robot.GetEnv()
+
+        with env:
+            cspec = traj.GetConfigurationSpecification()
+            dof_indices, _ = cspec.ExtractUsedIndices(robot)
+            times, configs = self._GetCheckPoints(robot, traj)
+
+        if not len(configs):
+            return None
+
+        def get_check(index):
+            t = times[index] if times is not None else None
+            return t, configs[index]
+
+        if len(configs) <= self.chunk_size or self.num_workers < 2:
+            with env, self.robot_checker_factory(robot) as robot_checker:
+                in_collision = robot_checker.CheckCollisionBatch(
+                    configs, dof_indices=dof_indices)
+
+            if in_collision.any():
+                return get_check(numpy.argmax(in_collision))
+            return None
+
+        chunks = collections.deque(
+            (start, configs[start:start + self.chunk_size])
+            for start in xrange(0, len(configs), self.chunk_size))
+        num_workers = min(self.num_workers, len(chunks))
+        state = {'first_collision': None}
+        lock = threading.Lock()
+
+        def check_chunks(clone_env):
+            with clone_env:
+                cloned_robot = Cloned(robot, into=clone_env)
+
+                with self.robot_checker_factory(cloned_robot) as checker:
+                    while True:
+                        # Chunks are taken in order, so none of the remaining
+                        # chunks can contain an earlier collision.
+                        with lock:
+                            if (not chunks
+                                    or state['first_collision'] is not None):
+                                return
+                            start, chunk = chunks.popleft()
+
+                        in_collision = checker.CheckCollisionBatch(
+                            chunk, dof_indices=dof_indices)
+
+                        if in_collision.any():
+                            index = start + numpy.argmax(in_collision)
+
+                            with lock:
+                                first = state['first_collision']
+                                if first is None or index < first:
+                                    state['first_collision'] = index
+                                chunks.clear()
+                            return
+
+        # Clone in this thread, which may already hold the environment lock.
+        clones = []
+        try:
+            with env:
+                for _ in xrange(num_workers):
+                    clones.append(Clone(env, pool=self.clone_pool, lock=False))
+
+            futures = [self.executor.submit(check_chunks, clone.clone_env)
+                       for clone in clones]
+
+            for future in futures:
+                self.executor.run_inline(future)
+            for future in futures:
+                future.result()
+        finally:
+            for clone in reversed(clones):
+                clone.__exit__(None, None, None)
+
+        if state['first_collision'] is None:
+            return None
+        return get_check(state['first_collision'])
+
+    def _GetCheckPoints(self, robot, traj):
+        if IsTimedTrajectory(traj):
+            checks = list(GetCollisionCheckPts(robot, traj))
+            times = numpy.array([t for t, _ in checks])
+            configs = numpy.array([q for _, q in checks])
+            return times, configs
+
+        # Check configurations in order along the path so that chunks are
+        # contiguous.
+        return GetLinearCollisionCheckSchedule(
+            robot, traj, norm_order=2, sampling_func=SampleTimeGenerator)
+
+
+class SelfCollisionFilter(object):
+    """Disables self collision checks between links that never collide.
+
+    The filter samples random configurations of all of a robot's DOFs within
+    their limits and collision checks every pair of non-adjacent links in
+    each of them. Pairs that are not in collision in any sample are marked
+    adjacent with KinBody.SetAdjacentLinks, which removes them from all
+    following self collision checks. This cannot be undone without reloading
+    the robot.
+
+    Only apply the filter to the robots that planners plan with, e.g. by
+    setting the self_collision_filter attribute of a BasePlanner. Then
+    ClonedPlanningMethods apply it to their cloned robot, and the caller's
+    robot keeps checking every pair, e.g. for execution-time safety checks.
+
+    The pairs are computed once per robot model and stored in the OpenRAVE
+    database directory, keyed by the robot's kinematics geometry hash and
+    the number of samples. Sampling is not exhaustive: rare collisions may
+    be missed if num_samples is too small.
+    """
+
+    def __init__(self, num_samples=10000, seed=0, require_cache=False):
+        """
+        @param num_samples number of configurations to sample
+        @param seed seed of the random number generator
+        @param require_cache raise an exception if the pairs are not cached
+        """
+        if num_samples < 1:
+            raise ValueError('num_samples must be positive.')
+
+        self.num_samples = num_samples
+        self.seed = seed
+        self.require_cache = require_cache
+
+        # Maps kinematics geometry hashes to the pairs returned by load.
+        self._pairs = dict()
+        self._lock = threading.Lock()
+
+    def apply(self, robot):
+        """
+        Disable self collision checks between links that never collide.
+
+        This modifies robot for all following collision checks. Do not call
+        it on a robot that is also used for execution-time or safety checks.
+        SetAdjacentLinks does not change the kinematics geometry hash, so
+        environments that were cloned from robot and are reused based on it,
+        e.g. by incremental clones, do not pick up the change.
+
+        Pairs that are already disabled are skipped, so applying the filter
+        to the same robot again is cheap.
+
+        @param robot robot to filter the self collision checks of
+        @return list of (link name, link name) pairs that were disabled
+        """
+        with robot.GetEnv():
+            kinematics_hash = robot.GetKinematicsGeometryHash()
+
+            with self._lock:
+                pairs = self._pairs.get(kinematics_hash)
+
+            if pairs is None:
+                pairs = self.load(robot)
+
+                with self._lock:
+                    self._pairs[kinematics_hash] = pairs
+
+            non_adjacent = set((pair & 0xffff, pair >> 16)
+                               for pair in robot.GetNonAdjacentLinks(0))
+            num_disabled = 0
+
+            for name1, name2 in pairs:
+                link1 = robot.GetLink(name1)
+                link2 = robot.GetLink(name2)
+                if link1 is None or link2 is None:
+                    raise PrPyException(
+                        'Robot "{:s}" has no link pair ("{:s}", "{:s}").'
+                        .format(robot.GetName(), name1, name2))
+
+                indices = tuple(sorted((link1.GetIndex(), link2.GetIndex())))
+                if indices in non_adjacent:
+                    robot.SetAdjacentLinks(*indices)
+                    num_disabled += 1
+
+        if num_disabled:
+            logger.debug('Disabled self collision checks for %d link pairs'
+                         ' of "%s".', num_disabled, robot.GetName())
+        return pairs
+
+    def load(self, robot):
+        """
+        Load the never-colliding link pairs from the cache.
+
+        The pairs are computed and saved to the cache if they are missing.
+
+        @param robot robot to get the link pairs of
+        @return list of (link name, link name) pairs
+        """
+        filename = self.get_cache_filename(robot)
+        cache_path = RaveFindDatabaseFile(filename, True)
+
+        if cache_path:
+            logger.debug('Loading self collision filter from "%s".',
+                         cache_path)
+            with open(cache_path, 'rb') as cache_file:
+                data = pickle.load(cache_file)
+
+            if data['kinematics_hash'] == robot.GetKinematicsGeometryHash():
+                return [tuple(pair) for pair in data['pairs']]
+
+            logger.warning('Ignoring self collision filter "%s" for a'
+                           ' different robot.', cache_path)
+
+        if self.require_cache:
+            raise PrPyException(
+                'Self collision filter "{:s}" is not cached.'.format(filename))
+
+        pairs = self.compute(robot)
+        self.save(robot, pairs)
+        return pairs
+
+    def save(self, robot, pairs):
+        """
+        Save never-colliding link pairs to the cache.
+
+        @param robot robot that the link pairs belong to
+        @param pairs list of (link name, link name) pairs
+        """
+        cache_path = RaveFindDatabaseFile(
+            self.get_cache_filename(robot), False)
+
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        data = {
+            'kinematics_hash': robot.GetKinematicsGeometryHash(),
+            'num_samples': self.num_samples,
+            'pairs': list(pairs),
+        }
+        with open(cache_path, 'wb') as cache_file:
+            pickle.dump(data, cache_file, 2)
+
+        logger.debug('Saved self collision filter to "%s".', cache_path)
+
+    def compute(self, robot):
+        """
+        Sample configurations to find links that never collide.
+
+        Only pairs of links that are not adjacent and have geometry are
+        considered. Each pair is checked until it is first found in
+        collision.
+
+        @param robot robot to sample configurations of
+        @return list of (link name, link name) pairs
+        """
+        env = robot.GetEnv()
+        links = robot.GetLinks()
+        rng = numpy.random.RandomState(self.seed)
+
+        candidates = set()
+        for pair in robot.GetNonAdjacentLinks(0):
+            index1, index2 = pair & 0xffff, pair >> 16
+            if links[index1].GetGeometries() and links[index2].GetGeometries():
+                candidates.add((index1, index2))
+
+        dof_indices = range(robot.GetDOF())
+        lower, upper = robot.GetDOFLimits()
+
+        # Sample circular joints over a single revolution.
+        for dof_index in dof_indices:
+            joint = robot.GetJointFromDOFIndex(dof_index)
+            if joint.IsCircular(dof_index - joint.GetDOFIndex()):
+                lower[dof_index] = max(lower[dof_index], -numpy.pi)
+                upper[dof_index] = min(upper[dof_index], numpy.pi)
+
+        logger.info('Sampling %d configurations of "%s" to find link pairs'
+                    ' that never collide.', self.num_samples, robot.GetName())
+
+        with env, robot.CreateRobotStateSaver(
+                KinBody.SaveParameters.LinkTransformation
+                | KinBody.SaveParameters.LinkEnable):
+            robot.Enable(True)
+
+            for _ in xrange(self.num_samples):
+                if not candidates:
+                    break
+
+                q = lower + (upper - lower) * rng.random_sample(len(lower))
+                robot.SetDOFValues(q, dof_indices,
+                                   KinBody.CheckLimitsAction.Nothing)
+
+                candidates.difference_update([
+                    (index1, index2) for index1, index2 in candidates
+                    if env.CheckCollision(links[index1], links[index2])])
+
+        return sorted((links[index1].GetName(), links[index2].GetName())
+                      for index1, index2 in candidates)
+
+    def get_cache_filename(self, robot):
+        return 'prpy_selfcollision_{:s}_{:d}.pickle'.format(
+            robot.GetKinematicsGeometryHash(), self.num_samples)
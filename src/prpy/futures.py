@@ -29,8 +29,12 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import collections
 import logging
+import multiprocessing
 import threading
+import time
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
@@ -55,13 +59,86 @@ class CancelledError(FutureError):
     pass
 
 
+class Deadline(object):
+    def __init__(self, timeout):
+        """
+        Wall-clock time by which a call must complete.
+
+        @param timeout time from now until the deadline, in seconds
+        """
+        self.timeout = timeout
+        self.time = time.time() + timeout
+
+    def __repr__(self):
+        return 'Deadline(remaining={:.3f})'.format(self.get_remaining_time())
+
+    def get_remaining_time(self):
+        """ Returns the time until the deadline, clamped to be non-negative. """
+        return max(self.time - time.time(), 0.)
+
+    def is_expired(self):
+        return time.time() >= self.time
+
+
+class CancellationToken(object):
+    def __init__(self, parent=None, deadline=None):
+        """
+        Cooperative cancellation flag shared between a caller and a call.
+
+        Long-running calls poll is_cancelled() and terminate early once it
+        returns True. A token is also cancelled if any of its ancestors is
+        cancelled, so cancelling a parent call stops all calls it spawned.
+
+        A token may also carry a Deadline. Children inherit the earliest
+        deadline of their ancestors, so a deadline set on a top-level call
+        bounds the duration of every call it spawns.
+
+        @param parent token of the enclosing call, or None
+        @param deadline Deadline of this call, or None
+        """
+        self.parent = parent
+        self.deadline = deadline
+        self._is_cancelled = False
+
+    def cancel(self):
+        """ Request cancellation of this token and all of its children. """
+        self._is_cancelled = True
+
+    def is_cancelled(self):
+        """ Returns True if this token or one of its ancestors is cancelled. """
+        token = self
+        while token is not None:
+            if token._is_cancelled:
+                return True
+            token = token.parent
+        return False
+
+    def raise_if_cancelled(self):
+        """ Raise CancelledError if this token is cancelled. """
+        if self.is_cancelled():
+            raise CancelledError()
+
+    def get_deadline(self):
+        """ Returns the earliest Deadline of this token and its ancestors. """
+        deadline = None
+        token = self
+        while token is not None:
+            if token.deadline is not None and (
+                    deadline is None or token.deadline.time < deadline.time):
+                deadline = token.deadline
+            token = token.parent
+        return deadline
+
+
 class Future(object):
-    def __init__(self):
+    def __init__(self, token=None):
         self.lock = threading.RLock()
+        self.token = token if token is not None else CancellationToken()
 
         self._is_done = False
         self._is_error = False
         self._is_cancelled = False
+        self._is_running = False
 
         self._handle = None
         self._result = None
@@ -75,15 +152,77 @@ class Future(object):
         with self.lock:
             return self._is_done
 
+    def running(self):
+        """ Return True if the call is currently being executed. """
+        with self.lock:
+            return self._is_running and not self._is_done
+
     def cancel(self):
-        """ Attempt to cancel the call. """
-        raise NotImplementedError('Cancelling is not supported.')
+        """
+        Attempt to cancel the call.
+
+        If the call has not started running, it is cancelled immediately and
+        will never be executed. If the call is already running, its
+        cancellation token is cancelled and the call is expected to poll it
+        and terminate early. In this case, the future is completed by the call
+        itself once it returns.
+
+        @returns: False if the call has already completed, True otherwise
+        """
+        with self.lock:
+            if self._is_done:
+                return False
+
+            self.token.cancel()
+
+            if self._is_running:
+                return True
+
+            # Mark the future as done while holding the lock, so a worker
+            # that concurrently dequeues this call never starts it.
+            self._is_cancelled = True
+            callbacks = self._mark_done()
+
+        self._run_callbacks(callbacks)
+        return True
 
     def cancelled(self):
         """ Returns True if the call was successfully cancelled. """
         with self.lock:
             return self._is_done and self._is_cancelled
 
+    def cancel_requested(self):
+        """ Returns True if this future's cancellation token is cancelled. """
+        return self.token.is_cancelled()
+
+    def __await__(self):
+        """ Allow this future to be awaited in an asyncio coroutine. """
+        return wrap_future(self).__await__()
+
+    def set_running_or_notify_cancel(self):
+        """
+        Mark this future as running, unless it was cancelled.
+
+        This should be called by an executor immediately before executing the
+        call wrapped by this future. The call must not be executed if this
+        returns False. If the token was cancelled through one of its parents,
+        the future is marked as cancelled.
+
+        @returns: False if the future was cancelled or already started
+        """
+        with self.lock:
+            if self._is_running or self._is_done:
+                return False
+            elif not self.token.is_cancelled():
+                self._is_running = True
+                return True
+
+            self._is_cancelled = True
+            callbacks = self._mark_done()
+
+        self._run_callbacks(callbacks)
+        return False
+
     def result(self, timeout=None):
         """
         Wait for and return the result of the call wrapped by this future.
@@ -210,16 +349,24 @@ class Future(object):
         self._set_done()
 
     def _set_done(self):
-        """ Mark this future as done and return a callback function. """
+        """ Mark this future as done and call its callbacks. """
+        with self.lock:
+            callbacks = self._mark_done()
+
+        self._run_callbacks(callbacks)
+
+    def _mark_done(self):
+        """ Mark this future as done and return its callbacks. """
         with self.lock:
             if self._is_done:
                 raise InternalError('This future is already done.')
 
             self._is_done = True
-            callbacks = list(self._callbacks)
-
             self._condition.notify_all()
+            return list(self._callbacks)
 
+    def _run_callbacks(self, callbacks):
+        """ Call the callbacks returned by _mark_done, outside of the lock. """
         for callback_fn in callbacks:
             try:
                 callback_fn(self)
@@ -235,9 +382,13 @@ def defer(fn, executor=None, args=(), kwargs={}):
     result.  It then executes the function in a new thread or on a provided
     executor and sets the result of the Future as soon as it is available.
 
-    Note that this execution is extremely simplistic.  Cancellation is not
-    supported, and no fixed thread pool is used (unless specified via a custom
-    executor).
+    Note that this execution is extremely simplistic: no fixed thread pool is
+    used (unless specified via a custom executor). Cancelling the future
+    before the function starts prevents it from being called. Once the
+    function is running, cancel() only cancels the future's token and the
+    future completes when the function returns. Use ThreadPoolExecutor.submit
+    directly to get a cancellable future that runs on a bounded pool of
+    threads.
 
     @param fn: the function that will be called
     @param executor: an executor that has a `.submit()` function, or None
@@ -248,13 +399,9 @@ def defer(fn, executor=None, args=(), kwargs={}):
     # Create a future to store the result of the function.
     future = Future()
 
-    # Create a wrapper that calls the function and stores the result.
-    def wrapper():
-        try:
-            result = fn(*args, **kwargs)
-            future.set_result(result)
-        except BaseException as e:
-            future.set_exception(e)
+    # Create a wrapper that calls the function, unless the future was
+    # cancelled first, and stores the result.
+    wrapper = _WorkItem(future, fn, args, kwargs).run
 
     # Use the specified executor or new thread to start running the function.
     if executor is not None:
@@ -265,3 +412,308 @@ def defer(fn, executor=None, args=(), kwargs={}):
 
     # Return the implicit result as a future.
     return future
+
+
+_local = threading.local()
+
+
+def current_future():
+    """
+    Return the future being executed by the calling thread.
+
+    This is set while a ThreadPoolExecutor runs a submitted call. Returns None
+    if the calling thread is not running a future.
+
+    @returns: the future being executed by this thread, or None
+    """
+    return getattr(_local, 'future', None)
+
+
+def get_cancellation_token():
+    """
+    Return the cancellation token that is active in the calling thread.
+
+    Long-running code should poll this token and terminate early once it is
+    cancelled. Returns None if no token is active.
+
+    @returns: the active CancellationToken, or None
+    """
+    return getattr(_local, 'token', None)
+
+
+def get_deadline():
+    """
+    Return the deadline of the cancellation token active in the calling thread.
+
+    @returns: the earliest Deadline of the active token, or None
+    """
+    token = get_cancellation_token()
+    if token is None:
+        return None
+    return token.get_deadline()
+
+
+@contextmanager
+def cancellation_scope(token):
+    """
+    Make a cancellation token active in the calling thread.
+
+    The previously active token is restored when the with-block exits. Calls
+    submitted to a ThreadPoolExecutor inside this block receive child tokens
+    of `token`, so cancelling it also cancels them.
+
+    @param token: CancellationToken to activate, or None
+    """
+    previous_token = get_cancellation_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous_token
+
+
+class _WorkItem(object):
+    def __init__(self, future, fn, args, kwargs):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        """ Execute the call, unless it was cancelled or already started. """
+        if not self.future.set_running_or_notify_cancel():
+            return False
+
+        previous_future = current_future()
+        _local.future = self.future
+
+        try:
+            with cancellation_scope(self.future.token):
+                result = self.fn(*self.args, **self.kwargs)
+        except CancelledError:
+            self.future.set_cancelled()
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+        finally:
+            _local.future = previous_future
+
+        return True
+
+
+class ThreadPoolExecutor(object):
+    def __init__(self, max_workers=None):
+        """
+        Executor that runs calls on a bounded pool of reusable threads.
+
+        Threads are created lazily, up to max_workers, and are daemon threads
+        so an idle pool never prevents the interpreter from exiting. Futures
+        returned by submit() support cancel(): queued calls are dropped and
+        running calls are flagged so they can terminate cooperatively.
+
+        Each call runs with its future's CancellationToken active. This token
+        is a child of the token that was active when submit() was called.
+
+        @param max_workers maximum number of threads, defaults to the number
+                           of CPUs on this machine
+        """
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+        if max_workers <= 0:
+            raise ValueError('max_workers must be positive.')
+
+        self.max_workers = max_workers
+
+        self._condition = threading.Condition(threading.Lock())
+        self._work_items = collections.deque()
+        self._pending = dict()
+        self._threads = []
+        self._num_idle = 0
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule fn(*args, **kwargs) to be executed on the pool.
+
+        @param fn: the function that will be called
+        @returns: a future representing the result of the call
+        """
+        future = Future(token=CancellationToken(
+            parent=get_cancellation_token()))
+        work_item = _WorkItem(future, fn, args, kwargs)
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit to an executor that has'
+                                   ' been shut down.')
+
+            self._work_items.append(work_item)
+            self._pending[future] = work_item
+
+            # A notified worker counts as idle until it re-acquires the lock,
+            # so compare against the number of queued calls instead of
+            # checking for an idle worker. Otherwise a burst of calls on a
+            # warm pool would all be handed to the same worker.
+            if self._num_idle > 0:
+                self._condition.notify()
+
+            if (len(self._work_items) > self._num_idle
+                    and len(self._threads) < self.max_workers):
+                thread = threading.Thread(target=self._worker)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+        return future
+
+    def run_inline(self, future):
+        """
+        Execute a queued call in the calling thread.
+
+        This is a no-op if a worker thread has already started the call. It
+        is useful when the caller is about to block on `future` anyway: the
+        call runs immediately instead of waiting for a worker to be free. This
+        also prevents nested calls from deadlocking a saturated pool.
+
+        @param future: a future returned by submit()
+        @returns: True if the call was executed by this function
+        """
+        with self._condition:
+            work_item = self._pending.pop(future, None)
+
+        if work_item is None:
+            return False
+
+        return work_item.run()
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting new calls and release the worker threads.
+
+        Calls that are already queued are still executed.
+
+        @param wait: block until all worker threads have exited
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+            threads = list(self._threads)
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._work_items and not self._shutdown:
+                    self._num_idle += 1
+                    self._condition.wait()
+                    self._num_idle -= 1
+
+                if not self._work_items:
+                    return
+
+                work_item = self._work_items.popleft()
+                self._pending.pop(work_item.future, None)
+
+            work_item.run()
+
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    """
+    Return a process-wide ThreadPoolExecutor shared by PrPy.
+
+    The executor is created on first use and has one thread per CPU.
+
+    @returns: the shared ThreadPoolExecutor
+    """
+    global _default_executor
+
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor()
+        return _default_executor
+
+
+def _import_asyncio():
+    try:
+        import asyncio
+    except ImportError:
+        try:
+            import trollius as asyncio
+        except ImportError:
+            raise ImportError('Awaiting a Future requires asyncio (Python 3)'
+                              ' or the trollius backport (Python 2).')
+    return asyncio
+
+
+def wrap_future(future, loop=None):
+    """
+    Wrap a Future in an asyncio future bound to an event loop.
+
+    The asyncio future completes on the event loop thread once `future`
+    completes, so it can be awaited (or, with trollius, yielded from) without
+    blocking the loop. Cancelling the asyncio future also cancels `future`,
+    which cancels its token and stops a running planning call.
+
+    @param future: the Future to wrap
+    @param loop: event loop; defaults to asyncio.get_event_loop()
+    @returns: an asyncio future that mirrors `future`
+    """
+    asyncio = _import_asyncio()
+
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    aio_future = asyncio.Future(loop=loop)
+
+    def copy_state(future):
+        if aio_future.done():
+            return
+
+        if future.cancelled():
+            aio_future.cancel()
+            return
+
+        exception = future.exception()
+        if exception is not None:
+            aio_future.set_exception(exception)
+        else:
+            aio_future.set_result(future.result())
+
+    def on_aio_done(aio_future):
+        if aio_future.cancelled():
+            future.cancel()
+
+    aio_future.add_done_callback(on_aio_done)
+    future.add_done_callback(
+        lambda future: loop.call_soon_threadsafe(copy_state, future))
+
+    return aio_future
+
+
+def run_async(fn, args=(), kwargs={}, executor=None, loop=None):
+    """
+    Run a function on an executor and return an awaitable for its result.
+
+    This is a convenience wrapper around ThreadPoolExecutor.submit and
+    wrap_future. The call runs inside a cancellable Future, so cancelling the
+    returned asyncio future also cancels the call's token.
+
+    @param fn: the function that will be called
+    @param args: a list of positional arguments to pass to the function
+    @param kwargs: a list of keyword arguments to pass to the function
+    @param executor: a ThreadPoolExecutor; defaults to get_default_executor()
+    @param loop: event loop; defaults to asyncio.get_event_loop()
+    @returns: an asyncio future for the result of `fn`
+    """
+    if executor is None:
+        executor = get_default_executor()
+
+    return wrap_future(executor.submit(fn, *args, **kwargs), loop=loop)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2016, Carnegie Mellon University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# - Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# - Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# - Neither the name of Carnegie Mellon University nor the names of its
+#   contributors may be used to endorse or promote products derived from this
+#   software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Latency and outcome metrics for planning calls.
+
+Planning methods, meta-planners, and robot planning wrappers report every
+call to the default MetricsRegistry. Each call is recorded under a
+(category, name, method) key, e.g. ('planner', 'SnapPlanner',
+'PlanToConfiguration'). The categories used by PrPy are:
+
+- 'planner': time spent inside a LockedPlanningMethod or ClonedPlanningMethod
+- 'clone': time spent cloning the environment for a ClonedPlanningMethod
+- 'meta': time spent inside a meta-planner, e.g. Sequence or Ranked
+- 'robot': end-to-end time of a planning method called on a Robot
+
+Use dump() to retrieve a snapshot of all metrics and reset() to clear them.
+"""
+
+import collections
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram(object):
+    """Histogram of positive values with logarithmically-spaced buckets.
+
+    Values are assigned to buckets whose boundaries grow by a constant factor,
+    so percentiles have a bounded relative error and memory usage does not
+    depend on the number of recorded values.
+    """
+    def __init__(self, min_value=1e-5, max_value=1e4, buckets_per_decade=20):
+        """
+        @param min_value smallest value that can be resolved
+        @param max_value largest value that can be resolved
+        @param buckets_per_decade number of buckets per factor of ten
+        """
+        self.min_value = min_value
+        self.growth = 10. ** (1. / buckets_per_decade)
+        self._log_growth = math.log(self.growth)
+
+        num_buckets = int(math.ceil(
+            math.log(max_value / min_value) / self._log_growth)) + 1
+        self._buckets = [0] * num_buckets
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self._buckets)):
+            self._buckets[i] = 0
+
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = int(math.log(value / self.min_value) / self._log_growth)
+            index = min(index, len(self._buckets) - 1)
+
+        self._buckets[index] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def get_mean(self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def get_percentile(self, percentile):
+        """
+        Estimate a percentile of the recorded values.
+
+        @param percentile percentile in the range [0, 100]
+        @return estimated value, or None if the histogram is empty
+        """
+        if self.count == 0:
+            return None
+
+        rank = percentile / 100. * self.count
+        cumulative = 0
+
+        for index, bucket_count in enumerate(self._buckets):
+            cumulative += bucket_count
+            if bucket_count > 0 and cumulative >= rank:
+                # Report the geometric center of the bucket, clamped to the
+                # range of values that were actually recorded.
+                value = self.min_value * self.growth ** (index + 0.5)
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+
+class Metric(object):
+    """Latency histogram and outcome counts for one (category, name, method).
+    """
+    def __init__(self):
+        self.latency = Histogram()
+        self.successes = 0
+        self.failures = collections.Counter()
+
+    def record(self, duration, exception=None):
+        self.latency.add(duration)
+
+        if exception is None:
+            self.successes += 1
+        else:
+            self.failures[type(exception).__name__] += 1
+
+    def to_dict(self):
+        return {
+            'count': self.latency.count,
+            'successes': self.successes,
+            'failures': dict(self.failures),
+            'total_time': self.latency.total,
+            'mean': self.latency.get_mean(),
+            'min': self.latency.min,
+            'max': self.latency.max,
+            'p50': self.latency.get_percentile(50),
+            'p95': self.latency.get_percentile(95),
+            'p99': self.latency.get_percentile(99),
+        }
+
+
+class MetricsRegistry(object):
+    """Thread-safe collection of Metrics keyed by (category, name, method).
+    """
+    def __init__(self):
+        self.enabled = True
+        self._metrics = collections.defaultdict(Metric)
+        self._lock = threading.Lock()
+
+    def record(self, category, name, method, duration, exception=None):
+        """
+        Record the outcome of one call.
+
+        @param category type of call, e.g. 'planner' or 'clone'
+        @param name name of the planner or robot
+        @param method name of the planning method
+        @param duration duration of the call, in seconds
+        @param exception exception raised by the call, or None on success
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._metrics[(category, name, method)].record(
+                duration, exception)
+
+    @contextmanager
+    def timed(self, category, name, method):
+        """
+        Context manager that records the duration and outcome of a block.
+
+        @param category type of call, e.g. 'planner' or 'clone'
+        @param name name of the planner or robot
+        @param method name of the planning method
+        """
+        start_time = time.time()
+        try:
+            yield
+        except Exception as e:
+            self.record(category, name, method, time.time() - start_time, e)
+            raise
+        else:
+            self.record(category, name, method, time.time() - start_time)
+
+    def dump(self):
+        """
+        Get a snapshot of all metrics.
+
+        @return dictionary that maps (category, name, method) to a dictionary
+                of statistics
+        """
+        with self._lock:
+            return dict((key, metric.to_dict())
+                        for key, metric in self._metrics.items())
+
+    def reset(self):
+        """
+        Remove all recorded metrics.
+        """
+        with self._lock:
+            self._metrics.clear()
+
+    def format(self):
+        """
+        Format all metrics as a human-readable table.
+
+        @return string
+        """
+        lines = ['{:8s} {:40s} {:32s} {:>6s} {:>6s} {:>9s} {:>9s} {:>9s}'.format(
+            'category', 'name', 'method', 'count', 'fail', 'p50', 'p95', 'p99')]
+
+        for (category, name, method), stats in sorted(self.dump().items()):
+            lines.append(
+                '{:8s} {:40s} {:32s} {:6d} {:6d} {:9.4f} {:9.4f} {:9.4f}'.format(
+                    category, name[:40], method[:32], stats['count'],
+                    sum(stats['failures'].values()), stats['p50'],
+                    stats['p95'], stats['p99']))
+
+        return '\n'.join(lines)
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_registry():
+    """
+    Get the registry that PrPy reports planning metrics to.
+    """
+    return _default_registry
+
+
+def record(category, name, method, duration, exception=None):
+    _default_registry.record(category, name, method, duration, exception)
+
+
+def timed(category, name, method):
+    return _default_registry.timed(category, name, method)
+
+
+def dump():
+    return _default_registry.dump()
+
+
+def reset():
+    _default_registry.reset()
+
+
+def set_enabled(enabled):
+    """
+    Enable or disable recording metrics to the default registry.
+    """
+    _default_registry.enabled = enabled
@@ -28,6 +28,7 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+from adaptive import AdaptiveSequence
 from base import (
     FirstSupported,
     MethodMask,
@@ -37,12 +38,15 @@ from base import (
     Sequence,
     UnsupportedPlanningError,
 )
+from cached import CachedPlanner
 from chomp import CHOMPPlanner
 from cbirrt import CBiRRTPlanner
+from experience import ExperiencePlanner
 from ompl import OMPLPlanner
 from mk import MKPlanner
 from snap import SnapPlanner
 from named import NamedPlanner
+from process import ProcessPoolPlanner
 from ik import IKPlanner
 from sbpl import SBPLPlanner
 from openrave import BiRRTPlanner
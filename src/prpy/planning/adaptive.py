@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2016, Carnegie Mellon University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# - Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# - Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# - Neither the name of Carnegie Mellon University nor the names of its
+#   contributors may be used to endorse or promote products derived from this
+#   software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import json
+import logging
+import math
+import os
+import threading
+import time
+from .base import Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class PlannerStatistics(object):
+    """Success and latency statistics of one (planner, method) pair."""
+
+    def __init__(self, attempts=0, successes=0, total_duration=0.):
+        self.attempts = attempts
+        self.successes = successes
+        self.total_duration = total_duration
+
+    def update(self, success, duration):
+        self.attempts += 1
+        self.total_duration += duration
+        if success:
+            self.successes += 1
+
+    def get_success_rate(self):
+        """
+        Get the posterior mean success rate under a uniform prior.
+        """
+        return (self.successes + 1.) / (self.attempts + 2.)
+
+    def get_mean_duration(self):
+        if self.attempts == 0:
+            return 0.
+        return self.total_duration / self.attempts
+
+    def to_dict(self):
+        return {
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'total_duration': self.total_duration,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(attempts=int(data['attempts']),
+                   successes=int(data['successes']),
+                   total_duration=float(data['total_duration']))
+
+
+class AdaptiveSequence(Sequence):
+    KNOWN_KWARGS = Sequence.KNOWN_KWARGS | set(
+        ['stats_path', 'save_interval', 'exploration'])
+
+    def __init__(self, *planners, **kwargs):
+        """
+        Sequence that orders planners by their expected time-to-solution.
+
+        AdaptiveSequence records the success rate and mean planning time of
+        each planner, separately for each planning method. Planners are
+        queried in ascending order of (mean time) / (success rate), which
+        minimizes the expected time-to-solution if the planners succeed
+        independently. The success rate is replaced by an upper confidence
+        bound so that rarely-tried planners are occasionally explored.
+        Planners with no statistics are tried first, in constructor order.
+
+        Statistics are keyed by str(planner) and method name. If stats_path is
+        specified, they are loaded from that JSON file on construction and
+        written back after a query if at least save_interval seconds have
+        passed since they were last written. Call save_statistics() to write
+        the latest statistics, e.g. before exiting.
+
+        A trajectory returned by a planner that was tried before a planner
+        that precedes it in constructor order is tagged as non-deterministic.
+
+        @param planners planners, in their default order
+        @param stats_path optional JSON file used to persist statistics
+        @param save_interval minimum time between writes to stats_path, in
+                             seconds; zero writes after every query
+        @param exploration weight of the exploration bonus; zero is greedy
+        @param allow_nondeterministic see Sequence
+        """
+        assert self.KNOWN_KWARGS.issuperset(kwargs.keys())
+
+        sequence_kwargs = dict((key, value) for key, value in kwargs.iteritems()
+                               if key in Sequence.KNOWN_KWARGS)
+        super(AdaptiveSequence, self).__init__(*planners, **sequence_kwargs)
+
+        self._stats_path = kwargs.get('stats_path', None)
+        self._save_interval = kwargs.get('save_interval', 30.)
+        self._exploration = kwargs.get('exploration', 1.)
+        self._statistics = collections.defaultdict(PlannerStatistics)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._last_save_time = None
+
+        if self._stats_path is not None and os.path.exists(self._stats_path):
+            self.load_statistics(self._stats_path)
+
+    def __str__(self):
+        return 'AdaptiveSequence({:s})'.format(
+            ', '.join(map(str, self._planners)))
+
+    def get_statistics(self, planner, method):
+        """
+        Get the statistics recorded for a planner and method.
+
+        @param planner planner
+        @param method name of the planning method
+        @return PlannerStatistics
+        """
+        with self._lock:
+            return self._statistics[(str(planner), method)]
+
+    def clear_statistics(self):
+        with self._lock:
+            self._statistics.clear()
+
+    def load_statistics(self, path):
+        """
+        Load statistics from a JSON file written by save_statistics.
+
+        @param path path to the JSON file
+        """
+        with open(path, 'r') as stats_file:
+            entries = json.load(stats_file)
+
+        with self._lock:
+            for entry in entries:
+                key = (entry['planner'], entry['method'])
+                self._statistics[key] = PlannerStatistics.from_dict(entry)
+
+    def save_statistics(self, path=None):
+        """
+        Save statistics to a JSON file.
+
+        @param path path to the JSON file, defaults to stats_path
+        """
+        if path is None:
+            path = self._stats_path
+        if path is None:
+            raise ValueError('No path was specified and stats_path is not set.')
+
+        with self._lock:
+            entries = []
+            for (planner_name, method), stats in self._statistics.iteritems():
+                entry = stats.to_dict()
+                entry['planner'] = planner_name
+                entry['method'] = method
+                entries.append(entry)
+
+        # Write to a temporary file first so a crash cannot corrupt the
+        # existing statistics.
+        with self._save_lock:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as stats_file:
+                json.dump(entries, stats_file, indent=2, sort_keys=True)
+            os.rename(tmp_path, path)
+
+    def _get_ordered_planners(self, method):
+        with self._lock:
+            all_stats = [self._statistics.get((str(planner), method))
+                         for planner in self._planners]
+
+        total_attempts = sum(stats.attempts for stats in all_stats
+                             if stats is not None)
+
+        def get_cost(iplanner):
+            stats = all_stats[iplanner]
+            if stats is None or stats.attempts == 0:
+                return (0., iplanner)
+
+            bonus = self._exploration * math.sqrt(
+                2. * math.log(max(total_attempts, 1)) / stats.attempts)
+            success_rate = min(stats.get_success_rate() + bonus, 1.)
+            return (stats.get_mean_duration() / success_rate, iplanner)
+
+        order = sorted(xrange(len(self._planners)), key=get_cost)
+        return [self._planners[i] for i in order]
+
+    def _record_result(self, planner, method, success, duration):
+        now = time.time()
+
+        with self._lock:
+            self._statistics[(str(planner), method)].update(success, duration)
+
+            is_save_due = (self._stats_path is not None
+                and (self._last_save_time is None
+                     or now - self._last_save_time >= self._save_interval))
+            if is_save_due:
+                self._last_save_time = now
+
+        if is_save_due:
+            try:
+                self.save_statistics(self._stats_path)
+            except (IOError, OSError) as e:
+                logger.warning('Failed saving planner statistics to "%s": %s',
+                               self._stats_path, e)
@@ -29,15 +29,24 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import abc
+import collections
 import functools
 import logging
+import threading
+import time
 import numpy
 import openravepy
-from ..clone import Clone, CloneException
-from ..futures import defer
-from ..util import CopyTrajectory, GetTrajectoryTags, SetTrajectoryTags
-from .exceptions import (ClonedPlanningError, MetaPlanningError,
-                         PlanningError, UnsupportedPlanningError)
+from .. import metrics
+from ..clone import Clone, ClonePool, Cloned, CloneException
+from ..futures import (CancellationToken, CancelledError, Deadline,
+                       cancellation_scope,
+                       get_cancellation_token, get_deadline,
+                       get_default_executor)
+from ..util import (ComputeReachAABB, CopyTrajectory, GetTrajectoryTags,
+                    SetTrajectoryTags)
+from .exceptions import (CancelledPlanningError, ClonedPlanningError,
+                         MetaPlanningError, PlanningError,
+                         TimeoutPlanningError, UnsupportedPlanningError)
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
@@ -96,17 +105,222 @@ class Tags(object):
     """
 
 
+def raise_if_cancelled():
+    """
+    Raise if the active planning call was cancelled or ran out of time.
+
+    Planners should call this periodically from long-running loops so that
+    abandoned calls release the environment lock and CPU immediately.
+
+    @throws CancelledPlanningError if the active call was cancelled
+    @throws TimeoutPlanningError if the deadline of the active call passed
+    """
+    token = get_cancellation_token()
+    if token is None:
+        return
+
+    if token.is_cancelled():
+        raise CancelledPlanningError()
+
+    deadline = token.get_deadline()
+    if deadline is not None and deadline.is_expired():
+        raise TimeoutPlanningError(deadline.timeout, deterministic=False)
+
+
+def get_remaining_time(timelimit=None):
+    """
+    Get the time available to the active planning call.
+
+    This is the minimum of timelimit and the time remaining until the deadline
+    of the active call. Planners should pass the result to any internal time
+    limit, so that the whole query completes by the top-level deadline.
+
+    @param timelimit time limit requested for this call, or None
+    @return available time in seconds, or None if there is no limit
+    @throws TimeoutPlanningError if the deadline of the active call passed
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return timelimit
+
+    remaining_time = deadline.get_remaining_time()
+    if remaining_time <= 0.:
+        raise TimeoutPlanningError(deadline.timeout, deterministic=False)
+    elif timelimit is None:
+        return remaining_time
+    else:
+        return min(timelimit, remaining_time)
+
+
+def register_cancellation_callback(planner):
+    """
+    Interrupt an OpenRAVE planner's PlanPath if the active call is cancelled
+    or its deadline passes.
+
+    The callback remains registered for as long as the returned handle is
+    alive, so the caller must hold onto it until PlanPath returns.
+
+    @param planner OpenRAVE planner
+    @return callback handle, or None if no cancellation token is active
+    """
+    token = get_cancellation_token()
+    if token is None:
+        return None
+
+    deadline = token.get_deadline()
+
+    def interrupt_if_cancelled(progress):
+        if token.is_cancelled() or (deadline is not None
+                                    and deadline.is_expired()):
+            return openravepy.PlannerAction.Interrupt
+        return None
+
+    return planner.RegisterPlanCallback(interrupt_if_cancelled)
+
+
+@contextmanager
+def _planning_scope(cancel_token, deadline=None):
+    # Inherit the token of the enclosing call (e.g. a meta-planner) if the
+    # caller did not explicitly pass one.
+    if cancel_token is None:
+        cancel_token = get_cancellation_token()
+
+    # A deadline is attached to a child token, so it applies to this call and
+    # everything it spawns without affecting the enclosing call.
+    if deadline is not None:
+        if not isinstance(deadline, Deadline):
+            deadline = Deadline(deadline)
+        cancel_token = CancellationToken(parent=cancel_token,
+                                         deadline=deadline)
+
+    with cancellation_scope(cancel_token):
+        raise_if_cancelled()
+        yield
+
+
+def _apply_self_collision_filter(instance, cloned_robot):
+    self_collision_filter = getattr(instance, 'self_collision_filter', None)
+    if self_collision_filter is not None:
+        self_collision_filter.apply(cloned_robot)
+
+
+def _fix_cloned_active_dofs(robot, cloned_robot):
+    # Check for mismatches in the cloning and hackily reset them.
+    # (This is due to a possible bug in OpenRAVE environment
+    # cloning where in certain situations, the Active DOF ordering
+    # and values do not match the parent environment.  It seems to
+    # be exacerbated by multirotation joints, but the exact cause
+    # and repeatability is unclear at this point.)
+    joint_indices = [robot.GetActiveDOFIndices(),
+                     cloned_robot.GetActiveDOFIndices()]
+    joint_values = [robot.GetActiveDOFValues(),
+                    cloned_robot.GetActiveDOFValues()]
+
+    if not numpy.array_equal(joint_indices[0], joint_indices[1]):
+        logger.warning(
+            "Cloned Active DOF index mismatch: %s != %s",
+            str(joint_indices[0]), str(joint_indices[1]))
+        cloned_robot.SetActiveDOFs(joint_indices[0])
+
+    if not numpy.allclose(joint_values[0], joint_values[1]):
+        logger.warning(
+            "Cloned Active DOF value mismatch: %s != %s",
+            str(joint_values[0]), str(joint_values[1]))
+        cloned_robot.SetActiveDOFValues(joint_values[0])
+
+
+# Maps the environment IDs used by Planner.PlanBatch to the snapshot that the
+# batch plans from. Snapshots are not modified while the batch runs. Each
+# parallel query plans in its own clone of the snapshot, which has the same
+# state as the snapshot when the query starts.
+_batch_snapshots = dict()
+_batch_snapshot_lock = threading.Lock()
+
+# Maps the environment ID of each snapshot to the ClonePools that hold clones
+# of it. These clones are destroyed with the snapshot.
+_batch_clone_pools = collections.defaultdict(set)
+
+
+def _is_batch_snapshot(env):
+    return _get_batch_snapshot(env) is not None
+
+
+def _get_batch_snapshot(env):
+    env_id = openravepy.RaveGetEnvironmentId(env)
+    with _batch_snapshot_lock:
+        return _batch_snapshots.get(env_id)
+
+
+@contextmanager
+def _batch_snapshot(env, snapshot_env=None):
+    env_id = openravepy.RaveGetEnvironmentId(env)
+    with _batch_snapshot_lock:
+        _batch_snapshots[env_id] = snapshot_env or env
+    try:
+        yield env
+    finally:
+        with _batch_snapshot_lock:
+            _batch_snapshots.pop(env_id, None)
+            clone_pools = _batch_clone_pools.pop(env_id, ())
+
+        for clone_pool in clone_pools:
+            clone_pool.clear(env)
+
+
+def _register_batch_clone_pool(snapshot_env, clone_pool):
+    env_id = openravepy.RaveGetEnvironmentId(snapshot_env)
+    with _batch_snapshot_lock:
+        _batch_clone_pools[env_id].add(clone_pool)
+
+
+@contextmanager
+def _restore_body_states(env):
+    KinBodySave = openravepy.KinBody.SaveParameters
+    RobotSave = openravepy.Robot.SaveParameters
+
+    savers = []
+    for body in env.GetBodies():
+        if body.IsRobot():
+            savers.append(body.CreateRobotStateSaver(
+                RobotSave.LinkTransformation | RobotSave.LinkEnable
+                | RobotSave.ActiveDOF | RobotSave.ActiveManipulator
+                | RobotSave.GrabbedBodies))
+        else:
+            savers.append(body.CreateKinBodyStateSaver(
+                KinBodySave.LinkTransformation | KinBodySave.LinkEnable))
+
+    try:
+        yield
+    finally:
+        for saver in savers:
+            saver.Restore()
+            saver.Release()
+
+
 class LockedPlanningMethod(object):
     """
     Decorate a planning method that locks the calling environment.
+
+    Decorated methods accept an optional `cancel_token` keyword argument. The
+    token (or, if omitted, the token of the enclosing call) is active while the
+    planner runs and can be polled with raise_if_cancelled().
+
+    Decorated methods also accept an optional `deadline` keyword argument,
+    either a prpy.futures.Deadline or a timeout in seconds. The deadline bounds
+    the wall-clock time of this call, including all delegate calls; planners
+    query it with get_remaining_time().
     """
     def __init__(self, func):
         self.func = func
 
     def __call__(self, instance, robot, *args, **kw_args):
-        with robot.GetEnv():
+        cancel_token = kw_args.pop('cancel_token', None)
+        deadline = kw_args.pop('deadline', None)
+
+        with _planning_scope(cancel_token, deadline), robot.GetEnv():
             # Perform the actual planning operation.
-            traj = self.func(instance, robot, *args, **kw_args)
+            with metrics.timed('planner', str(instance), self.func.__name__):
+                traj = self.func(instance, robot, *args, **kw_args)
 
             # Tag the trajectory with the planner and planning method
             # used to generate it. We don't overwrite these tags if
@@ -132,37 +346,43 @@ class ClonedPlanningMethod(LockedPlanningMethod):
     Decorate a planning method that clones the calling environment.
     """
     def __call__(self, instance, robot, *args, **kw_args):
+        cancel_token = kw_args.pop('cancel_token', None)
+        deadline = kw_args.pop('deadline', None)
+
+        with _planning_scope(cancel_token, deadline):
+            return self._call_cloned(instance, robot, *args, **kw_args)
+
+    def _call_cloned(self, instance, robot, *args, **kw_args):
         env = robot.GetEnv()
 
-        # Store the original joint values and indices.
-        joint_indices = [robot.GetActiveDOFIndices(), None]
-        joint_values = [robot.GetActiveDOFValues(), None]
+        if _is_batch_snapshot(env):
+            return self._call_batch(instance, robot, *args, **kw_args)
 
         try:
-            with Clone(env, clone_env=instance.env) as cloned_env:
-                cloned_robot = cloned_env.Cloned(robot)
+            clone_start_time = time.time()
 
-                # Store the cloned joint values and indices.
-                joint_indices[1] = cloned_robot.GetActiveDOFIndices()
-                joint_values[1] = cloned_robot.GetActiveDOFValues()
-
-                # Check for mismatches in the cloning and hackily reset them.
-                # (This is due to a possible bug in OpenRAVE environment
-                # cloning where in certain situations, the Active DOF ordering
-                # and values do not match the parent environment.  It seems to
-                # be exacerbated by multirotation joints, but the exact cause
-                # and repeatability is unclear at this point.)
-                if not numpy.array_equal(joint_indices[0], joint_indices[1]):
-                    logger.warning(
-                        "Cloned Active DOF index mismatch: %s != %s",
-                        str(joint_indices[0]), str(joint_indices[1]))
-                    cloned_robot.SetActiveDOFs(joint_indices[0])
+            # Planners with a ClonePool plan in a pooled environment, so
+            # concurrent calls do not serialize on instance.env.
+            clone_pool = getattr(instance, 'clone_pool', None)
+            if clone_pool is not None:
+                clone_kwargs = dict(pool=clone_pool)
+            else:
+                clone_kwargs = dict(clone_env=instance.env, incremental=True)
 
-                if not numpy.allclose(joint_values[0], joint_values[1]):
-                    logger.warning(
-                        "Cloned Active DOF value mismatch: %s != %s",
-                        str(joint_values[0]), str(joint_values[1]))
-                    cloned_robot.SetActiveDOFValues(joint_values[0])
+            # Only clone the bodies that a fixed-base robot can reach.
+            reach_padding = getattr(instance, 'clone_reach_padding', None)
+            if reach_padding is not None and not robot.GetAffineDOF():
+                with env:
+                    clone_kwargs['region'] = ComputeReachAABB(
+                        robot, padding=reach_padding)
+
+            with Clone(env, **clone_kwargs) as cloned_env:
+                metrics.record('clone', str(instance), self.func.__name__,
+                               time.time() - clone_start_time)
+
+                cloned_robot = cloned_env.Cloned(robot)
+                _fix_cloned_active_dofs(robot, cloned_robot)
+                _apply_self_collision_filter(instance, cloned_robot)
 
                 traj = super(ClonedPlanningMethod, self).__call__(
                     instance, cloned_robot, *args, **kw_args)
@@ -170,6 +390,69 @@ class ClonedPlanningMethod(LockedPlanningMethod):
         except CloneException as e:
             raise ClonedPlanningError(e)
 
+    def _call_batch(self, instance, robot, *args, **kw_args):
+        env = robot.GetEnv()
+        snapshot_env = _get_batch_snapshot(env)
+
+        # Planners with a ClonePool plan in a pooled clone of the snapshot,
+        # so parallel queries do not serialize on instance.env. The pooled
+        # environments are synced incrementally from the snapshot.
+        clone_pool = getattr(instance, 'clone_pool', None)
+        if clone_pool is not None:
+            _register_batch_clone_pool(snapshot_env, clone_pool)
+
+            try:
+                clone_start_time = time.time()
+
+                with Clone(snapshot_env, pool=clone_pool) as cloned_env:
+                    metrics.record('clone', str(instance), self.func.__name__,
+                                   time.time() - clone_start_time)
+
+                    cloned_robot = cloned_env.Cloned(robot)
+                    _fix_cloned_active_dofs(robot, cloned_robot)
+                    _apply_self_collision_filter(instance, cloned_robot)
+
+                    traj = super(ClonedPlanningMethod, self).__call__(
+                        instance, cloned_robot, *args, **kw_args)
+                    return CopyTrajectory(traj, env=env)
+            except CloneException as e:
+                raise ClonedPlanningError(e)
+
+        # The snapshot of a PlanBatch call does not change, so instance.env
+        # only needs to be cloned if it was last cloned from another
+        # environment. Holding the lock prevents other calls from re-cloning
+        # instance.env while we plan in it; planners without a ClonePool can
+        # only plan one query at a time in instance.env anyway.
+        with instance.env:
+            clone_parent = getattr(instance.env, 'clone_parent', None)
+
+            if (clone_parent is None
+                    or openravepy.RaveGetEnvironmentId(clone_parent)
+                    != openravepy.RaveGetEnvironmentId(snapshot_env)):
+                clone_start_time = time.time()
+
+                try:
+                    with Clone(snapshot_env, clone_env=instance.env,
+                               lock=False):
+                        pass
+                except CloneException as e:
+                    raise ClonedPlanningError(e)
+
+                metrics.record('clone', str(instance), self.func.__name__,
+                               time.time() - clone_start_time)
+
+            cloned_robot = Cloned(robot, into=instance.env)
+            _fix_cloned_active_dofs(robot, cloned_robot)
+            _apply_self_collision_filter(instance, cloned_robot)
+
+            # Restore the cloned environment after planning so the next query
+            # in the batch starts from the snapshot state.
+            with _restore_body_states(instance.env):
+                traj = super(ClonedPlanningMethod, self).__call__(
+                    instance, cloned_robot, *args, **kw_args)
+
+            return CopyTrajectory(traj, env=env)
+
 
 class PlanningMethod(ClonedPlanningMethod):
     def __init__(self, func):
@@ -192,12 +475,115 @@ class Planner(object):
     def get_planning_method_names(self):
         return filter(lambda method_name: self.has_planning_method(method_name), dir(self))
 
+    def PlanBatch(self, robot, queries, parallel=False, executor=None):
+        """
+        Run many planning queries against one snapshot of the environment.
+
+        The environment is cloned once into a snapshot and every query is
+        planned from the snapshot state. ClonedPlanningMethods clone the
+        snapshot into their planning environment at most once per batch,
+        instead of once per query, and restore it between queries.
+
+        If parallel is True, each query runs in its own clone of the snapshot,
+        so queries to planning methods that lock the robot's environment do
+        not block each other. These clones are reused by later queries and
+        synced incrementally. ClonedPlanningMethods of planners with a
+        clone_pool also plan in their own pooled environments; other planners
+        plan one query at a time in their planning environment.
+
+        Each query is a tuple (method, args, kw_args), where method is the
+        name of a planning method and args and kw_args are its arguments
+        without the robot, e.g. ('PlanToConfiguration', (goal,), {}).
+
+        @param robot robot to plan for
+        @param queries list of (method, args, kw_args) tuples
+        @param parallel run the queries concurrently on an executor
+        @param executor ThreadPoolExecutor used if parallel is True; defaults
+                        to prpy.futures.get_default_executor()
+        @return list containing, for each query, the trajectory or the
+                exception raised by that query
+        """
+        env = robot.GetEnv()
+        results = [None] * len(queries)
+
+        with Clone(env, lock=False) as snapshot_env, \
+                _batch_snapshot(snapshot_env):
+            snapshot_robot = snapshot_env.Cloned(robot)
+
+            def call_query(method, args, kw_args):
+                planning_method = getattr(self, method)
+                traj = planning_method(snapshot_robot, *args, **kw_args)
+                return CopyTrajectory(traj, env=env)
+
+            if parallel:
+                executor = executor or get_default_executor()
+                worker_pool = ClonePool(size=executor.max_workers)
+
+                def call_query_in_clone(method, args, kw_args):
+                    with Clone(snapshot_env, pool=worker_pool, lock=False) \
+                            as worker_env, \
+                            _batch_snapshot(worker_env, snapshot_env):
+                        planning_method = getattr(self, method)
+                        traj = planning_method(worker_env.Cloned(robot),
+                                               *args, **kw_args)
+                        return CopyTrajectory(traj, env=env)
+
+                futures = [executor.submit(call_query_in_clone, *query)
+                           for query in queries]
+
+                try:
+                    for index, future in enumerate(futures):
+                        executor.run_inline(future)
+
+                        try:
+                            results[index] = future.result()
+                        except CancelledPlanningError:
+                            raise
+                        except Exception as e:
+                            results[index] = e
+                finally:
+                    for future in futures:
+                        future.cancel()
+
+                    # Wait for running queries to return their clones.
+                    for future in futures:
+                        try:
+                            future.exception()
+                        except CancelledError:
+                            pass
+
+                    worker_pool.clear()
+            else:
+                for index, query in enumerate(queries):
+                    raise_if_cancelled()
+
+                    try:
+                        results[index] = call_query(*query)
+                    except CancelledPlanningError:
+                        raise
+                    except Exception as e:
+                        results[index] = e
+
+        return results
+
 
 class BasePlanner(Planner):
     def __init__(self):
         super(BasePlanner, self).__init__()
         self.env = openravepy.Environment()
 
+        # Optional ClonePool used by ClonedPlanningMethods instead of env.
+        # Only set this on planners that do not bind plugins to self.env.
+        self.clone_pool = None
+
+        # If set, ClonedPlanningMethods only clone the bodies within this
+        # distance of the robot's reachable workspace.
+        self.clone_reach_padding = None
+
+        # Optional SelfCollisionFilter that ClonedPlanningMethods apply to the
+        # cloned robot. The caller's robot is not modified.
+        self.self_collision_filter = None
+
 
 class MetaPlanner(Planner):
     __metaclass__ = abc.ABCMeta
@@ -245,7 +631,12 @@ class MetaPlanner(Planner):
                                  repr(self), method_name))
 
         def meta_wrapper(*args, **kw_args):
-            return self.plan(method_name, args, kw_args)
+            cancel_token = kw_args.pop('cancel_token', None)
+            deadline = kw_args.pop('deadline', None)
+
+            with _planning_scope(cancel_token, deadline), \
+                    metrics.timed('meta', str(self), method_name):
+                return self.plan(method_name, args, kw_args)
 
         # Grab docstrings from the delegate planners.
         meta_wrapper.__name__ = method_name
@@ -307,19 +698,40 @@ class Sequence(MetaPlanner):
 
         errors = dict()
         is_sequence_deterministic = True
+        attempted = set()
+
+        for planner in self._get_ordered_planners(method):
+            # Planners share the deadline of this call, so stop once it has
+            # passed instead of querying the remaining planners.
+            raise_if_cancelled()
 
-        for planner in self._planners:
             e = None
 
             try:
                 if planner.has_planning_method(method):
                     logger.info('Sequence - Calling planner "%s".', str(planner))
                     planner_method = getattr(planner, method)
-
-                    with Timer() as timer:
-                        output = planner_method(*args, **kw_args)
-
-                    if not is_sequence_deterministic:
+                    attempted.add(planner)
+
+                    try:
+                        with Timer() as timer:
+                            output = planner_method(*args, **kw_args)
+                    except PlanningError as e:
+                        if not isinstance(e, CancelledPlanningError):
+                            self._record_result(planner, method, False,
+                                                timer.get_duration())
+                        raise
+
+                    self._record_result(planner, method, True,
+                                        timer.get_duration())
+
+                    # The result is only deterministic if every planner that
+                    # precedes this one in constructor order was attempted.
+                    is_reordered = any(
+                        p not in attempted and p.has_planning_method(method)
+                        for p in self._planners[:self._planners.index(planner)])
+
+                    if not is_sequence_deterministic or is_reordered:
                         # TODO: It is overly conservative to set _ENDPOINT,
                         # e.g. for PlanToConfiguration. Unfortunately, there is
                         # no easy way to detect this special case.
@@ -332,9 +744,10 @@ class Sequence(MetaPlanner):
                             logger.warning(
                                 'Tagging trajectory as non-deterministic because an'
                                 ' earlier planner in the Sequence threw a'
-                                ' non-deterministic PlanningError. Pass the'
-                                ' "allow_nondeterministic" to this Sequence'
-                                ' constructor if you intended this behavior.')
+                                ' non-deterministic PlanningError or was'
+                                ' skipped. Pass the "allow_nondeterministic" to'
+                                ' this Sequence constructor if you intended'
+                                ' this behavior.')
 
                     logger.info('Sequence - Planning succeeded after %.3f'
                                 ' seconds with "%s".',
@@ -343,6 +756,8 @@ class Sequence(MetaPlanner):
                 else:
                     logger.debug('Sequence - Skipping planner "%s"; does not'
                                  ' have "%s" method.', str(planner), method)
+            except CancelledPlanningError:
+                raise
             except MetaPlanningError as e:
                 pass # Exception handled below.
             except PlanningError as e:
@@ -364,11 +779,48 @@ class Sequence(MetaPlanner):
         raise MetaPlanningError(
             'All planners failed.', errors, deterministic=is_sequence_deterministic)
 
+    def _get_ordered_planners(self, method):
+        """
+        Get the order in which planners are queried for a method.
+
+        @param method name of the planning method
+        @return list of planners
+        """
+        return list(self._planners)
+
+    def _record_result(self, planner, method, success, duration):
+        """
+        Callback invoked after each planner is queried.
+
+        @param planner planner that was queried
+        @param method name of the planning method
+        @param success True if the planner returned a trajectory
+        @param duration planning time, in seconds
+        """
+        pass
+
 
 class Ranked(MetaPlanner):
-    def __init__(self, *planners):
+    KNOWN_KWARGS = set(['executor'])
+
+    def __init__(self, *planners, **kwargs):
+        """
+        Query planners in parallel and return the highest-ranked solution.
+
+        Planners are ranked by their order in the argument list. The result
+        of a planner is returned as soon as all higher-ranked planners have
+        failed. Lower-ranked planners that are still queued or running at
+        that point are cancelled.
+
+        @param planners planners, in descending order of preference
+        @param executor ThreadPoolExecutor used to run the planners; defaults
+                        to prpy.futures.get_default_executor()
+        """
+        assert self.KNOWN_KWARGS.issuperset(kwargs.keys())
+
         super(Ranked, self).__init__()
         self._planners = planners
+        self._executor = kwargs.get('executor', None)
 
     def __str__(self):
         return 'Ranked({0:s})'.format(', '.join(map(str, self._planners)))
@@ -379,6 +831,7 @@ class Ranked(MetaPlanner):
 
     def plan(self, method, args, kw_args):
         all_planners = self._planners
+        executor = self._executor or get_default_executor()
         futures = []
         results = [None] * len(self._planners)
 
@@ -397,21 +850,39 @@ class Ranked(MetaPlanner):
                     .format(planner, method))
                 continue
             else:
-                futures.append((index, defer(call_planner, args=(planner,))))
+                futures.append(
+                    (index, executor.submit(call_planner, planner)))
 
         # Each time a planner completes, check if we have a valid result
         # (a planner found a solution and all higher-ranked planners had
         # already failed).
-        for index, future in futures:
-            try:
-                return future.result()
-            except MetaPlanningError as e:
-                results[index] = e
-            except PlanningError as e:
-                logger.warning("Planning with {:s} failed: {:s}"
-                               .format(planner, e))
-                results[index] = e
-        # TODO: if `cancel()` is supported, call it in a `finally` block here.
+        try:
+            for index, future in futures:
+                # We are about to block on this planner. If the executor has
+                # not started it yet, run it in this thread instead of waiting
+                # for a worker. This also prevents nested meta-planners from
+                # deadlocking a saturated executor.
+                executor.run_inline(future)
+
+                try:
+                    return future.result()
+                except CancelledError:
+                    # The future was cancelled before it started because the
+                    # token of this call was cancelled.
+                    raise CancelledPlanningError()
+                except CancelledPlanningError:
+                    raise
+                except MetaPlanningError as e:
+                    results[index] = e
+                except PlanningError as e:
+                    logger.warning('Planning with %s failed: %s',
+                                   all_planners[index], e)
+                    results[index] = e
+        finally:
+            # Stop any lower-ranked planners that are still queued or
+            # running; their results can no longer be used.
+            for _, future in futures:
+                future.cancel()
 
         raise MetaPlanningError("All planners failed.",
                                 dict(zip(all_planners, results)))
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2016, Carnegie Mellon University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# - Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# - Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# - Neither the name of Carnegie Mellon University nor the names of its
+#   contributors may be used to endorse or promote products derived from this
+#   software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import logging
+import numbers
+import threading
+import numpy
+import openravepy
+from openravepy import Robot
+from .base import MetaPlanner
+from ..collision import DefaultRobotCollisionCheckerFactory
+from ..util import (
+    ComputeEnvironmentHash,
+    CopyTrajectory,
+    GetCollisionCheckPts,
+    GetLinearCollisionCheckSchedule,
+    IsTimedTrajectory,
+    VanDerCorputSampleGenerator,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPlanner(MetaPlanner):
+    """Planner wrapper that caches trajectories returned by a sub-planner.
+
+    CachedPlanner delegates planning calls to the planner passed to it on
+    construction and stores every trajectory that it returns. The cache is
+    keyed on the planning method, a hash of the environment's geometric state
+    (see util.ComputeEnvironmentHash), the robot's active DOFs and active
+    manipulator, and the remaining planning arguments. Since the start
+    configuration is part of the environment state, repeating a query from
+    the same configuration in an unchanged environment returns a copy of the
+    stored trajectory instead of calling the sub-planner.
+
+    Cached trajectories are collision checked at DOF resolution, with a single
+    CheckCollisionBatch call, before they are returned. An entry that fails this check is discarded and the query is
+    forwarded to the sub-planner. Queries with arguments that cannot be hashed
+    (e.g. TSR chains or callbacks) always bypass the cache.
+
+    The cache holds at most max_size trajectories and evicts the least
+    recently used entry when it is full.
+    """
+    IGNORED_KWARGS = frozenset(['timelimit'])
+
+    def __init__(self, planner, max_size=128, validate=True,
+                 robot_checker_factory=None, decimals=6):
+        """
+        @param planner sub-planner to delegate to
+        @param max_size maximum number of cached trajectories
+        @param validate collision check cached trajectories before returning
+        @param robot_checker_factory factory used to revalidate trajectories
+        @param decimals decimals used to round state and arguments in the key
+        """
+        super(CachedPlanner, self).__init__()
+
+        if max_size < 1:
+            raise ValueError('max_size must be positive.')
+
+        if robot_checker_factory is None:
+            robot_checker_factory = DefaultRobotCollisionCheckerFactory
+
+        self.planner = planner
+        self.max_size = max_size
+        self.validate = validate
+        self.robot_checker_factory = robot_checker_factory
+        self.decimals = decimals
+
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.clear_statistics()
+
+    def __str__(self):
+        return 'Cached({0:s})'.format(self.planner)
+
+    def has_planning_method(self, method_name):
+        return self.planner.has_planning_method(method_name)
+
+    def get_planning_method_names(self):
+        return self.planner.get_planning_method_names()
+
+    def get_planners(self, method_name):
+        return [self.planner]
+
+    def clear(self):
+        """
+        Remove all trajectories from the cache.
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def clear_statistics(self):
+        """
+        Reset the hit, miss, eviction, and invalidation counters.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_statistics(self):
+        """
+        Get the cache counters.
+
+        @return dictionary of counters and the current cache size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypasses': self.bypasses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._cache),
+            }
+
+    def plan(self, method, args, kw_args):
+        if 'robot' in kw_args:
+            robot = kw_args['robot']
+        elif len(args) > 0:
+            robot = args[0]
+        else:
+            raise RuntimeError(
+                'could not retrieve robot from planning request!')
+
+        env = robot.GetEnv()
+        plan_fn = getattr(self.planner, method)
+
+        with env:
+            try:
+                key = self._make_key(robot, method, args, kw_args)
+            except TypeError as e:
+                key = None
+                logger.debug('Bypassing cache for %s: %s', method, e)
+
+            if key is not None:
+                traj = self._lookup(key)
+                if traj is not None:
+                    if not self.validate or self._is_valid(robot, traj):
+                        with self._lock:
+                            self.hits += 1
+                        return CopyTrajectory(traj, env=env)
+
+                    logger.debug(
+                        'Discarding invalid cached trajectory for %s.', method)
+                    with self._lock:
+                        self._cache.pop(key, None)
+                        self.invalidations += 1
+
+        # Release the environment lock while planning; the sub-planner may
+        # need to clone the environment from another thread.
+        with self._lock:
+            if key is None:
+                self.bypasses += 1
+            else:
+                self.misses += 1
+
+        traj = plan_fn(*args, **kw_args)
+
+        # Only store trajectories that we know how to revalidate.
+        if key is not None:
+            with env:
+                if not self.validate or self._can_validate(traj):
+                    self._store(key, CopyTrajectory(traj, env=env))
+
+        return traj
+
+    def _lookup(self, key):
+        with self._lock:
+            traj = self._cache.pop(key, None)
+            if traj is not None:
+                self._cache[key] = traj
+            return traj
+
+    def _store(self, key, traj):
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = traj
+
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def _make_key(self, robot, method, args, kw_args):
+        frozen_args = tuple(self._freeze(arg) for arg in args)
+        frozen_kwargs = tuple(sorted(
+            (key, self._freeze(value))
+            for key, value in kw_args.iteritems()
+            if key not in self.IGNORED_KWARGS))
+
+        manipulator = robot.GetActiveManipulator()
+        manipulator_name = manipulator.GetName() if manipulator else None
+
+        return (
+            method,
+            ComputeEnvironmentHash(robot.GetEnv(), decimals=self.decimals),
+            robot.GetName(),
+            tuple(robot.GetActiveDOFIndices()),
+            robot.GetAffineDOF(),
+            manipulator_name,
+            frozen_args,
+            frozen_kwargs,
+        )
+
+    def _freeze(self, value):
+        if value is None or isinstance(value, (bool, basestring)):
+            return value
+        elif isinstance(value, numbers.Integral):
+            return int(value)
+        elif isinstance(value, numbers.Real):
+            return round(float(value), self.decimals)
+        elif isinstance(value, numpy.ndarray):
+            rounded = numpy.round(value.astype(float), self.decimals)
+            return ('ndarray', value.shape, tuple(rounded.ravel().tolist()))
+        elif isinstance(value, (list, tuple)):
+            return tuple(self._freeze(v) for v in value)
+        elif isinstance(value, dict):
+            return tuple(sorted((k, self._freeze(v))
+                                for k, v in value.iteritems()))
+        elif isinstance(value, openravepy.KinBody):
+            return ('KinBody', value.GetName())
+        elif isinstance(value, openravepy.Robot.Manipulator):
+            return ('Manipulator', value.GetName())
+        else:
+            raise TypeError('Unable to hash argument of type {:s}.'.format(
+                type(value).__name__))
+
+    def _get_interpolation(self, traj):
+        cspec = traj.GetConfigurationSpecification()
+
+        try:
+            return cspec.GetGroupFromName('joint_values').interpolation
+        except openravepy.openrave_exception:
+            return None
+
+    def _can_validate(self, traj):
+        interpolation = self._get_interpolation(traj)
+        return (interpolation == 'linear'
+                or (interpolation is not None and IsTimedTrajectory(traj)))
+
+    def _get_check_configs(self, robot, traj):
+        interpolation = self._get_interpolation(traj)
+
+        if interpolation == 'linear':
+            _, configs = GetLinearCollisionCheckSchedule(
+                robot, traj, norm_order=2,
+                sampling_func=VanDerCorputSampleGenerator)
+            return configs
+        elif interpolation is not None and IsTimedTrajectory(traj):
+            return numpy.array(
+                [q for _, q in GetCollisionCheckPts(robot, traj)])
+        else:
+            return None
+
+    def _is_valid(self, robot, traj):
+        configs = self._get_check_configs(robot, traj)
+        if configs is None:
+            return False
+        elif not len(configs):
+            return True
+
+        cspec = traj.GetConfigurationSpecification()
+        dof_indices, _ = cspec.ExtractUsedIndices(robot)
+
+        with self.robot_checker_factory(robot) as robot_checker, \
+            robot.CreateRobotStateSaver(
+                Robot.SaveParameters.LinkTransformation):
+            in_collision = robot_checker.CheckCollisionBatch(
+                configs, dof_indices=dof_indices)
+
+        return not in_collision.any()
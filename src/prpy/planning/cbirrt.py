@@ -44,6 +44,7 @@ from .base import (
     PlanningError,
     Tags,
     UnsupportedPlanningError,
+    get_remaining_time,
     save_dof_limits
 )
 import contextlib
@@ -177,6 +178,9 @@ class CBiRRTPlanner(Planner):
             raise ValueError('Invalid value for "timelimit". Limit must be'
                              ' non-negative; got {:f}.'.format(timelimit))
 
+        # Do not plan past the deadline of the top-level planning call.
+        timelimit = get_remaining_time(timelimit)
+
         env = robot.GetEnv()
         problem = openravepy.RaveCreateProblem(env, 'CBiRRT')
 
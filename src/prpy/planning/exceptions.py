@@ -109,6 +109,19 @@ class TimeoutPlanningError(PlanningError):
             message, deterministic=deterministic)
 
 
+class CancelledPlanningError(PlanningError):
+    """
+    A cancelled planning error indicates that planning was abandoned because
+    the cancellation token of the planning call was cancelled, e.g. because a
+    higher-ranked planner in a Ranked meta-planner already succeeded.
+
+    Meta-planners must propagate this error instead of trying other planners.
+    """
+    def __init__(self, message='Planning was cancelled.'):
+        super(CancelledPlanningError, self).__init__(
+            message, deterministic=False)
+
+
 class MetaPlanningError(PlanningError):
     """
     A metaplanning error indicates that a planning operation that calls one or
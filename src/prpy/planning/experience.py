@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2016, Carnegie Mellon University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# - Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# - Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# - Neither the name of Carnegie Mellon University nor the names of its
+#   contributors may be used to endorse or promote products derived from this
+#   software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import logging
+import numpy
+import openravepy
+import threading
+from openravepy import Robot
+from .base import (
+    LockedPlanningMethod,
+    Planner,
+    PlanningError,
+    raise_if_cancelled,
+)
+from .exceptions import CancelledPlanningError
+from ..collision import DefaultRobotCollisionCheckerFactory
+from ..trajectory import GetJointValueOffsets
+from ..util import AdaptTrajectory, CheckJointLimits
+
+logger = logging.getLogger(__name__)
+
+Experience = collections.namedtuple('Experience',
+    ['start', 'goal', 'waypoints'])
+
+
+class ExperiencePlanner(Planner):
+    """Planner that reuses previous solutions from a trajectory library.
+
+    ExperiencePlanner stores joint-space paths in a library indexed by their
+    (start, goal) configurations. To plan to a new configuration, it retrieves
+    the num_neighbors closest paths, warps each of them to the new start and
+    goal with util.AdaptTrajectory, and collision checks the warped path at DOF
+    resolution. Segments that are in collision are repaired by calling
+    PlanToConfiguration on the delegate planner between the nearest valid
+    waypoints. A candidate is discarded if it requires more than max_repairs
+    repairs.
+
+    If no candidate can be repaired, the query is forwarded to the delegate
+    planner. Every path returned by this planner is added to the library, so
+    repetitive tasks quickly stop requiring full planning queries.
+
+    The nearest-neighbor index of a library is rebuilt once index_batch_size
+    paths were added since it was built. Newer paths are searched linearly.
+    The library is safe to use from multiple threads.
+    """
+    def __init__(self, delegate_planner, num_neighbors=3, max_repairs=2,
+                 max_experiences=1000, index_batch_size=32,
+                 robot_checker_factory=None):
+        """
+        @param delegate_planner planner used to repair invalid segments and to
+                                plan from scratch when retrieval fails
+        @param num_neighbors number of library paths to try per query
+        @param max_repairs maximum number of repaired segments per candidate
+        @param max_experiences maximum number of paths stored per set of
+                               active DOFs; the oldest paths are discarded
+        @param index_batch_size number of paths added to a library before its
+                                nearest-neighbor index is rebuilt
+        @param robot_checker_factory factory used to collision check paths
+        """
+        super(ExperiencePlanner, self).__init__()
+
+        if robot_checker_factory is None:
+            robot_checker_factory = DefaultRobotCollisionCheckerFactory
+
+        self.delegate_planner = delegate_planner
+        self.num_neighbors = num_neighbors
+        self.max_repairs = max_repairs
+        self.max_experiences = max_experiences
+        self.index_batch_size = index_batch_size
+        self.robot_checker_factory = robot_checker_factory
+
+        # Maps each set of active DOFs to its library, to the KD-tree of the
+        # paths in the library when the tree was built and to the list of
+        # those paths, and to the paths that were added since then.
+        self._libraries = collections.defaultdict(
+            lambda: collections.deque(maxlen=max_experiences))
+        self._indices = dict()
+        self._unindexed = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return 'ExperiencePlanner({0:s})'.format(self.delegate_planner)
+
+    def clear(self):
+        """
+        Remove all paths from the library.
+        """
+        with self._lock:
+            self._libraries.clear()
+            self._indices.clear()
+            self._unindexed.clear()
+
+    def add_experience(self, robot, traj):
+        """
+        Add a joint-space path to the library.
+
+        The path is stored in terms of the robot's active DOFs, which must
+        match the DOFs of the trajectory.
+
+        @param robot robot whose active DOFs are used to parse the path
+        @param traj trajectory to add to the library
+        """
+        waypoints = self._GetActiveWaypoints(robot, traj)
+        if len(waypoints) < 2:
+            return
+
+        key = tuple(robot.GetActiveDOFIndices())
+        experience = Experience(
+            start=waypoints[0], goal=waypoints[-1], waypoints=waypoints)
+
+        with self._lock:
+            self._libraries[key].append(experience)
+            self._unindexed[key].append(experience)
+
+    def get_neighbors(self, robot, start, goal, k):
+        """
+        Find the k paths in the library with the closest (start, goal).
+
+        @param robot robot whose active DOFs identify the library
+        @param start start configuration
+        @param goal goal configuration
+        @param k maximum number of paths to return
+        @return list of Experience, sorted by increasing distance
+        """
+        key = tuple(robot.GetActiveDOFIndices())
+        query = numpy.concatenate((start, goal))
+
+        with self._lock:
+            library = self._libraries.get(key)
+            if not library:
+                return []
+
+            index, indexed = self._indices.get(key, (None, []))
+            unindexed = self._unindexed[key]
+
+            # The library discards its oldest paths first, so the discarded
+            # paths are the first num_discarded paths in the index.
+            num_discarded = len(indexed) + len(unindexed) - len(library)
+
+            if (index is None or len(unindexed) >= self.index_batch_size
+                    or num_discarded >= len(indexed)):
+                from scipy.spatial import cKDTree
+
+                indexed = list(library)
+                index = cKDTree(numpy.array([
+                    numpy.concatenate((experience.start, experience.goal))
+                    for experience in indexed]))
+                self._indices[key] = (index, indexed)
+                self._unindexed[key] = unindexed = []
+                num_discarded = 0
+
+            unindexed = list(unindexed)
+
+        distances, neighbor_indices = index.query(
+            query, k=min(k + num_discarded, len(indexed)))
+        neighbors = [
+            (distance, indexed[i]) for distance, i
+            in zip(numpy.atleast_1d(distances),
+                   numpy.atleast_1d(neighbor_indices))
+            if i >= num_discarded]
+
+        neighbors.extend(
+            (numpy.linalg.norm(numpy.concatenate(
+                (experience.start, experience.goal)) - query), experience)
+            for experience in unindexed)
+        neighbors.sort(key=lambda neighbor: neighbor[0])
+        return [experience for _, experience in neighbors[:k]]
+
+    @LockedPlanningMethod
+    def PlanToConfiguration(self, robot, goal, **kw_args):
+        """
+        Plan to a configuration by adapting and repairing a previous path.
+
+        @param robot
+        @param goal desired configuration
+        @return traj
+        """
+        goal = numpy.array(goal, dtype=float)
+        start = robot.GetActiveDOFValues()
+        CheckJointLimits(robot, goal, deterministic=True)
+
+        neighbors = self.get_neighbors(robot, start, goal, self.num_neighbors)
+
+        for experience in neighbors:
+            raise_if_cancelled()
+
+            try:
+                waypoints = self._AdaptExperience(
+                    robot, experience, start, goal, **kw_args)
+            except CancelledPlanningError:
+                raise
+            except PlanningError as e:
+                logger.debug('Unable to reuse experience: %s', e)
+                continue
+
+            traj = self._CreatePath(robot, waypoints)
+            self.add_experience(robot, traj)
+            return traj
+
+        logger.debug('Unable to reuse any of %d experiences; planning with'
+                     ' %s.', len(neighbors), self.delegate_planner)
+        traj = self.delegate_planner.PlanToConfiguration(
+            robot, goal, **kw_args)
+        self.add_experience(robot, traj)
+        return traj
+
+    def _AdaptExperience(self, robot, experience, start, goal, **kw_args):
+        path = self._CreatePath(robot, experience.waypoints)
+        warped_path = AdaptTrajectory(path, start, goal, robot)
+        waypoints = self._GetActiveWaypoints(robot, warped_path)
+
+        # The warped endpoints are only approximately equal to the query.
+        waypoints[0] = start
+        waypoints[-1] = goal
+
+        with self.robot_checker_factory(robot) as robot_checker, \
+            robot.CreateRobotStateSaver(
+                Robot.SaveParameters.LinkTransformation):
+            is_valid = [self._IsValidConfiguration(robot, robot_checker, q)
+                        for q in waypoints]
+
+            if not is_valid[-1]:
+                raise PlanningError('Goal configuration is invalid.',
+                                    deterministic=True)
+
+            # The start configuration is checked by the delegate planner if
+            # any segment needs to be repaired.
+            anchors = [0] + [i for i in xrange(1, len(waypoints))
+                             if is_valid[i]]
+
+            repairs = []
+            for ianchor, inext in zip(anchors[:-1], anchors[1:]):
+                if (inext == ianchor + 1
+                        and self._IsValidSegment(robot, robot_checker,
+                                                 waypoints[ianchor],
+                                                 waypoints[inext])):
+                    continue
+
+                repairs.append((ianchor, inext))
+                if len(repairs) > self.max_repairs:
+                    raise PlanningError(
+                        'Adapted path requires more than {:d} repairs.'.format(
+                            self.max_repairs))
+
+        # Replace each invalid section of the path with a new plan between
+        # the surrounding valid waypoints.
+        repaired_waypoints = [waypoints[0]]
+        inext_waypoint = 1
+
+        for ianchor, inext in repairs:
+            repaired_waypoints.extend(waypoints[inext_waypoint:ianchor + 1])
+
+            with robot.CreateRobotStateSaver(
+                    Robot.SaveParameters.LinkTransformation):
+                robot.SetActiveDOFValues(waypoints[ianchor])
+                repair_traj = self.delegate_planner.PlanToConfiguration(
+                    robot, waypoints[inext], **kw_args)
+
+            repair_waypoints = self._GetActiveWaypoints(robot, repair_traj)
+            repaired_waypoints.extend(repair_waypoints[1:-1])
+            repaired_waypoints.append(waypoints[inext])
+            inext_waypoint = inext + 1
+
+        repaired_waypoints.extend(waypoints[inext_waypoint:])
+        return repaired_waypoints
+
+    def _IsValidConfiguration(self, robot, robot_checker, q):
+        lower_limits, upper_limits = robot.GetActiveDOFLimits()
+        if (q < lower_limits).any() or (q > upper_limits).any():
+            return False
+
+        robot.SetActiveDOFValues(q)
+        return not robot_checker.CheckCollision()
+
+    def _IsValidSegment(self, robot, robot_checker, q0, q1):
+        q_resolutions = robot.GetActiveDOFResolutions()
+        num_steps = int(numpy.ceil(numpy.max(numpy.abs(q1 - q0)
+                                             / q_resolutions)))
+
+        # Both endpoints have already been checked.
+        for istep in xrange(1, num_steps):
+            robot.SetActiveDOFValues(q0 + (q1 - q0) * istep / num_steps)
+            if robot_checker.CheckCollision():
+                return False
+
+        return True
+
+    def _CreatePath(self, robot, waypoints):
+        cspec = robot.GetActiveConfigurationSpecification('linear')
+        traj = openravepy.RaveCreateTrajectory(robot.GetEnv(), '')
+        traj.Init(cspec)
+
+        # Insert all waypoints with a single call.
+        offsets = GetJointValueOffsets(cspec, robot,
+                                       robot.GetActiveDOFIndices())
+        data = numpy.zeros((len(waypoints), cspec.GetDOF()))
+        data[:, offsets] = waypoints
+        traj.Insert(0, data.ravel())
+
+        return traj
+
+    def _GetActiveWaypoints(self, robot, traj):
+        cspec = traj.GetConfigurationSpecification()
+        dof_indices = robot.GetActiveDOFIndices()
+        return [cspec.ExtractJointValues(traj.GetWaypoint(i), robot,
+                                         dof_indices, 0)
+                for i in xrange(traj.GetNumWaypoints())]
@@ -33,7 +33,9 @@ import openravepy
 from .. import ik_ranking
 from base import (Planner,
                   PlanningError,
-                  LockedPlanningMethod)
+                  LockedPlanningMethod,
+                  raise_if_cancelled)
+from .exceptions import CancelledPlanningError
 
 logger = logging.getLogger(__name__)
 
@@ -119,11 +121,17 @@ class IKPlanner(Planner):
 
             num_attempts = min(ranked_ik_solutions.shape[0], num_attempts)
             for i, ik_sol in enumerate(ranked_ik_solutions[0:num_attempts, :]):
+                # Every attempt shares the deadline of this call, so stop once
+                # it has passed instead of starting another attempt.
+                raise_if_cancelled()
+
                 try:
                     traj = planner.PlanToConfiguration(robot, ik_sol)
                     logger.info('Planned to IK solution %d of %d.',
                                 i + 1, num_attempts)
                     return traj
+                except CancelledPlanningError:
+                    raise
                 except PlanningError as e:
                     logger.warning(
                         'Planning to IK solution %d of %d failed: %s',
@@ -31,7 +31,8 @@
 import logging, numpy, openravepy, time
 from ..util import SetTrajectoryTags
 from base import (BasePlanner, PlanningError,
-                  ClonedPlanningMethod, Tags)
+                  ClonedPlanningMethod, Tags, raise_if_cancelled)
+from .exceptions import CancelledPlanningError
 
 logger = logging.getLogger(__name__)
 
@@ -168,6 +169,9 @@ class MKPlanner(BasePlanner):
                     if timelimit is not None and current_time - start_time > timelimit:
                         raise PlanningError('Reached time limit.')
 
+                    # Stop if this planning call was abandoned.
+                    raise_if_cancelled()
+
                     # Compute joint velocities using the Jacobian pseudoinverse.
                     q_dot = self.GetStraightVelocity(manip, direction, initial_pose, nullspace, step_size, sign_flipper=sign_flipper)
                     q += q_dot
@@ -209,6 +213,8 @@ class MKPlanner(BasePlanner):
                     hand_pose = manip.GetEndEffectorTransform()
                     displacement = hand_pose[0:3, 3] - initial_pose[0:3, 3]
                     current_distance = numpy.dot(displacement, direction)
+            except CancelledPlanningError:
+                raise
             except PlanningError as e:
                 # Throw an error if we haven't reached the minimum distance.
                 if current_distance < distance:
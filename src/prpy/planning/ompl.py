@@ -60,6 +60,9 @@ from .base import (
     PlanningError,
     Tags,
     UnsupportedPlanningError,
+    get_remaining_time,
+    raise_if_cancelled,
+    register_cancellation_callback,
 )
 from .cbirrt import SerializeTSRChain
 
@@ -156,6 +159,9 @@ class OMPLPlanner(Planner):
         if timelimit <= 0.:
             raise ValueError('"timelimit" must be positive.')
 
+        # Do not plan past the deadline of the top-level planning call.
+        timelimit = get_remaining_time(timelimit)
+
         extraParams += '<time_limit>{:f}</time_limit>'.format(timelimit)
 
         env = robot.GetEnv()
@@ -219,6 +225,10 @@ class OMPLPlanner(Planner):
 
         planner.InitPlan(robot, params)
 
+        # Interrupt the planner if this call is cancelled. The callback stays
+        # registered for as long as the handle is alive.
+        callback_handle = register_cancellation_callback(planner)
+
         # Bypass the context manager since or_ompl does its own baking.
         env = robot.GetEnv()
         robot_checker = self.robot_checker_factory(robot)
@@ -228,6 +238,8 @@ class OMPLPlanner(Planner):
             traj = RaveCreateTrajectory(env, 'GenericTrajectory')
             status = planner.PlanPath(traj, releasegil=True)
 
+        raise_if_cancelled()
+
         if status not in [PlannerStatus.HasSolution,
                           PlannerStatus.InterruptedWithSolution]:
             raise PlanningError(
@@ -35,7 +35,10 @@ import openravepy
 from base import (Planner,
                   PlanningError,
                   UnsupportedPlanningError,
-                  LockedPlanningMethod)
+                  LockedPlanningMethod,
+                  raise_if_cancelled,
+                  register_cancellation_callback)
+from .exceptions import CancelledPlanningError, TimeoutPlanningError
 
 
 class OpenRAVEPlanner(Planner):
@@ -90,6 +93,11 @@ class OpenRAVEPlanner(Planner):
 
         traj = openravepy.RaveCreateTrajectory(env, 'GenericTrajectory')
 
+        # Interrupt the planner if this call is cancelled, e.g. because a
+        # higher-ranked planner in a Ranked meta-planner already succeeded.
+        # The callback stays registered for as long as the handle is alive.
+        callback_handle = register_cancellation_callback(planner)
+
         try:
             env.Lock()
 
@@ -101,11 +109,17 @@ class OpenRAVEPlanner(Planner):
                     self.setup = True
 
                 status = planner.PlanPath(traj, releasegil=True)
+
                 from openravepy import PlannerStatus
                 if status not in [PlannerStatus.HasSolution,
                                   PlannerStatus.InterruptedWithSolution]:
+                    # Report why the planner was interrupted, if it was. A
+                    # solution found before the interruption is returned.
+                    raise_if_cancelled()
                     raise PlanningError('Planner returned with status {:s}.'
                                         .format(str(status)))
+        except (CancelledPlanningError, TimeoutPlanningError):
+            raise
         except Exception as e:
             raise PlanningError('Planning failed with error: {:s}'.format(e))
         finally:
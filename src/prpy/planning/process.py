@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2016, Carnegie Mellon University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# - Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# - Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# - Neither the name of Carnegie Mellon University nor the names of its
+#   contributors may be used to endorse or promote products derived from this
+#   software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import logging
+import multiprocessing
+import traceback
+from .base import (
+    MetaPlanner,
+    PlanningError,
+    get_remaining_time,
+    raise_if_cancelled,
+)
+from ..exceptions import UnsupportedTypeSerializationException
+
+logger = logging.getLogger(__name__)
+
+# State of the current worker process. This is populated by _InitializeWorker
+# and is only used inside of worker processes.
+_worker_state = {}
+
+
+def _InitializeWorker(planner_factory):
+    import openravepy
+
+    _worker_state['env'] = openravepy.Environment()
+    _worker_state['planner'] = planner_factory()
+
+
+def _PlanInWorker(request):
+    """
+    Execute a planning request inside of a worker process.
+
+    Bodies from previous requests are re-used if their name and kinematics
+    geometry hash are unchanged, so only their state must be restored.
+
+    @param request dictionary created by ProcessPoolPlanner.plan
+    @return tuple (status, data)
+    """
+    import openravepy
+    from ..serialization import deserialize, deserialize_environment
+
+    env = _worker_state['env']
+    planner = _worker_state['planner']
+
+    try:
+        with env:
+            hashes = request['hashes']
+            reuse_bodies = [
+                body for body in env.GetBodies()
+                if hashes.get(body.GetName()) == body.GetKinematicsGeometryHash()
+            ]
+            deserialize_environment(request['environment'], env=env,
+                                    reuse_bodies=reuse_bodies)
+
+            checker_name = request['collision_checker']
+            checker = env.GetCollisionChecker()
+            if checker_name is not None and (checker is None
+                    or checker.GetXMLId() != checker_name):
+                env.SetCollisionChecker(
+                    openravepy.RaveCreateCollisionChecker(env, checker_name))
+
+            args = deserialize(env, request['args'])
+            kw_args = deserialize(env, request['kw_args'])
+
+            # Recreate the deadline of the calling process.
+            if request['timeout'] is not None:
+                kw_args['deadline'] = request['timeout']
+
+        planner_method = getattr(planner, request['method'])
+        traj = planner_method(*args, **kw_args)
+        return ('success', traj.serialize(0))
+    except PlanningError as e:
+        return ('planning_error', (str(e), e.deterministic))
+    except Exception:
+        return ('error', traceback.format_exc())
+
+
+class ProcessPoolPlanner(MetaPlanner):
+    """Planner wrapper that plans in a pool of worker processes.
+
+    Each worker process owns an OpenRAVE environment and an instance of the
+    planner created by planner_factory. A planning request serializes the
+    environment with prpy.serialization.serialize_environment, deserializes
+    it in a worker, and returns the serialized trajectory. Workers keep their
+    bodies between requests and only reload a body if its kinematics geometry
+    hash changed, so most requests only transfer body states.
+
+    This allows Python-heavy planners, e.g. VectorFieldPlanner or
+    GreedyIKPlanner, to run concurrently without contending for the GIL.
+
+    The planner_factory must be picklable, e.g. a planner class or a
+    functools.partial of one. Requests whose arguments cannot be serialized
+    (e.g. callbacks) are planned in this process instead. With uri_only=True,
+    bodies are loaded from their URIs in the worker, so geometry that was
+    modified after loading is not transferred.
+
+    Worker processes are forked on construction, before the planner of this
+    process is created. Create the ProcessPoolPlanner before creating any
+    other OpenRAVE environments to avoid forking a process with running
+    OpenRAVE threads.
+    """
+    def __init__(self, planner_factory, num_workers=None, uri_only=True,
+                 poll_interval=0.05):
+        """
+        @param planner_factory picklable callable that returns a planner
+        @param num_workers number of worker processes; defaults to the number
+                           of CPUs
+        @param uri_only serialize bodies by URI instead of by geometry
+        @param poll_interval interval used to check for cancellation while
+                             waiting for a worker, in seconds
+        """
+        super(ProcessPoolPlanner, self).__init__()
+
+        # Fork the workers before planner_factory creates an environment.
+        self._pool = multiprocessing.Pool(
+            num_workers, initializer=_InitializeWorker,
+            initargs=(planner_factory,))
+
+        self.planner = planner_factory()
+        self.uri_only = uri_only
+        self.poll_interval = poll_interval
+
+    def __str__(self):
+        return 'ProcessPool({0:s})'.format(self.planner)
+
+    def has_planning_method(self, method_name):
+        return self.planner.has_planning_method(method_name)
+
+    def get_planning_method_names(self):
+        return self.planner.get_planning_method_names()
+
+    def get_planners(self, method_name):
+        return [self.planner]
+
+    def shutdown(self):
+        """
+        Terminate the worker processes.
+        """
+        self._pool.terminate()
+        self._pool.join()
+
+    def plan(self, method, args, kw_args):
+        from openravepy import RaveCreateTrajectory
+        from ..serialization import serialize, serialize_environment
+
+        if 'robot' in kw_args:
+            robot = kw_args['robot']
+        elif len(args) > 0:
+            robot = args[0]
+        else:
+            raise RuntimeError(
+                'could not retrieve robot from planning request!')
+
+        env = robot.GetEnv()
+
+        with env:
+            try:
+                serialized_args = serialize(args)
+                serialized_kw_args = serialize(kw_args)
+            except UnsupportedTypeSerializationException as e:
+                logger.debug('Planning %s in this process: %s', method, e)
+                return getattr(self.planner, method)(*args, **kw_args)
+
+            checker = env.GetCollisionChecker()
+            request = {
+                'method': method,
+                'args': serialized_args,
+                'kw_args': serialized_kw_args,
+                'environment': serialize_environment(
+                    env, uri_only=self.uri_only),
+                'hashes': dict(
+                    (body.GetName(), body.GetKinematicsGeometryHash())
+                    for body in env.GetBodies()),
+                'collision_checker':
+                    checker.GetXMLId() if checker is not None else None,
+                'timeout': get_remaining_time(),
+            }
+
+        async_result = self._pool.apply_async(_PlanInWorker, (request,))
+
+        # We cannot interrupt the worker, but we stop waiting for it as soon
+        # as the request is cancelled.
+        while not async_result.ready():
+            raise_if_cancelled()
+            async_result.wait(self.poll_interval)
+
+        status, data = async_result.get()
+
+        if status == 'success':
+            traj = RaveCreateTrajectory(env, '')
+            traj.deserialize(data)
+            return traj
+        elif status == 'planning_error':
+            message, deterministic = data
+            raise PlanningError(message, deterministic=deterministic)
+        else:
+            raise RuntimeError(
+                'Planning in worker process failed:\n{:s}'.format(data))
@@ -28,7 +28,7 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-from base import BasePlanner, PlanningError, ClonedPlanningMethod, UnsupportedPlanningError
+from base import BasePlanner, PlanningError, ClonedPlanningMethod, UnsupportedPlanningError, get_remaining_time
 import openravepy
 
 class SBPLPlanner(BasePlanner):
@@ -83,7 +83,8 @@ class SBPLPlanner(BasePlanner):
         extents = [limits[0][0], limits[1][0], limits[0][1], limits[1][1]];
         extra_params["extents"] = extents
 
-        extra_params["timelimit"] = timelimit
+        # Do not plan past the deadline of the top-level planning call.
+        extra_params["timelimit"] = get_remaining_time(timelimit)
         if return_first:
             extra_params["return_first"] = 1
         else:
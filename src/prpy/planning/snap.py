@@ -53,13 +53,18 @@ class SnapPlanner(Planner):
     most commonly used as the first item in a Sequence meta-planner to
     avoid calling a motion planner when the trivial solution is valid.
     """
-    def __init__(self, robot_checker_factory=None):
+    def __init__(self, robot_checker_factory=None, path_validator=None):
+        """
+        @param robot_checker_factory factory used to check the path
+        @param path_validator optional ParallelPathValidator used instead
+        """
         super(SnapPlanner, self).__init__()
 
         if robot_checker_factory is None:
             robot_checker_factory = DefaultRobotCollisionCheckerFactory
 
         self.robot_checker_factory = robot_checker_factory
+        self.path_validator = path_validator
 
     def __str__(self):
         return 'SnapPlanner'
@@ -79,7 +84,7 @@ class SnapPlanner(Planner):
 
     def _Snap(self, robot, goal, **kw_args):
         from prpy.util import CheckJointLimits
-        from prpy.util import GetLinearCollisionCheckPts
+        from prpy.util import GetLinearCollisionCheckSchedule
         from prpy.planning.exceptions import CollisionPlanningError
         from prpy.planning.exceptions import SelfCollisionPlanningError
 
@@ -114,7 +119,7 @@ class SnapPlanner(Planner):
             traj.Insert(1, goal_waypoint.ravel())
 
         # Get joint configurations to check
-        # Note: this returns a python generator, and if the
+        # Note: this returns an (N, dof) array, and if the
         # trajectory only has one waypoint then only the
         # start configuration will be collisioned checked.
         #
@@ -126,20 +131,29 @@ class SnapPlanner(Planner):
         from prpy.util import VanDerCorputSampleGenerator
         vdc = VanDerCorputSampleGenerator
 
-        checks = GetLinearCollisionCheckPts(robot, traj,
-                                            norm_order=2,
-                                            sampling_func=vdc)
-
-        with self.robot_checker_factory(robot) as robot_checker, \
-            robot.CreateRobotStateSaver(Robot.SaveParameters.LinkTransformation):
-            # Run constraint checks at DOF resolution:
-            for t, q in checks:
-                # Set the joint positions
+        if self.path_validator is not None:
+            # Check long paths on several cloned environments in parallel.
+            self.path_validator.VerifyCollisionFree(robot, traj)
+        else:
+            with self.robot_checker_factory(robot) as robot_checker, \
+                robot.CreateRobotStateSaver(Robot.SaveParameters.LinkTransformation):
+                # Run constraint checks at DOF resolution:
                 # Note: the planner is using a cloned 'robot' object
-                robot.SetActiveDOFValues(q)
-
-                # Check collision (throws an exception on collision)
-                robot_checker.VerifyCollisionFree()
+                _, configs = GetLinearCollisionCheckSchedule(
+                    robot, traj, norm_order=2, sampling_func=vdc)
+                in_collision = robot_checker.CheckCollisionBatch(configs)
+
+                if in_collision.any():
+                    # Re-check the first collision to raise an exception that
+                    # describes it.
+                    robot.SetActiveDOFValues(
+                        configs[numpy.argmax(in_collision)])
+                    robot_checker.VerifyCollisionFree()
+
+                    # The batch and the re-check should agree (e.g. a cached
+                    # checker may re-verify a different configuration). Fail
+                    # conservatively if they do not.
+                    raise CollisionPlanningError(None, None)
 
         SetTrajectoryTags(traj, {
             Tags.SMOOTH: True,
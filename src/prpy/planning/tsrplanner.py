@@ -31,10 +31,10 @@ import logging
 import time
 import itertools
 import numpy
-import openravepy
 from base import (Planner, LockedPlanningMethod, PlanningError,
                   UnsupportedPlanningError)
-from .base import Tags
+from .base import Tags, get_remaining_time, raise_if_cancelled
+from .exceptions import CancelledPlanningError
 from ..util import SetTrajectoryTags
 from ..collision import DefaultRobotCollisionCheckerFactory
 from openravepy import (
@@ -102,6 +102,9 @@ class TSRPlanner(Planner):
         # Delegate to robot.planner by default.
         delegate_planner = self.delegate_planner or robot.planner
 
+        # Sampling and all planning attempts share the deadline of this call.
+        tsr_timeout = get_remaining_time(tsr_timeout)
+
         # Plan using the active manipulator.
         manipulator = robot.GetActiveManipulator()
 
@@ -132,12 +135,13 @@ class TSRPlanner(Planner):
             return ik_solutions
 
         def is_configuration_valid(ik_solution):
-            p = openravepy.KinBody.SaveParameters
-            with robot.CreateRobotStateSaver(p.LinkTransformation):
-                robot.SetActiveDOFValues(ik_solution)
-                return not robot_checker.CheckCollision()
+            # robot_checker is defined below.
+            return not robot_checker.CheckCollisionBatch([ik_solution])[0]
 
         def is_time_available(*args):
+            # Stop sampling if this planning call was abandoned.
+            raise_if_cancelled()
+
             # time_start and time_expired are defined below.
             return time.time() - time_start + time_expired < tsr_timeout
 
@@ -156,6 +160,8 @@ class TSRPlanner(Planner):
                         itertools.cycle(tsrchains)))))
 
         for iattempt in xrange(num_attempts):
+            raise_if_cancelled()
+
             configurations_chunk = []
             time_start = time.time()
 
@@ -183,7 +189,9 @@ class TSRPlanner(Planner):
                     candidates_scored.sort(key=lambda (score, _): score)
                     candidates_ranked = [q for _, q in candidates_scored]
 
-                    # Select valid IK solutions from the chunk.
+                    # Select valid IK solutions from the chunk. Candidates are
+                    # checked lazily in rank order, so we stop as soon as the
+                    # chunk is full or we run out of time.
                     candidates_valid = itertools.islice(
                         itertools.ifilter(
                             is_configuration_valid,
@@ -226,6 +234,8 @@ class TSRPlanner(Planner):
                 }, append=True)
 
                 return traj
+            except CancelledPlanningError:
+                raise
             except PlanningError as e:
                 logger.warning('Planning attempt %d of %d failed: %s',
                     iattempt + 1, num_attempts, e)
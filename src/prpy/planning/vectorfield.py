@@ -33,7 +33,8 @@
 import logging
 import numpy
 import openravepy
-from .base import Planner, PlanningError, LockedPlanningMethod, Tags
+from .base import (Planner, PlanningError, LockedPlanningMethod, Tags,
+                   get_remaining_time, raise_if_cancelled)
 from .. import util
 from ..collision import DefaultRobotCollisionCheckerFactory
 from enum import Enum
@@ -446,6 +447,7 @@ class VectorFieldPlanner(Planner):
         @return traj
         """
         from .exceptions import (
+            CancelledPlanningError,
             CollisionPlanningError,
             SelfCollisionPlanningError,
         )
@@ -467,6 +469,9 @@ class VectorFieldPlanner(Planner):
         env = robot.GetEnv()
         active_indices = robot.GetActiveDOFIndices()
 
+        # Do not integrate past the deadline of the top-level planning call.
+        timelimit = get_remaining_time(timelimit)
+
         # Create a new trajectory matching the current
         # robot's joint configuration specification
         cspec = robot.GetActiveConfigurationSpecification('linear')
@@ -501,6 +506,9 @@ class VectorFieldPlanner(Planner):
             if time.time() - time_start >= timelimit:
                 raise TimeLimitError()
 
+            # Stop integrating if this planning call was abandoned.
+            raise_if_cancelled()
+
             # Check joint position limits.
             # We do this before setting the joint angles.
             util.CheckJointLimits(robot, q)
@@ -585,6 +593,8 @@ class VectorFieldPlanner(Planner):
         if t_cache is None:
             raise exception or PlanningError(
                 'An unknown error has occurred.', deterministic=True)
+        elif isinstance(exception, CancelledPlanningError):
+            raise exception
         elif exception:
             logger.warning('Terminated early: %s', str(exception))
 
@@ -34,7 +34,8 @@ import numpy
 import openravepy
 import time
 from ..util import SetTrajectoryTags
-from base import Planner, PlanningError, LockedPlanningMethod, Tags
+from base import (Planner, PlanningError, LockedPlanningMethod, Tags,
+                  raise_if_cancelled)
 from openravepy import Robot
 
 logger = logging.getLogger(__name__)
@@ -175,6 +176,7 @@ class GreedyIKPlanner(Planner):
         env = robot.GetEnv()
 
         from .exceptions import (
+            CancelledPlanningError,
             TimeoutPlanningError,
             CollisionPlanningError,
             SelfCollisionPlanningError
@@ -223,6 +225,9 @@ class GreedyIKPlanner(Planner):
                             current_time - start_time > timelimit):
                         raise TimeoutPlanningError(timelimit, deterministic=True)
 
+                    # Stop if this planning call was abandoned.
+                    raise_if_cancelled()
+
                     # Hypothesize new configuration as closest IK to current
                     qcurr = robot.GetActiveDOFValues()  # Configuration at t.
                     qnew = manip.FindIKSolution(
@@ -254,6 +259,8 @@ class GreedyIKPlanner(Planner):
                         t = min(t + dt, traj.GetDuration())
                         dt = dt * 2.0
 
+            except CancelledPlanningError:
+                raise
             except PlanningError as e:
                 # Compute the min acceptable time from the min waypoint index.
                 if min_waypoint_index is None:
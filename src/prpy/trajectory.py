@@ -0,0 +1,490 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2016, Carnegie Mellon University
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# - Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# - Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# - Neither the name of Carnegie Mellon University nor the names of its
+#   contributors may be used to endorse or promote products derived from this
+#   software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import collections
+import numpy
+import openravepy
+import xml.etree.ElementTree
+
+Group = collections.namedtuple('Group',
+    ['name', 'offset', 'dof', 'interpolation'])
+
+# Velocity group of each group type, used by quadratic interpolation.
+DERIVATIVE_GROUP_NAMES = {
+    'joint_values': 'joint_velocities',
+    'affine_transform': 'affine_velocities',
+    'ikparam_values': 'ikparam_velocities',
+}
+
+
+def GetGroups(cspec):
+    """
+    Get the groups of a configuration specification.
+
+    @param cspec configuration specification
+    @return list of Group tuples in the order of their offsets
+    """
+    if hasattr(cspec, 'GetGroups'):
+        groups = [Group(g.name, g.offset, g.dof, g.interpolation)
+                  for g in cspec.GetGroups()]
+    else:
+        # Older versions of openravepy only expose the groups through the
+        # XML serialization of the specification.
+        root = xml.etree.ElementTree.fromstring(str(cspec))
+        groups = [Group(element.get('name', ''),
+                        int(element.get('offset')),
+                        int(element.get('dof')),
+                        element.get('interpolation', ''))
+                  for element in root.iter('group')]
+
+    return sorted(groups, key=lambda group: group.offset)
+
+
+def GetJointValueOffsets(cspec, robot, dof_indices, derivative=0):
+    """
+    Get the offset of each DOF's value in a waypoint of a configuration
+    specification.
+
+    The offsets are found with a single call to ExtractJointValues on a
+    waypoint whose values are their own (one-based) indices.
+
+    @param cspec configuration specification of the waypoints
+    @param robot robot that the DOF indices refer to
+    @param dof_indices DOF indices to find the offsets of
+    @param derivative time derivative of the joint values
+    @return array of offsets, or -1 for DOFs that are not in the waypoints;
+            None if there is no group for this derivative
+    """
+    probe = numpy.arange(1, cspec.GetDOF() + 1, dtype=float)
+    offsets = cspec.ExtractJointValues(probe, robot, dof_indices, derivative)
+    if offsets is None:
+        return None
+    return numpy.round(numpy.asarray(offsets)).astype(int) - 1
+
+
+def ExtractJointValuesArray(cspec, waypoints, robot, dof_indices,
+                            derivative=0):
+    """
+    Vectorized ConfigurationSpecification.ExtractJointValues.
+
+    @param cspec configuration specification of the waypoints
+    @param waypoints (N, cspec.GetDOF()) array of waypoints
+    @param robot robot that the DOF indices refer to
+    @param dof_indices DOF indices to extract
+    @param derivative time derivative of the joint values
+    @return (N, len(dof_indices)) array of joint values; DOFs that are not in
+            the waypoints are zero. None if there is no group for this
+            derivative.
+    """
+    waypoints = numpy.asarray(waypoints).reshape((-1, cspec.GetDOF()))
+    offsets = GetJointValueOffsets(cspec, robot, dof_indices, derivative)
+    if offsets is None:
+        return None
+
+    values = numpy.zeros((waypoints.shape[0], len(offsets)))
+    present = offsets >= 0
+    values[:, present] = waypoints[:, offsets[present]]
+    return values
+
+
+def GetWaypointArray(traj):
+    """
+    Get all waypoints of a trajectory as an (N, dof) array.
+
+    The waypoints of an OpenRAVE trajectory are read with a single call to
+    GetWaypoints. The waypoints of an ArrayTrajectory are returned without
+    copying them.
+
+    @param traj OpenRAVE trajectory or ArrayTrajectory
+    @return (N, dof) array of waypoints
+    """
+    if isinstance(traj, ArrayTrajectory):
+        return traj.waypoints
+
+    dof = traj.GetConfigurationSpecification().GetDOF()
+    num_waypoints = traj.GetNumWaypoints()
+    if num_waypoints == 0:
+        return numpy.zeros((0, dof))
+
+    return numpy.reshape(traj.GetWaypoints(0, num_waypoints),
+                         (num_waypoints, dof))
+
+
+def SampleWaypointArray(traj, times):
+    """
+    Sample a trajectory at several times.
+
+    ArrayTrajectory is sampled with vectorized interpolation. OpenRAVE
+    trajectories are sampled with one call per time.
+
+    @param traj OpenRAVE trajectory or ArrayTrajectory
+    @param times list of times
+    @return (len(times), dof) array of waypoints
+    """
+    if isinstance(traj, ArrayTrajectory):
+        return traj.SampleArray(times)
+
+    dof = traj.GetConfigurationSpecification().GetDOF()
+    samples = numpy.zeros((len(times), dof))
+    for i, t in enumerate(times):
+        samples[i, :] = traj.Sample(t)
+    return samples
+
+
+class ArrayTrajectory(object):
+    """Trajectory that stores its waypoints in a contiguous numpy array.
+
+    ArrayTrajectory implements the subset of the OpenRAVE trajectory
+    interface that is used by prpy.util (GetWaypoint, GetWaypoints, Insert,
+    Remove, Sample, GetDuration, ...) so the same helpers run on both types.
+    The configuration specification is parsed once into the offset, size and
+    interpolation of each group. Use the *Array methods to read, sample, and
+    time whole trajectories with numpy operations instead of one call per
+    waypoint.
+
+    Any configuration specification can be stored, but only 'linear',
+    'quadratic', 'previous', and 'next' interpolation are supported by
+    Sample. Convert to an OpenRAVE trajectory with ToTrajectory to sample
+    other interpolation types, e.g. cubic or quintic, and for retiming and
+    execution.
+    """
+
+    INTERPOLATIONS = ('', 'linear', 'quadratic', 'previous', 'next')
+
+    def __init__(self, cspec=None, waypoints=None, env=None):
+        """
+        @param cspec configuration specification of the waypoints
+        @param waypoints (N, cspec.GetDOF()) array of waypoints
+        @param env environment used by ToTrajectory
+        """
+        self.env = env
+        self.description = ''
+        self.cspec = None
+        self.waypoints = None
+
+        if cspec is not None:
+            self.Init(cspec)
+            if waypoints is not None:
+                self.Insert(0, waypoints)
+
+    @classmethod
+    def FromTrajectory(cls, traj):
+        """
+        Copy an OpenRAVE trajectory into a new ArrayTrajectory.
+
+        @param traj OpenRAVE trajectory
+        @return ArrayTrajectory
+        """
+        array_traj = cls(traj.GetConfigurationSpecification(),
+                         GetWaypointArray(traj), env=traj.GetEnv())
+        array_traj.SetDescription(traj.GetDescription())
+        return array_traj
+
+    def ToTrajectory(self, env=None, xmlid=''):
+        """
+        Copy this trajectory into a new OpenRAVE trajectory.
+
+        All waypoints are inserted with a single call.
+
+        @param env environment to create the trajectory in
+        @param xmlid type of trajectory to create
+        @return OpenRAVE trajectory
+        """
+        if env is None:
+            env = self.env
+        if env is None:
+            raise ValueError('An environment is required to create an'
+                             ' OpenRAVE trajectory.')
+
+        traj = openravepy.RaveCreateTrajectory(env, xmlid)
+        traj.Init(self.cspec)
+        if len(self.waypoints) > 0:
+            traj.Insert(0, self.waypoints.ravel())
+        traj.SetDescription(self.description)
+        return traj
+
+    def Init(self, cspec):
+        self.cspec = openravepy.ConfigurationSpecification(cspec)
+        self.waypoints = numpy.zeros((0, self.cspec.GetDOF()))
+        self._ParseGroups()
+
+    def GetConfigurationSpecification(self):
+        return openravepy.ConfigurationSpecification(self.cspec)
+
+    def GetEnv(self):
+        return self.env
+
+    def GetXMLId(self):
+        return ''
+
+    def GetDescription(self):
+        return self.description
+
+    def SetDescription(self, description):
+        self.description = description
+
+    def GetNumWaypoints(self):
+        return self.waypoints.shape[0]
+
+    def GetWaypoint(self, index):
+        return self.waypoints[index].copy()
+
+    def GetWaypoints(self, startindex, endindex):
+        # This is a view if the rows are contiguous.
+        return self.waypoints[startindex:endindex].ravel()
+
+    def GetWaypointsArray(self, startindex=0, endindex=None):
+        """
+        Get a range of waypoints as an (N, dof) array without copying them.
+        """
+        return self.waypoints[startindex:endindex]
+
+    def Insert(self, index, data, overwrite=False):
+        """
+        Insert or overwrite waypoints.
+
+        @param index index of the first waypoint
+        @param data flat or (N, dof) array of waypoints
+        @param overwrite overwrite the waypoints at index instead of
+                         inserting before them
+        """
+        dof = self.cspec.GetDOF()
+        data = numpy.asarray(data, dtype=float)
+        if data.size % dof != 0:
+            raise ValueError(
+                'Data of size {:d} is not a multiple of the waypoint size'
+                ' {:d}.'.format(data.size, dof))
+        data = data.reshape((-1, dof))
+
+        num_waypoints = self.waypoints.shape[0]
+        if not (0 <= index <= num_waypoints):
+            raise IndexError('Waypoint index {:d} is out of range.'.format(
+                index))
+
+        if overwrite:
+            num_overwritten = min(len(data), num_waypoints - index)
+            self.waypoints[index:index + num_overwritten] = \
+                data[:num_overwritten]
+            data = data[num_overwritten:]
+            index += num_overwritten
+
+        if len(data) > 0:
+            self.waypoints = numpy.ascontiguousarray(numpy.concatenate(
+                (self.waypoints[:index], data, self.waypoints[index:])))
+
+    def Remove(self, startindex, endindex):
+        self.waypoints = numpy.ascontiguousarray(numpy.concatenate(
+            (self.waypoints[:startindex], self.waypoints[endindex:])))
+
+    def GetSlice(self, startindex, endindex):
+        """
+        Copy a range of waypoints into a new ArrayTrajectory.
+
+        The delta time of the first waypoint of the slice is set to zero.
+
+        @param startindex index of the first waypoint
+        @param endindex index after the last waypoint
+        @return ArrayTrajectory
+        """
+        array_traj = ArrayTrajectory(
+            self.cspec, self.waypoints[startindex:endindex].copy(),
+            env=self.env)
+        array_traj.SetDescription(self.description)
+
+        if self.deltatime_offset is not None and array_traj.GetNumWaypoints():
+            array_traj.waypoints[0, self.deltatime_offset] = 0.
+
+        return array_traj
+
+    def IsTimed(self):
+        return self.deltatime_offset is not None
+
+    def GetDeltaTimesArray(self):
+        """
+        Get the delta time of each waypoint.
+
+        @return array of delta times
+        """
+        if self.deltatime_offset is None:
+            raise ValueError('Trajectory is not timed.')
+        return self.waypoints[:, self.deltatime_offset]
+
+    def SetDeltaTimesArray(self, deltatimes):
+        """
+        Set the delta time of each waypoint.
+
+        @param deltatimes array with one delta time per waypoint
+        """
+        if self.deltatime_offset is None:
+            raise ValueError('Trajectory is not timed.')
+        self.waypoints[:, self.deltatime_offset] = deltatimes
+
+    def GetTimesArray(self):
+        """
+        Get the time of each waypoint from the start of the trajectory.
+
+        @return array of times
+        """
+        return numpy.cumsum(self.GetDeltaTimesArray())
+
+    def GetDuration(self):
+        if self.deltatime_offset is None or len(self.waypoints) == 0:
+            return 0.
+        return float(numpy.sum(self.GetDeltaTimesArray()))
+
+    def GetJointValuesArray(self, robot, dof_indices, derivative=0):
+        """
+        Extract the joint values of all waypoints.
+
+        @param robot robot that the DOF indices refer to
+        @param dof_indices DOF indices to extract
+        @param derivative time derivative of the joint values
+        @return (N, len(dof_indices)) array of joint values
+        """
+        return ExtractJointValuesArray(
+            self.cspec, self.waypoints, robot, dof_indices, derivative)
+
+    def SetJointValuesArray(self, values, robot, dof_indices, derivative=0):
+        """
+        Set the joint values of all waypoints.
+
+        @param values (N, len(dof_indices)) array of joint values
+        @param robot robot that the DOF indices refer to
+        @param dof_indices DOF indices to set
+        @param derivative time derivative of the joint values
+        """
+        offsets = GetJointValueOffsets(
+            self.cspec, robot, dof_indices, derivative)
+        if offsets is None or numpy.any(offsets < 0):
+            raise ValueError('Not all DOFs are in the trajectory.')
+        self.waypoints[:, offsets] = values
+
+    def Sample(self, time):
+        return self.SampleArray([time])[0]
+
+    def SampleArray(self, times):
+        """
+        Sample the trajectory at several times.
+
+        @param times list of times
+        @return (len(times), dof) array of waypoints
+        """
+        if self.deltatime_offset is None:
+            raise ValueError('Trajectory is not timed.')
+        elif len(self.waypoints) == 0:
+            raise ValueError('Trajectory has no waypoints.')
+
+        for kind, offset, dof, interpolation, velocity_offset in self.groups:
+            if kind == 'deltatime':
+                continue
+            elif interpolation not in self.INTERPOLATIONS:
+                raise ValueError(
+                    'Sampling interpolation "{:s}" is not supported. Use'
+                    ' ToTrajectory to sample this trajectory.'.format(
+                        interpolation))
+            elif interpolation == 'quadratic' and velocity_offset is None:
+                raise ValueError(
+                    'Quadratic interpolation of "{:s}" requires a velocity'
+                    ' group.'.format(kind))
+
+        times = numpy.asarray(times, dtype=float)
+        waypoint_times = self.GetTimesArray()
+        num_waypoints = len(waypoint_times)
+
+        if num_waypoints == 1:
+            return numpy.tile(self.waypoints[0], (len(times), 1))
+
+        # Index of the waypoint at the end of the segment of each time.
+        end_idx = numpy.searchsorted(waypoint_times, times, side='right')
+        end_idx = numpy.clip(end_idx, 1, num_waypoints - 1)
+        start_idx = end_idx - 1
+
+        segment_time = waypoint_times[end_idx] - waypoint_times[start_idx]
+        elapsed = numpy.clip(times - waypoint_times[start_idx],
+                             0., segment_time)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            fraction = numpy.where(segment_time > 0.,
+                                   elapsed / segment_time, 1.)
+            acceleration_scale = numpy.where(segment_time > 0.,
+                                             1. / segment_time, 0.)
+
+        start = self.waypoints[start_idx]
+        end = self.waypoints[end_idx]
+        samples = start.copy()
+
+        for kind, offset, dof, interpolation, velocity_offset in self.groups:
+            columns = slice(offset, offset + dof)
+
+            if kind == 'deltatime':
+                samples[:, offset] = elapsed
+            elif interpolation == 'linear':
+                samples[:, columns] = start[:, columns] + fraction[:, None] \
+                    * (end[:, columns] - start[:, columns])
+            elif interpolation == 'quadratic':
+                velocity_columns = slice(velocity_offset,
+                                         velocity_offset + dof)
+                v0 = start[:, velocity_columns]
+                v1 = end[:, velocity_columns]
+                a = (v1 - v0) * acceleration_scale[:, None]
+                samples[:, columns] = start[:, columns] + elapsed[:, None] \
+                    * (v0 + 0.5 * elapsed[:, None] * a)
+            elif interpolation == 'next':
+                samples[:, columns] = numpy.where(
+                    elapsed[:, None] > 0., end[:, columns], start[:, columns])
+
+        # Times past the end of the trajectory return the last waypoint.
+        samples[times >= waypoint_times[-1]] = self.waypoints[-1]
+
+        return samples
+
+    def _ParseGroups(self):
+        self.groups = []
+        self.deltatime_offset = None
+
+        groups = GetGroups(self.cspec)
+        offsets_by_name = dict((group.name, group.offset) for group in groups)
+
+        for group in groups:
+            words = group.name.split()
+            kind = words[0] if words else ''
+            velocity_offset = None
+
+            if kind == 'deltatime':
+                self.deltatime_offset = group.offset
+            elif group.interpolation == 'quadratic':
+                # SampleArray raises if the velocity group is missing.
+                velocity_name = ' '.join(
+                    [DERIVATIVE_GROUP_NAMES.get(kind, '')] + words[1:])
+                velocity_offset = offsets_by_name.get(velocity_name)
+
+            self.groups.append(
+                (kind, group.offset, group.dof, group.interpolation,
+                 velocity_offset))
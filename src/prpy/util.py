@@ -38,6 +38,13 @@ import scipy.optimize
 import threading
 import time
 import warnings
+from .trajectory import (
+    ArrayTrajectory,
+    ExtractJointValuesArray,
+    GetJointValueOffsets,
+    GetWaypointArray,
+    SampleWaypointArray,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -242,23 +249,15 @@ def MatrixToTraj(traj_matrix, cs, dof, robot):
     env = robot.GetEnv()
     traj = openravepy.RaveCreateTrajectory(env, '')
     traj.Init(cs)
-    for i in range(numpy.size(traj_matrix) / dof):
-        tp = traj_matrix[range(i * dof, i * dof + dof)]
-        tp = numpy.array(tp.transpose())[0]
-        traj.Insert(i, tp)
+    traj.Insert(0, numpy.asarray(traj_matrix).ravel())
     openravepy.planningutils.RetimeActiveDOFTrajectory(
         traj, robot, False, 0.2, 0.2, "LinearTrajectoryRetimer", "")
     return traj
 
 
 def TrajToMatrix(traj, dof):
-    traj_matrix = numpy.zeros(dof * (traj.GetNumWaypoints()))
-    traj_matrix = numpy.mat(traj_matrix).transpose()
-    for i in range(traj.GetNumWaypoints()):
-        d = traj.GetWaypoint(i)[range(dof)]
-        d = numpy.mat(d).transpose()
-        traj_matrix[range(i * dof, (i + 1) * dof)] = d
-    return traj_matrix
+    waypoints = GetWaypointArray(traj)[:, :dof]
+    return numpy.mat(waypoints.ravel()).transpose()
 
 
 def AdaptTrajectory(traj, new_start, new_goal, robot):
@@ -295,8 +294,8 @@ def AdaptTrajectory(traj, new_start, new_goal, robot):
     translated_traj = numpy.zeros(dof * (traj.GetNumWaypoints()))
     translated_traj = numpy.mat(translated_traj).transpose()
     for i in range(traj.GetNumWaypoints()):
-        translated_traj[range((i - 1) * dof, i * dof)] = \
-            traj_matrix[range((i - 1) * dof, i * dof)] - diff_start
+        translated_traj[range(i * dof, (i + 1) * dof)] = \
+            traj_matrix[range(i * dof, (i + 1) * dof)] + diff_start
 
     # Apply correction to reach goal point.
     new_traj_matrix = translated_traj
@@ -376,73 +375,121 @@ def SetTrajectoryTags(traj, tags, append=False):
     traj.SetDescription(json.dumps(all_tags))
 
 
-def SimplifyTrajectory(traj, robot):
+def _FindLinearSegments(times, values, tolerances):
     """
-    Re-interpolate trajectory as minimal set of linear segments.
+    Greedily select waypoints that approximate a piece-wise linear function.
 
-    This function attempts to extract linear segments from the given
-    trajectory by iteratively finding extrema waypoints until a set of
-    linear segments until all of the original trajectory waypoints are
-    within the robot's joint resolutions of the interpolated segments.
+    Each segment starts at the last selected waypoint and is extended for as
+    long as every skipped waypoint is within tolerance of the segment in
+    every dimension. A segment from waypoint a to waypoint k passes within
+    tolerance of a skipped waypoint j if its slope lies in an interval that
+    depends only on a and j, so the intersection of these intervals is
+    updated incrementally. This takes O(N * dof) time.
 
-    Currently, only untimed trajectories are supported!
+    @param times increasing parameter of each waypoint
+    @param values (N, dof) array of values at each waypoint
+    @param tolerances maximum error in each dimension
+    @return boolean mask of the selected waypoints
+    """
+    num_waypoints, num_dofs = values.shape
+    mask = numpy.zeros(num_waypoints, dtype=bool)
+    mask[[0, -1]] = True
 
-    @param robot the robot that should be used for the interpolation
-    @param traj input trajectory that will be simplified
-    @returns output trajectory of timed linear segments
+    anchor = 0
+    lower = numpy.empty(num_dofs)
+    upper = numpy.empty(num_dofs)
+    lower.fill(-numpy.inf)
+    upper.fill(numpy.inf)
+
+    k = 1
+    while k < num_waypoints:
+        dt = times[k] - times[anchor]
+        dv = values[k] - values[anchor]
+
+        # Adjacent waypoints are always connected by a segment.
+        if k == anchor + 1:
+            is_valid = True
+        elif dt > 0.:
+            slope = dv / dt
+            is_valid = numpy.all((lower <= slope) & (slope <= upper))
+        else:
+            is_valid = False
+
+        # The previous waypoint ends this segment and starts the next one.
+        if not is_valid:
+            anchor = k - 1
+            mask[anchor] = True
+            lower.fill(-numpy.inf)
+            upper.fill(numpy.inf)
+            continue
+
+        # Longer segments must pass within tolerance of this waypoint.
+        if dt > 0.:
+            lower = numpy.maximum(lower, (dv - tolerances) / dt)
+            upper = numpy.minimum(upper, (dv + tolerances) / dt)
+        elif numpy.any(numpy.abs(dv) > tolerances):
+            lower.fill(numpy.inf)
+            upper.fill(-numpy.inf)
+
+        k += 1
+
+    return mask
+
+
+def SimplifyTrajectory(traj, robot):
     """
-    from scipy import interpolate
+    Re-interpolate trajectory as minimal set of linear segments.
 
-    if traj.GetDuration() != 0.0:
-        raise ValueError("Cannot handle timed trajectories yet!")
+    This function removes waypoints from a trajectory with linear joint
+    interpolation in a single pass over its waypoints. Every removed waypoint
+    is within the robot's joint resolutions of the linear segment that
+    replaces it. Waypoints of paths are compared at the same waypoint index
+    and waypoints of timed trajectories are compared at the same time. The
+    timing of a timed trajectory is preserved.
 
+    @param traj input path or timed trajectory that will be simplified
+    @param robot the robot that should be used for the interpolation
+    @returns output trajectory with a subset of the input waypoints
+    """
     if traj.GetNumWaypoints() < 2:
         return traj
 
     cspec = traj.GetConfigurationSpecification()
     dofs = robot.GetActiveDOFIndices()
-    idxs = range(traj.GetNumWaypoints())
     joints = [robot.GetJointFromDOFIndex(d) for d in dofs]
-
-    times = numpy.array(
-        idxs if not traj.GetDuration() else
-        numpy.cumsum([cspec.ExtractDeltaTime(traj.GetWaypoint(i),
-                                             robot, dofs) for i in idxs]))
-    values = numpy.array(
-        [cspec.ExtractJointValues(traj.GetWaypoint(i), robot, dofs)
-         for i in idxs])
     resolutions = numpy.array([j.GetResolution(0) for j in joints])
 
-    # Start with an extrema set of the first to the last waypoint.
-    mask = numpy.zeros(times.shape, dtype=bool)
-    mask[[0, -1]] = True
+    waypoints = GetWaypointArray(traj)
+    values = ExtractJointValuesArray(cspec, waypoints, robot, dofs)
 
-    for _ in idxs:
-        # Create new interpolation set from current extrema.
-        f = interpolate.interp1d(times[mask], values[mask, :],
-                                 axis=0, kind='linear')
-        errors = numpy.abs(f(times) - values)
+    is_timed = IsTimedTrajectory(traj) and traj.GetDuration() > 0.
+    if is_timed:
+        interpolation = cspec.GetGroupFromName('joint_values').interpolation
+        if interpolation != 'linear':
+            raise ValueError(
+                'Cannot simplify timed trajectories with "{:s}"'
+                ' interpolation.'.format(interpolation))
 
-        # TODO: Can this be a single call?
-        # Find the extrema in the remaining waypoints.
-        max_err_idx = numpy.argmax(errors, axis=0)
-        max_err_vals = numpy.max(errors, axis=0)
+        deltatime_offset = cspec.GetGroupFromName('deltatime').offset
+        times = numpy.cumsum(waypoints[:, deltatime_offset])
+    else:
+        times = numpy.arange(len(waypoints), dtype=float)
 
-        # Add any extrema that deviated more than joint resolution.
-        max_err_idx = max_err_idx[max_err_vals > resolutions]
-        mask[max_err_idx] = True
+    mask = _FindLinearSegments(times, values, resolutions)
+    reduced_waypoints = waypoints[mask].copy()
 
-        # If none deviated more than joint resolution, the set is complete.
-        if len(max_err_idx) < 0:
-            break
+    # Each delta time spans all of the removed waypoints before it.
+    if is_timed:
+        reduced_waypoints[1:, deltatime_offset] = numpy.diff(times[mask])
 
     # Return a new reduced trajectory.
-    import openravepy
+    if isinstance(traj, ArrayTrajectory):
+        return ArrayTrajectory(cspec, reduced_waypoints, env=traj.GetEnv())
+
     reduced_traj = openravepy.RaveCreateTrajectory(traj.GetEnv(),
                                                    traj.GetXMLId())
     reduced_traj.Init(cspec)
-    for (new_idx, old_idx) in enumerate(mask.nonzero()[0]):
-        reduced_traj.Insert(new_idx, traj.GetWaypoint(old_idx))
+    reduced_traj.Insert(0, reduced_waypoints.ravel())
     return reduced_traj
 
 
@@ -1181,6 +1228,113 @@ def ComputeEnabledAABB(kinbody):
     return AABB(center, half_extents)
 
 
+def ComputeReachAABB(robot, padding=0.):
+    """
+    Returns an AABB that contains everything the robot's arms can reach.
+
+    The AABB contains the robot's enabled links and, for each manipulator, a
+    sphere centered at the manipulator's base link. The radius of the sphere
+    is the length of the kinematic chain from the base link to the end
+    effector plus the size of the hand and any grabbed bodies. This assumes
+    that the base of the robot does not move.
+
+    @param robot: an OpenRAVE robot
+    @param padding: distance to grow the AABB by in every direction
+    @returns: AABB of the robot's reachable workspace
+    """
+    from openravepy import AABB
+
+    robot_aabb = ComputeEnabledAABB(robot)
+    min_corner = robot_aabb.pos() - robot_aabb.extents()
+    max_corner = robot_aabb.pos() + robot_aabb.extents()
+
+    tool_aabbs = [ComputeEnabledAABB(body) for body in robot.GetGrabbed()]
+
+    for manipulator in robot.GetManipulators():
+        base_link = manipulator.GetBase()
+        base_position = base_link.GetTransform()[0:3, 3]
+        ee_position = manipulator.GetEndEffectorTransform()[0:3, 3]
+
+        chain = robot.GetChain(base_link.GetIndex(),
+                               manipulator.GetEndEffector().GetIndex(),
+                               returnjoints=True)
+        points = ([base_position]
+                  + [joint.GetAnchor() for joint in chain]
+                  + [ee_position])
+        reach = sum(numpy.linalg.norm(p2 - p1)
+                    for p1, p2 in zip(points[:-1], points[1:]))
+
+        # Add the farthest extent of the hand and grabbed bodies from the end
+        # effector frame.
+        link_aabbs = [link.ComputeAABB()
+                      for link in manipulator.GetChildLinks()]
+        tool_size = 0.
+        for aabb in link_aabbs + tool_aabbs:
+            offset = numpy.abs(aabb.pos() - ee_position) + aabb.extents()
+            if numpy.all(numpy.isfinite(offset)):
+                tool_size = max(tool_size, numpy.linalg.norm(offset))
+        reach += tool_size
+
+        min_corner = numpy.minimum(min_corner, base_position - reach)
+        max_corner = numpy.maximum(max_corner, base_position + reach)
+
+    center = (min_corner + max_corner) / 2.
+    half_extents = (max_corner - min_corner) / 2. + padding
+    return AABB(center, half_extents)
+
+
+def GetGeometricState(body, decimals=6):
+    """
+    Returns a hashable summary of the geometric state of a KinBody.
+
+    The state consists of the body's name, kinematics geometry hash,
+    transform, DOF values, enabled links, and the names of any grabbed bodies.
+    Floating point values are rounded to the specified number of decimals so
+    that numerically identical states compare equal.
+
+    @param body: an OpenRAVE KinBody
+    @param decimals: number of decimals to round transforms and DOF values to
+    @returns: tuple describing the geometric state of the KinBody
+    """
+    transform = numpy.round(body.GetTransform(), decimals)
+    dof_values = numpy.round(body.GetDOFValues(), decimals)
+    enabled_mask = tuple(link.IsEnabled() for link in body.GetLinks())
+
+    if body.IsRobot():
+        grabbed_names = tuple(sorted(
+            grabbed.GetName() for grabbed in body.GetGrabbed()))
+    else:
+        grabbed_names = ()
+
+    return (
+        body.GetName(),
+        body.GetKinematicsGeometryHash(),
+        tuple(transform.ravel().tolist()),
+        tuple(dof_values.tolist()),
+        enabled_mask,
+        grabbed_names,
+    )
+
+
+def ComputeEnvironmentHash(env, decimals=6):
+    """
+    Returns a hash of the geometric state of all bodies in an environment.
+
+    Two environments have the same hash if GetGeometricState is identical for
+    all of their bodies. The caller should hold the environment lock.
+
+    @param env: an OpenRAVE environment
+    @param decimals: number of decimals to round transforms and DOF values to
+    @returns: hex digest of the environment's geometric state
+    """
+    import hashlib
+    import pickle
+
+    states = sorted(GetGeometricState(body, decimals=decimals)
+                    for body in env.GetBodies())
+    return hashlib.md5(pickle.dumps(states, 2)).hexdigest()
+
+
 def UntimeTrajectory(trajectory, env=None):
     """
     Returns an untimed copy of the provided trajectory.
@@ -1225,28 +1379,26 @@ def ComputeUnitTiming(robot, traj, env=None):
         new_cspec = robot.GetActiveConfigurationSpecification('linear')
     new_cspec.AddDeltaTimeGroup()
 
-    new_traj = RaveCreateTrajectory(env, '')
-    new_traj.Init(new_cspec)
-
-    dof_values_prev = None
-    for i in range(traj.GetNumWaypoints()):
-        old_waypoint = traj.GetWaypoint(i)
-        dof_values = old_cspec.ExtractJointValues(
-            old_waypoint, robot, dof_indices)
+    dof_values = ExtractJointValuesArray(
+        old_cspec, GetWaypointArray(traj), robot, dof_indices)
+    num_waypoints = dof_values.shape[0]
 
-        if i == 0:
-            deltatime = 0.
-        else:
-            deltatime = numpy.linalg.norm(dof_values - dof_values_prev)
+    deltatimes = numpy.zeros(num_waypoints)
+    deltatimes[1:] = numpy.linalg.norm(numpy.diff(dof_values, axis=0), axis=1)
 
-        dof_values_prev = dof_values
+    new_waypoints = numpy.zeros((num_waypoints, new_cspec.GetDOF()))
+    new_offsets = GetJointValueOffsets(new_cspec, robot, dof_indices)
+    new_waypoints[:, new_offsets] = dof_values
+    new_waypoints[:, new_cspec.GetGroupFromName('deltatime').offset] = \
+        deltatimes
 
-        new_waypoint = numpy.zeros(new_cspec.GetDOF())
+    if isinstance(traj, ArrayTrajectory):
+        return ArrayTrajectory(new_cspec, new_waypoints, env=env)
 
-        new_cspec.InsertJointValues(new_waypoint, dof_values,
-                                    robot, dof_indices, 0)
-        new_cspec.InsertDeltaTime(new_waypoint, deltatime)
-        new_traj.Insert(i, new_waypoint)
+    new_traj = RaveCreateTrajectory(env, '')
+    new_traj.Init(new_cspec)
+    if num_waypoints > 0:
+        new_traj.Insert(0, new_waypoints.ravel())
 
     return new_traj
 
@@ -1772,31 +1924,183 @@ def GetLinearCollisionCheckPts(robot, traj, norm_order=2, sampling_func=None):
         yield t, q
 
 
+def _SampleTimeArray(end, include_endpoints=False):
+    """
+    Vectorized SampleTimeGenerator(0, end, step=1).
+    """
+    samples = numpy.arange(0., numpy.floor(end) + 1.)
+    last = samples[-1]
+
+    if end - last > 0.5:
+        samples = numpy.append(samples, end)
+        last = end
+    if include_endpoints and end - last > 1e-6:
+        samples = numpy.append(samples, end)
+
+    return samples
+
+
+def _VanDerCorputSampleArray(end):
+    """
+    Vectorized VanDerCorputSampleGenerator(0, end, step=1).
+    """
+    check_bins = numpy.arange(0., end, 1.)
+
+    # Dyadic fractions in Van der Corput order: x = 1, 2, 3, ... maps to the
+    # fraction whose binary digits are the reversed binary digits of x. The
+    # points are spaced less than one apart after ceil(log2(end)) + 1 levels,
+    # so every bin is covered by then.
+    num_levels = max(int(numpy.ceil(numpy.log2(end))) + 1, 1)
+    x = numpy.arange(1, 2 ** num_levels, dtype=numpy.int64)
+    num_bits = numpy.floor(numpy.log2(x)).astype(numpy.int64) + 1
+
+    reversed_x = numpy.zeros_like(x)
+    for bit in xrange(num_levels):
+        has_bit = (x >> bit) & 1
+        reversed_x |= has_bit << numpy.maximum(num_bits - 1 - bit, 0)
+
+    fractions = reversed_x / numpy.power(2., num_bits)
+    indices = numpy.digitize(end * fractions, check_bins, right=True)
+    indices = indices[(indices > 0) & (indices < len(check_bins))]
+
+    # Keep the first occurrence of each bin, in order.
+    _, first = numpy.unique(indices, return_index=True)
+    ordered = indices[numpy.sort(first)]
+
+    return numpy.concatenate(([0., end], check_bins[ordered]))
+
+
+def GetLinearCollisionCheckSchedule(robot, traj, norm_order=2,
+                                    sampling_func=None):
+    """
+    Compute all configurations to collision check on a piece-wise linear
+    trajectory at once.
+
+    This returns the same samples, in the same order, as
+    GetLinearCollisionCheckPts. The waypoints are read in a single call and
+    the samples are interpolated with vectorized numpy operations, so the
+    result can be passed directly to a batched collision check. The default
+    linear order and VanDerCorputSampleGenerator are computed without
+    calling the generators.
+
+    @param openravepy.Robot      robot: The robot.
+    @param openravepy.Trajectory traj:  The trajectory for which we need
+                                        to generate sample points.
+    @param int      norm_order: 1, 2, or inf, see GetLinearCollisionCheckPts
+    @param generator sampling_func A function that returns a sequence of
+                                   sample times.
+
+    @returns tuple (times, configs): an array of N sample times in the
+             original trajectory, or None if it is not timed, and an (N, dof)
+             array of joint configurations.
+    """
+    traj_cspec = traj.GetConfigurationSpecification()
+
+    # Make sure trajectory is linear in joint space
+    try:
+        interp_type = traj_cspec.GetGroupFromName('joint_values').interpolation
+    except openravepy.openrave_exception:
+        raise ValueError('Trajectory does not have a joint_values group')
+    if interp_type != 'linear':
+        raise ValueError('Trajectory must be linear in joint space')
+
+    dof_indices, _ = traj_cspec.ExtractUsedIndices(robot)
+    traj_timed = IsTimedTrajectory(traj)
+
+    # Find the offset of each joint value in a waypoint by extracting the
+    # joint values from a waypoint that contains its own indices.
+    num_waypoints = traj.GetNumWaypoints()
+    cspec_dof = traj_cspec.GetDOF()
+    offsets = traj_cspec.ExtractJointValues(
+        numpy.arange(cspec_dof, dtype=float), robot, dof_indices)
+    offsets = numpy.round(offsets).astype(int)
+
+    waypoints = numpy.reshape(
+        traj.GetWaypoints(0, num_waypoints), (num_waypoints, cspec_dof))
+    q_waypoints = waypoints[:, offsets]
+
+    # If trajectory only has 1 waypoint then we only need to
+    # do 1 collision check.
+    if num_waypoints == 1:
+        times = numpy.zeros(1) if traj_timed else None
+        return times, q_waypoints
+
+    # Number of collision checks from the start up to each waypoint.
+    q_resolutions = robot.GetDOFResolutions()[dof_indices]
+    num_steps = numpy.abs(numpy.diff(q_waypoints, axis=0)) / q_resolutions
+    checks = numpy.concatenate((
+        [0.], numpy.cumsum(numpy.linalg.norm(num_steps, ord=norm_order,
+                                             axis=1))))
+    required_checks = checks[-1]
+
+    # Sample the trajectory using the specified sample generator. The
+    # generator's argument checks are kept for consistency.
+    if sampling_func is None:
+        if not required_checks > 0:
+            raise ValueError("The 'end' value must be greater than "
+                             "the 'start' value.")
+        samples = _SampleTimeArray(required_checks)
+    elif sampling_func is VanDerCorputSampleGenerator:
+        if not required_checks > 0:
+            raise ValueError("The 'end' value must be greater than "
+                             "the 'start' value.")
+        samples = _VanDerCorputSampleArray(required_checks)
+    elif sampling_func is SampleTimeGenerator:
+        if not required_checks > 0:
+            raise ValueError("The 'end' value must be greater than "
+                             "the 'start' value.")
+        samples = _SampleTimeArray(required_checks, include_endpoints=True)
+    else:
+        samples = numpy.fromiter(
+            sampling_func(0, required_checks, step=1, include_endpoints=True),
+            dtype=float)
+
+    # Linearly interpolate between the waypoints on either side of each
+    # sample. Samples at the first waypoint use it as both endpoints.
+    sidx = numpy.searchsorted(checks, samples)
+    start_idx = numpy.maximum(sidx - 1, 0)
+    end_idx = numpy.maximum(sidx, 1)
+    segment_checks = checks[end_idx] - checks[start_idx]
+    p = numpy.where(sidx == 0, 0.,
+                    (samples - checks[start_idx]) / segment_checks)
+
+    q_start = q_waypoints[start_idx]
+    configs = q_start + p[:, numpy.newaxis] * (q_waypoints[end_idx] - q_start)
+
+    if not traj_timed:
+        return None, configs
+
+    # The delta time of the first waypoint is ignored.
+    deltatime_offset = traj_cspec.GetGroupFromName('deltatime').offset
+    durations = numpy.concatenate((
+        [0.], numpy.cumsum(waypoints[1:, deltatime_offset])))
+
+    times = durations[start_idx] \
+        + p * (durations[end_idx] - durations[start_idx])
+    return times, configs
+
+
 def IsInCollision(traj, robot, selfcoll_only=False):
     report = openravepy.CollisionReport()
 
     # Get trajectory length.
-    NN = traj.GetNumWaypoints()
-    ii = 0
-    total_dist = 0.0
-    for ii in range(NN - 1):
-        point1 = traj.GetWaypoint(ii)
-        point2 = traj.GetWaypoint(ii + 1)
-        dist = 0.0
-        total_dof = robot.GetActiveDOF()
-        for jj in range(total_dof):
-            dist += pow(point1[jj] - point2[jj], 2)
-        total_dist += numpy.sqrt(dist)
+    total_dof = robot.GetActiveDOF()
+    points = GetWaypointArray(traj)[:, :total_dof]
+    total_dist = numpy.sum(
+        numpy.linalg.norm(numpy.diff(points, axis=0), axis=1))
 
     step_dist = 0.04
 
     if traj.GetDuration() < 0.001:
+        # OpenRAVE can only retime its own trajectories.
+        if isinstance(traj, ArrayTrajectory):
+            traj = traj.ToTrajectory(env=robot.GetEnv())
         openravepy.planningutils.RetimeActiveDOFTrajectory(traj, robot)
     total_time = traj.GetDuration()
     step_time = total_time * step_dist / total_dist
 
-    for t in numpy.arange(0.0, total_time, step_time):
-        point = traj.Sample(t)
+    times = numpy.arange(0.0, total_time, step_time)
+    for point in SampleWaypointArray(traj, times):
         collision = False
         with robot.GetEnv():
             robot.SetActiveDOFValues(point)
@@ -1873,13 +2177,15 @@ def JointStatesFromTraj(robot, traj, times, derivatives=[0, 1, 2]):
     num_dofs = robot.GetDOF()
     dof_indices = range(num_dofs)
 
+    # Sample all times at once, then extract each derivative for all samples.
+    trajdata = SampleWaypointArray(traj, times)
+    values = [ExtractJointValuesArray(cspec, trajdata, robot,
+                                      dof_indices, deriv)
+              for deriv in derivatives]
+
     pva_list = []
-    for t in times:
-        pva = [None] * len(derivatives)
-        trajdata = traj.Sample(t)
-        for i, deriv in enumerate(derivatives):
-            pva[i] = cspec.ExtractJointValues(trajdata, robot,
-                                              dof_indices, deriv)
+    for j in xrange(len(times)):
+        pva = [None if value is None else value[j] for value in values]
         pva_list.append(pva)
 
     return pva_list
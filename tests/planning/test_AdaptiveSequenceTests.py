@@ -0,0 +1,107 @@
+from unittest import TestCase
+from planning_helpers import FailPlanner, MetaPlannerTests, SuccessPlanner
+from prpy.planning.adaptive import AdaptiveSequence
+
+
+class AdaptiveSequenceTests(MetaPlannerTests,
+                            TestCase):
+    def test_NoStatistics_PlannersAreCalledInOrder(self):
+        first_planner = SuccessPlanner(self.traj)
+        second_planner = SuccessPlanner(self.traj)
+
+        planner = AdaptiveSequence(first_planner, second_planner)
+        planner.PlanTest(self.robot)
+
+        self.assertEqual(first_planner.num_calls, 1)
+        self.assertEqual(second_planner.num_calls, 0)
+
+    def test_FirstPlannerAlwaysFails_SecondPlannerIsCalledFirst(self):
+        first_planner = FailPlanner()
+        second_planner = SuccessPlanner(self.traj)
+
+        planner = AdaptiveSequence(first_planner, second_planner,
+                                   exploration=0.)
+        planner.PlanTest(self.robot)
+
+        # Use the same duration for both planners so the order only depends
+        # on their success rates, not on how long each call took.
+        planner.get_statistics(first_planner, 'PlanTest').total_duration = 1.
+        planner.get_statistics(second_planner, 'PlanTest').total_duration = 1.
+        planner.PlanTest(self.robot)
+
+        self.assertEqual(first_planner.num_calls, 1)
+        self.assertEqual(second_planner.num_calls, 2)
+
+    def test_PlannersAreReordered_TrajectoryIsNonDeterministic(self):
+        from prpy.planning.base import Tags
+        from prpy.util import GetTrajectoryTags
+
+        first_planner = FailPlanner()
+        second_planner = SuccessPlanner(self.traj)
+
+        planner = AdaptiveSequence(first_planner, second_planner,
+                                   exploration=0.)
+        planner.PlanTest(self.robot)
+        planner.get_statistics(first_planner, 'PlanTest').total_duration = 1.
+        planner.get_statistics(second_planner, 'PlanTest').total_duration = 1.
+        traj = planner.PlanTest(self.robot)
+
+        tags = GetTrajectoryTags(traj)
+        self.assertFalse(tags.get(Tags.DETERMINISTIC_TRAJECTORY, True))
+
+    def test_StatisticsArePersisted(self):
+        import os
+        import shutil
+        import tempfile
+
+        tmp_dir = tempfile.mkdtemp()
+        stats_path = os.path.join(tmp_dir, 'stats.json')
+
+        try:
+            first_planner = FailPlanner()
+            second_planner = SuccessPlanner(self.traj)
+
+            planner = AdaptiveSequence(first_planner, second_planner,
+                                       stats_path=stats_path)
+            planner.PlanTest(self.robot)
+
+            planner = AdaptiveSequence(first_planner, second_planner,
+                                       stats_path=stats_path)
+            stats = planner.get_statistics(first_planner, 'PlanTest')
+            self.assertEqual(stats.attempts, 1)
+            self.assertEqual(stats.successes, 0)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_SaveInterval_StatisticsAreSavedOnDemand(self):
+        import os
+        import shutil
+        import tempfile
+
+        tmp_dir = tempfile.mkdtemp()
+        stats_path = os.path.join(tmp_dir, 'stats.json')
+
+        try:
+            first_planner = FailPlanner()
+            second_planner = SuccessPlanner(self.traj)
+
+            planner = AdaptiveSequence(first_planner, second_planner,
+                                       stats_path=stats_path,
+                                       save_interval=3600.)
+            planner.PlanTest(self.robot)
+            planner.PlanTest(self.robot)
+
+            # Only the first result was written before the interval passed.
+            saved_planner = AdaptiveSequence(first_planner, second_planner,
+                                             stats_path=stats_path)
+            stats = saved_planner.get_statistics(first_planner, 'PlanTest')
+            self.assertEqual(stats.attempts, 1)
+
+            planner.save_statistics()
+
+            saved_planner = AdaptiveSequence(first_planner, second_planner,
+                                             stats_path=stats_path)
+            stats = saved_planner.get_statistics(second_planner, 'PlanTest')
+            self.assertEqual(stats.attempts, 2)
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,118 @@
+import numpy
+from unittest import TestCase
+from planning_helpers import (FailPlanner, MetaPlannerTests, MockPlanner,
+                              SuccessPlanner)
+from prpy.planning.base import ClonedPlanningMethod
+from prpy.planning.cached import CachedPlanner
+
+
+class LinearPathPlanner(MockPlanner):
+    @ClonedPlanningMethod
+    def PlanTest(self, robot):
+
+        def LinearPath_impl(robot):
+            from openravepy import RaveCreateTrajectory
+
+            cspec = robot.GetActiveConfigurationSpecification('linear')
+            traj = RaveCreateTrajectory(self.env, '')
+            traj.Init(cspec)
+
+            q = robot.GetActiveDOFValues()
+            traj.Insert(0, numpy.concatenate((q, q)))
+            return traj
+
+        return self._PlanGeneric(LinearPath_impl, robot)
+
+
+class CachedPlannerTests(MetaPlannerTests,
+                         TestCase):
+    def test_RepeatedQuery_SubPlannerIsCalledOnce(self):
+        sub_planner = SuccessPlanner(self.traj)
+        planner = CachedPlanner(sub_planner, validate=False)
+
+        planner.PlanTest(self.robot)
+        planner.PlanTest(self.robot)
+
+        self.assertEqual(sub_planner.num_calls, 1)
+        self.assertEqual(planner.hits, 1)
+        self.assertEqual(planner.misses, 1)
+
+    def test_EnvironmentChanges_SubPlannerIsCalledAgain(self):
+        sub_planner = SuccessPlanner(self.traj)
+        planner = CachedPlanner(sub_planner, validate=False)
+
+        planner.PlanTest(self.robot)
+
+        with self.env:
+            dof_values = self.robot.GetDOFValues()
+            dof_values[0] += 0.1
+            self.robot.SetDOFValues(dof_values)
+
+        planner.PlanTest(self.robot)
+
+        self.assertEqual(sub_planner.num_calls, 2)
+        self.assertEqual(planner.hits, 0)
+        self.assertEqual(planner.misses, 2)
+
+    def test_SubPlannerFails_FailureIsNotCached(self):
+        from prpy.planning.base import PlanningError
+
+        sub_planner = FailPlanner()
+        planner = CachedPlanner(sub_planner, validate=False)
+
+        for _ in xrange(2):
+            with self.assertRaises(PlanningError):
+                planner.PlanTest(self.robot)
+
+        self.assertEqual(sub_planner.num_calls, 2)
+        self.assertEqual(planner.get_statistics()['size'], 0)
+
+    def test_CacheIsFull_LeastRecentlyUsedIsEvicted(self):
+        sub_planner = SuccessPlanner(self.traj)
+        planner = CachedPlanner(sub_planner, max_size=1, validate=False)
+
+        planner.PlanTest(self.robot)
+
+        with self.env:
+            dof_values = self.robot.GetDOFValues()
+            dof_values[0] += 0.1
+            self.robot.SetDOFValues(dof_values)
+
+        planner.PlanTest(self.robot)
+
+        statistics = planner.get_statistics()
+        self.assertEqual(statistics['size'], 1)
+        self.assertEqual(statistics['evictions'], 1)
+
+    def test_Validate_ValidTrajectoryIsReused(self):
+        sub_planner = LinearPathPlanner()
+        planner = CachedPlanner(sub_planner, validate=True)
+
+        planner.PlanTest(self.robot)
+        planner.PlanTest(self.robot)
+
+        self.assertEqual(sub_planner.num_calls, 1)
+        self.assertEqual(planner.hits, 1)
+        self.assertEqual(planner.invalidations, 0)
+
+    def test_Validate_CollidingTrajectoryIsDiscarded(self):
+        from openravepy import RaveCreateKinBody
+
+        with self.env:
+            manipulator = self.robot.GetActiveManipulator()
+            box = RaveCreateKinBody(self.env, '')
+            box.SetName('box')
+            box.InitFromBoxes(numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]),
+                              True)
+            self.env.Add(box)
+            box.SetTransform(manipulator.GetEndEffectorTransform())
+
+        sub_planner = LinearPathPlanner()
+        planner = CachedPlanner(sub_planner, validate=True)
+
+        planner.PlanTest(self.robot)
+        planner.PlanTest(self.robot)
+
+        self.assertEqual(sub_planner.num_calls, 2)
+        self.assertEqual(planner.hits, 0)
+        self.assertEqual(planner.invalidations, 1)
@@ -0,0 +1,76 @@
+from methods import (
+    PlanToConfigurationTest,
+    PlanToConfigurationStraightLineTest,
+)
+from planning_helpers import BasePlannerTest
+from prpy.planning.experience import ExperiencePlanner
+from prpy.planning.snap import SnapPlanner
+from unittest import TestCase
+
+
+class CountingSnapPlanner(SnapPlanner):
+    def __init__(self):
+        super(CountingSnapPlanner, self).__init__()
+        self.num_calls = 0
+
+    def PlanToConfiguration(self, robot, goal, **kw_args):
+        self.num_calls += 1
+        return super(CountingSnapPlanner, self).PlanToConfiguration(
+            robot, goal, **kw_args)
+
+
+class ExperiencePlannerTests(BasePlannerTest,
+                             PlanToConfigurationTest,
+                             PlanToConfigurationStraightLineTest,
+                             TestCase):
+    planner_factory = lambda _: ExperiencePlanner(CountingSnapPlanner())
+
+    def test_EmptyLibrary_DelegatePlannerIsCalled(self):
+        with self.env:
+            self.robot.SetActiveDOFValues(self.waypoint1)
+
+        path = self.planner.PlanToConfiguration(self.robot, self.waypoint2)
+
+        self.ValidatePath(path)
+        self.assertEqual(self.planner.delegate_planner.num_calls, 1)
+
+    def test_SimilarQuery_ExperienceIsReused(self):
+        with self.env:
+            self.robot.SetActiveDOFValues(self.waypoint1)
+
+        self.planner.PlanToConfiguration(self.robot, self.waypoint2)
+
+        with self.env:
+            self.robot.SetActiveDOFValues(self.waypoint2)
+
+        path = self.planner.PlanToConfiguration(self.robot, self.waypoint3)
+
+        self.ValidatePath(path)
+        self.assertFalse(self.CollisionCheckPath(path))
+        self.assertEqual(self.planner.delegate_planner.num_calls, 1)
+
+    def test_DiscardedExperience_IsNotReturned(self):
+        import numpy
+
+        planner = ExperiencePlanner(CountingSnapPlanner(), max_experiences=2,
+                                    index_batch_size=10)
+
+        def AddExperience(start, goal):
+            with self.env:
+                path = planner._CreatePath(self.robot, [start, goal])
+            planner.add_experience(self.robot, path)
+
+        AddExperience(self.waypoint1, self.waypoint2)
+        AddExperience(self.waypoint2, self.waypoint3)
+        planner.get_neighbors(self.robot, self.waypoint1, self.waypoint2, 1)
+
+        # Discards the first experience, which is still in the index.
+        AddExperience(self.waypoint3, self.waypoint1)
+        neighbors = planner.get_neighbors(
+            self.robot, self.waypoint1, self.waypoint2, 3)
+
+        self.assertEqual(len(neighbors), 2)
+        numpy.testing.assert_array_almost_equal(
+            neighbors[0].start, self.waypoint3)
+        numpy.testing.assert_array_almost_equal(
+            neighbors[1].start, self.waypoint2)
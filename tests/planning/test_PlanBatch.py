@@ -0,0 +1,61 @@
+from unittest import TestCase
+from planning_helpers import FailPlanner, MetaPlannerTests, SuccessPlanner
+from prpy import metrics
+from prpy.planning.base import PlanningError, Sequence
+
+
+class PlanBatchTests(MetaPlannerTests,
+                     TestCase):
+    def setUp(self):
+        super(PlanBatchTests, self).setUp()
+        metrics.reset()
+
+    def GetNumClones(self, planner):
+        return metrics.dump()[('clone', str(planner), 'PlanTest')]['count']
+
+    def test_AllQueriesSucceed_ReturnsTrajectories(self):
+        planner = SuccessPlanner(self.traj)
+
+        results = planner.PlanBatch(self.robot, [('PlanTest', (), {})] * 3)
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(planner.num_calls, 3)
+        for traj in results:
+            self.assertEqual(traj.GetEnv(), self.env)
+
+    def test_AllQueriesSucceed_ClonesOnce(self):
+        planner = SuccessPlanner(self.traj)
+
+        planner.PlanBatch(self.robot, [('PlanTest', (), {})] * 3)
+
+        self.assertEqual(self.GetNumClones(planner), 1)
+
+    def test_QueryFails_ReturnsException(self):
+        planner = FailPlanner()
+
+        results = planner.PlanBatch(self.robot, [('PlanTest', (), {})] * 2)
+
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertIsInstance(result, PlanningError)
+
+    def test_Parallel_ReturnsResultsInOrder(self):
+        planner = Sequence(FailPlanner(), SuccessPlanner(self.traj))
+
+        results = planner.PlanBatch(
+            self.robot, [('PlanTest', (), {})] * 4, parallel=True)
+
+        self.assertEqual(len(results), 4)
+        for traj in results:
+            self.assertEqual(traj.GetEnv(), self.env)
+
+    def test_Parallel_ClonesOnce(self):
+        planner = SuccessPlanner(self.traj)
+
+        results = planner.PlanBatch(
+            self.robot, [('PlanTest', (), {})] * 3, parallel=True)
+
+        self.assertEqual(planner.num_calls, 3)
+        self.assertEqual(self.GetNumClones(planner), 1)
+        for traj in results:
+            self.assertEqual(traj.GetEnv(), self.env)
@@ -0,0 +1,88 @@
+import numpy
+import openravepy
+from unittest import TestCase
+from prpy.planning.base import BasePlanner, ClonedPlanningMethod, PlanningError
+from prpy.planning.process import ProcessPoolPlanner
+
+
+class ReportingPlanner(BasePlanner):
+    """Planner that reports the state of the environment it plans in."""
+    @ClonedPlanningMethod
+    def PlanToConfiguration(self, robot, goal, **kw_args):
+        cspec = robot.GetActiveConfigurationSpecification('linear')
+        traj = openravepy.RaveCreateTrajectory(self.env, '')
+        traj.Init(cspec)
+        traj.Insert(0, robot.GetActiveDOFValues())
+        traj.Insert(1, goal)
+        return traj
+
+    @ClonedPlanningMethod
+    def PlanTest(self, robot, body_name):
+        body = robot.GetEnv().GetKinBody(body_name)
+        raise PlanningError(body.GetKinematicsGeometryHash())
+
+
+class ProcessPoolPlannerTests(TestCase):
+    def setUp(self):
+        # Fork the worker before creating any environments.
+        self.planner = ProcessPoolPlanner(
+            ReportingPlanner, num_workers=1, uri_only=False)
+
+        self.env = openravepy.Environment()
+        self.env.Load('data/wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+
+        with self.env:
+            self.robot.SetActiveDOFs(self.manipulator.GetArmIndices())
+            self.box = self.AddBox(0.1)
+
+    def tearDown(self):
+        self.planner.shutdown()
+        self.env.Destroy()
+
+    def AddBox(self, size):
+        box = openravepy.RaveCreateKinBody(self.env, '')
+        box.SetName('box')
+        box.InitFromBoxes(numpy.array([[0., 0., 0., size, size, size]]), True)
+        self.env.Add(box)
+        return box
+
+    def GetWorkerHash(self, body_name):
+        with self.assertRaises(PlanningError) as context:
+            self.planner.PlanTest(self.robot, body_name)
+        return str(context.exception)
+
+    def test_PlanToConfiguration_ReturnsTrajectory(self):
+        with self.env:
+            q_start = self.robot.GetActiveDOFValues()
+            q_goal = q_start + 0.1
+
+        traj = self.planner.PlanToConfiguration(self.robot, q_goal)
+
+        self.assertEqual(traj.GetEnv(), self.env)
+        self.assertEqual(traj.GetNumWaypoints(), 2)
+
+        cspec = traj.GetConfigurationSpecification()
+        dof_indices = self.robot.GetActiveDOFIndices()
+        numpy.testing.assert_array_almost_equal(
+            cspec.ExtractJointValues(traj.GetWaypoint(0), self.robot,
+                                     dof_indices, 0),
+            q_start)
+        numpy.testing.assert_array_almost_equal(
+            cspec.ExtractJointValues(traj.GetWaypoint(1), self.robot,
+                                     dof_indices, 0),
+            q_goal)
+
+    def test_ChangedBody_IsReloaded(self):
+        self.assertEqual(self.GetWorkerHash('box'),
+                         self.box.GetKinematicsGeometryHash())
+
+        # Replace the box with one that has the same name and different
+        # geometry. The worker must reload it instead of reusing its copy.
+        with self.env:
+            self.env.Remove(self.box)
+            self.box = self.AddBox(0.2)
+
+        self.assertEqual(self.GetWorkerHash('box'),
+                         self.box.GetKinematicsGeometryHash())
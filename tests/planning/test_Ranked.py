@@ -0,0 +1,48 @@
+import threading
+from unittest import TestCase
+from planning_helpers import MetaPlannerTests, SuccessPlanner
+from prpy.futures import CancellationToken, ThreadPoolExecutor
+from prpy.planning.base import (BasePlanner, LockedPlanningMethod,
+                                PlanningError, Ranked)
+from prpy.planning.exceptions import CancelledPlanningError
+
+
+class CancellingPlanner(BasePlanner):
+    def __init__(self, token):
+        BasePlanner.__init__(self)
+        self.token = token
+
+    @LockedPlanningMethod
+    def PlanTest(self, robot):
+        self.token.cancel()
+        raise PlanningError('CancellingPlanner', deterministic=True)
+
+
+class RankedTests(MetaPlannerTests,
+                  TestCase):
+    def setUp(self):
+        super(RankedTests, self).setUp()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def test_CancelledWhileQueued_RaisesCancelledPlanningError(self):
+        token = CancellationToken()
+        second_planner = SuccessPlanner(self.traj)
+        planner = Ranked(CancellingPlanner(token), second_planner,
+                         executor=self.executor)
+
+        # Keep the only worker busy, so both planners are still queued when
+        # Ranked waits for them and the first one runs in this thread.
+        release = threading.Event()
+        blocker = self.executor.submit(release.wait)
+
+        try:
+            with self.assertRaises(CancelledPlanningError):
+                planner.PlanTest(self.robot, cancel_token=token)
+        finally:
+            release.set()
+            blocker.result(timeout=self.join_timeout)
+
+        self.assertEqual(second_planner.num_calls, 0)
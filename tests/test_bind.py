@@ -0,0 +1,81 @@
+import numpy
+import openravepy
+import unittest
+from prpy.bind import InstanceDeduplicator, bind_subclass
+
+# Initialize OpenRAVE.
+openravepy.RaveInitialize(True)
+openravepy.misc.InitOpenRAVELogging()
+openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+
+class BoundKinBody(openravepy.KinBody):
+    def __init__(self, label):
+        self.label = label
+
+
+class CleanupTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.referrer = self.CreateBox('referrer')
+        self.box = self.CreateBox('box')
+
+        bind_subclass(self.referrer, BoundKinBody, 'referrer')
+
+    def tearDown(self):
+        InstanceDeduplicator.clear_untracked_referrers = False
+        self.env.Destroy()
+
+    def CreateBox(self, name):
+        box = openravepy.RaveCreateKinBody(self.env, '')
+        box.SetName(name)
+        box.InitFromBoxes(numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]), True)
+        self.env.Add(box)
+        return box
+
+    def test_RemoveBody_ClearsTrackedAttributes(self):
+        self.referrer.body = self.box
+        self.referrer.link = self.box.GetLinks()[0]
+
+        self.env.Remove(self.box)
+
+        self.assertFalse(hasattr(self.referrer, 'body'))
+        self.assertFalse(hasattr(self.referrer, 'link'))
+        self.assertEqual(self.referrer.label, 'referrer')
+
+    def test_RemoveBody_KeepsOverwrittenAttributes(self):
+        self.referrer.body = self.box
+        self.referrer.body = 'other'
+
+        self.env.Remove(self.box)
+
+        self.assertEqual(self.referrer.body, 'other')
+
+    def test_RemoveOtherBody_KeepsAttributes(self):
+        other_box = self.CreateBox('other_box')
+        self.referrer.body = self.box
+
+        self.env.Remove(other_box)
+
+        self.assertEqual(self.referrer.body, self.box)
+
+    def test_RemoveBoundBody_ClearsBindings(self):
+        bind_subclass(self.box, BoundKinBody, 'box')
+        self.assertEqual(self.box.label, 'box')
+
+        self.env.Remove(self.box)
+
+        self.assertEqual(object.__getattribute__(self.box, '__dict__'), {})
+
+    def test_ClearUntrackedReferrers_ClearsContainers(self):
+        InstanceDeduplicator.clear_untracked_referrers = True
+        bind_subclass(self.box, BoundKinBody, 'box')
+        container = [self.box]
+
+        self.env.Remove(self.box)
+
+        self.assertEqual(container, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import numpy
+import openravepy
+import unittest
+from prpy.clone import Clone, ClonePool
+
+# Initialize OpenRAVE.
+openravepy.RaveInitialize(True)
+openravepy.misc.InitOpenRAVELogging()
+openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+
+class ClonePoolTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.box = openravepy.RaveCreateKinBody(self.env, '')
+        self.box.SetName('box')
+        self.box.InitFromBoxes(numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]),
+                               False)
+        self.env.Add(self.box)
+
+        self.pool = ClonePool(size=2)
+
+    def tearDown(self):
+        self.pool.clear()
+        self.env.Destroy()
+
+    def test_Warm_FillsPool(self):
+        self.pool.warm(self.env)
+
+        first = self.pool.checkout(self.env)
+        second = self.pool.checkout(self.env)
+        self.assertIsNotNone(first.GetKinBody('box'))
+        self.assertIsNotNone(second.GetKinBody('box'))
+        self.assertNotEqual(first, second)
+
+        self.pool.checkin(first)
+        self.pool.checkin(second)
+
+    def test_Clone_ReusesEnvironment(self):
+        with Clone(self.env, pool=self.pool) as cloned_env:
+            first_id = openravepy.RaveGetEnvironmentId(cloned_env)
+
+        with Clone(self.env, pool=self.pool) as cloned_env:
+            second_id = openravepy.RaveGetEnvironmentId(cloned_env)
+
+        self.assertEqual(first_id, second_id)
+
+    def test_NestedClone_UsesSeparateEnvironments(self):
+        with Clone(self.env, pool=self.pool, lock=False) as first_env, \
+                Clone(self.env, pool=self.pool, lock=False) as second_env:
+            self.assertNotEqual(first_env, second_env)
+
+    def test_Clone_SyncsChanges(self):
+        with Clone(self.env, pool=self.pool):
+            pass
+
+        with self.env:
+            T = numpy.eye(4)
+            T[0, 3] = 1.
+            self.box.SetTransform(T)
+
+        with Clone(self.env, pool=self.pool) as cloned_env:
+            numpy.testing.assert_array_almost_equal(
+                cloned_env.Cloned(self.box).GetTransform(), T)
+
+    def test_Checkin_DestroysExtraEnvironments(self):
+        envs = [self.pool.checkout(self.env) for _ in xrange(3)]
+        for env in envs:
+            with Clone(self.env, clone_env=env, lock=False):
+                pass
+            self.pool.checkin(env)
+
+        self.assertEqual(len(self.pool._idle[
+            openravepy.RaveGetEnvironmentId(self.env)]), 2)
+
+    def test_DestroyedParent_IdleEnvironmentsAreDestroyed(self):
+        other_env = openravepy.Environment()
+        self.pool.warm(other_env, count=1)
+        other_id = openravepy.RaveGetEnvironmentId(other_env)
+        idle_env = self.pool._idle[other_id][0]
+        idle_id = openravepy.RaveGetEnvironmentId(idle_env)
+
+        other_env.Destroy()
+        with Clone(self.env, pool=self.pool):
+            pass
+
+        self.assertNotIn(other_id, self.pool._idle)
+        self.assertNotIn(idle_id, [openravepy.RaveGetEnvironmentId(env)
+                                   for env in openravepy.RaveGetEnvironments()])
+
+
+if __name__ == '__main__':
+    unittest.main()
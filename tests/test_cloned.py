@@ -0,0 +1,108 @@
+import numpy
+import openravepy
+import unittest
+from prpy.clone import Clone, CloneException, Cloned
+
+# Initialize OpenRAVE.
+openravepy.RaveInitialize(True)
+openravepy.misc.InitOpenRAVELogging()
+openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+
+class ClonedTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+
+        self.box = openravepy.RaveCreateKinBody(self.env, '')
+        self.box.SetName('box')
+        self.box.InitFromBoxes(numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]),
+                               False)
+        self.env.Add(self.box)
+
+        self.clone_env = openravepy.Environment()
+
+    def tearDown(self):
+        self.clone_env.Destroy()
+        self.env.Destroy()
+
+    def test_Cloned_ReturnsMatchingInstances(self):
+        manipulator = self.robot.GetManipulator('arm')
+        link = self.robot.GetLinks()[3]
+
+        with Clone(self.env, clone_env=self.clone_env) as cloned_env:
+            cloned_robot = cloned_env.Cloned(self.robot)
+            cloned_box = cloned_env.Cloned(self.box)
+            cloned_manipulator = cloned_env.Cloned(manipulator)
+            cloned_link = cloned_env.Cloned(link)
+
+            self.assertEqual(cloned_robot.GetEnv(), cloned_env)
+            self.assertEqual(cloned_robot.GetName(), self.robot.GetName())
+            self.assertEqual(cloned_box.GetName(), 'box')
+            self.assertEqual(cloned_manipulator.GetName(), 'arm')
+            self.assertEqual(cloned_link.GetName(), link.GetName())
+            self.assertEqual(cloned_link.GetParent().GetName(),
+                             self.robot.GetName())
+
+    def test_Cloned_SetsCloneParent(self):
+        with Clone(self.env, clone_env=self.clone_env) as cloned_env:
+            cloned_box = cloned_env.Cloned(self.box)
+            self.assertEqual(cloned_box.clone_parent, self.box)
+
+    def test_RemoveBody_InvalidatesLookup(self):
+        with Clone(self.env, clone_env=self.clone_env) as cloned_env:
+            cloned_env.Remove(cloned_env.Cloned(self.box))
+
+            with self.assertRaises(CloneException):
+                Cloned(self.box, into=cloned_env)
+
+            # Other bodies are still found after the lookup is cleared.
+            self.assertIsNotNone(cloned_env.Cloned(self.robot))
+
+
+class RegionCloneTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+
+        self.near_box = self.CreateBox('near_box', [0.5, 0., 0.5])
+        self.far_box = self.CreateBox('far_box', [100., 0., 0.])
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def CreateBox(self, name, position):
+        box = openravepy.RaveCreateKinBody(self.env, '')
+        box.SetName(name)
+        box.InitFromBoxes(numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]), False)
+        self.env.Add(box)
+
+        T = numpy.eye(4)
+        T[0:3, 3] = position
+        box.SetTransform(T)
+        return box
+
+    def test_Region_SkipsDistantBodies(self):
+        with Clone(self.env, region=self.robot) as cloned_env:
+            self.assertIsNotNone(cloned_env.GetRobot(self.robot.GetName()))
+            self.assertIsNotNone(cloned_env.GetKinBody('near_box'))
+            self.assertIsNone(cloned_env.GetKinBody('far_box'))
+
+            with self.assertRaises(CloneException):
+                cloned_env.Cloned(self.far_box)
+
+    def test_Region_ClonesGrabbedBodies(self):
+        with self.env:
+            self.robot.Grab(self.far_box)
+
+        with Clone(self.env, region=self.robot) as cloned_env:
+            cloned_robot = cloned_env.Cloned(self.robot)
+            self.assertEqual(
+                [body.GetName() for body in cloned_robot.GetGrabbed()],
+                ['far_box'])
+
+
+if __name__ == '__main__':
+    unittest.main()
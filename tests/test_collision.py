@@ -0,0 +1,511 @@
+import numpy
+import openravepy
+import unittest
+from prpy.clone import ClonePool
+from prpy.collision import (
+    AutoRobotCollisionCheckerFactory,
+    CachedRobotCollisionCheckerFactory,
+    DistanceCertificateRobotCollisionChecker,
+    ParallelPathValidator,
+    SelfCollisionFilter,
+    SimpleRobotCollisionChecker,
+    SimpleRobotCollisionCheckerFactory,
+)
+from prpy.futures import ThreadPoolExecutor
+from prpy.planning.base import BasePlanner, ClonedPlanningMethod
+from prpy.planning.exceptions import CollisionPlanningError, PlanningError
+
+# Initialize OpenRAVE.
+openravepy.RaveInitialize(True)
+openravepy.misc.InitOpenRAVELogging()
+openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+
+class CheckCollisionBatchTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+
+        with self.env:
+            self.robot.SetActiveDOFs(self.manipulator.GetArmIndices())
+            self.q_free = self.robot.GetActiveDOFValues()
+
+            # Place a box around the end-effector.
+            box = openravepy.RaveCreateKinBody(self.env, '')
+            box.SetName('box')
+            box.InitFromBoxes(numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]),
+                              True)
+            self.env.Add(box)
+            box.SetTransform(self.manipulator.GetEndEffectorTransform())
+
+            # Move the arm away from the box.
+            self.q_collision = self.q_free.copy()
+            self.q_free = self.q_free.copy()
+            self.q_free[0] += numpy.pi / 2.
+            self.robot.SetActiveDOFValues(self.q_free)
+            self.assertFalse(self.env.CheckCollision(self.robot))
+
+        self.checker = SimpleRobotCollisionChecker(
+            self.robot, openravepy.CollisionOptions.ActiveDOFs)
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def test_CheckCollisionBatch_ReturnsMask(self):
+        configs = [self.q_free, self.q_collision, self.q_free]
+
+        with self.env, self.checker:
+            in_collision = self.checker.CheckCollisionBatch(
+                configs, early_exit=False)
+
+        numpy.testing.assert_array_equal(in_collision, [False, True, False])
+
+    def test_CheckCollisionBatch_EarlyExit(self):
+        configs = [self.q_free, self.q_collision, self.q_free]
+
+        with self.env, self.checker:
+            in_collision = self.checker.CheckCollisionBatch(configs)
+
+        numpy.testing.assert_array_equal(in_collision, [False, True, True])
+        self.assertEqual(numpy.argmax(in_collision), 1)
+
+    def test_CheckCollisionBatch_RestoresState(self):
+        with self.env:
+            q_before = self.robot.GetActiveDOFValues()
+
+            with self.checker:
+                self.checker.CheckCollisionBatch([self.q_collision])
+
+            numpy.testing.assert_array_almost_equal(
+                self.robot.GetActiveDOFValues(), q_before)
+
+
+class DistanceCertificateRobotCollisionCheckerTests(CheckCollisionBatchTests):
+    def setUp(self):
+        super(DistanceCertificateRobotCollisionCheckerTests, self).setUp()
+
+        self.checker = DistanceCertificateRobotCollisionChecker(
+            self.robot, openravepy.CollisionOptions.ActiveDOFs,
+            distance_method='spheres')
+
+    def test_CheckCollisionBatch_MatchesSimpleChecker(self):
+        configs = [(1. - s) * self.q_free + s * self.q_collision
+                   for s in numpy.linspace(0., 1., 100)]
+        simple_checker = SimpleRobotCollisionChecker(
+            self.robot, openravepy.CollisionOptions.ActiveDOFs)
+
+        with self.env:
+            with simple_checker:
+                expected = simple_checker.CheckCollisionBatch(
+                    configs, early_exit=False)
+
+            with self.checker:
+                in_collision = self.checker.CheckCollisionBatch(
+                    configs, early_exit=False)
+
+        numpy.testing.assert_array_equal(in_collision, expected)
+        self.assertTrue(expected.any())
+        self.assertFalse(expected.all())
+
+        # Only collision-free configurations can be certified, so this checks
+        # that certificates were reused on the free-space portion.
+        self.assertGreater(self.checker.num_certified, 0)
+        self.assertEqual(
+            self.checker.num_checked + self.checker.num_certified,
+            len(configs))
+
+    def test_UnknownDistanceMethod_Raises(self):
+        with self.assertRaises(ValueError):
+            DistanceCertificateRobotCollisionChecker(
+                self.robot, openravepy.CollisionOptions.ActiveDOFs,
+                distance_method='foo')
+
+
+class AutoRobotCollisionCheckerTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+
+        with self.env:
+            self.robot.SetActiveDOFs(self.manipulator.GetArmIndices())
+            self.q_free = self.robot.GetActiveDOFValues()
+
+        self.factory = AutoRobotCollisionCheckerFactory(bake_threshold=10)
+
+    def tearDown(self):
+        self.factory.clear()
+        self.env.Destroy()
+
+    def UseBakingChecker(self):
+        checker = openravepy.RaveCreateCollisionChecker(self.env, 'fcl_')
+        if checker is None:
+            self.skipTest('or_fcl is not available.')
+        self.env.SetCollisionChecker(checker)
+
+    def test_SmallBatch_DoesNotBake(self):
+        self.UseBakingChecker()
+
+        with self.env, self.factory(self.robot) as checker:
+            in_collision = checker.CheckCollisionBatch([self.q_free] * 5)
+            self.assertFalse(checker.is_baked)
+
+        self.assertFalse(in_collision.any())
+        self.assertEqual(self.factory.get_statistics()['bakes'], 0)
+
+    def test_LargeBatch_Bakes(self):
+        self.UseBakingChecker()
+
+        with self.env, self.factory(self.robot) as checker:
+            in_collision = checker.CheckCollisionBatch([self.q_free] * 20)
+            self.assertTrue(checker.is_baked)
+
+        self.assertFalse(in_collision.any())
+        self.assertEqual(self.factory.get_statistics()['bakes'], 1)
+
+    def test_UnchangedEnvironment_ReusesBake(self):
+        self.UseBakingChecker()
+
+        with self.env:
+            for _ in xrange(2):
+                with self.factory(self.robot, num_checks=20) as checker:
+                    self.assertTrue(checker.is_baked)
+
+        stats = self.factory.get_statistics()
+        self.assertEqual(stats['bakes'], 1)
+        self.assertEqual(stats['reuses'], 1)
+
+    def test_ChangedEnvironment_Rebakes(self):
+        self.UseBakingChecker()
+
+        with self.env:
+            with self.factory(self.robot, num_checks=20):
+                pass
+
+            body = [body for body in self.env.GetBodies()
+                    if not body.IsRobot()][0]
+            T = body.GetTransform()
+            T[0, 3] += 0.1
+            body.SetTransform(T)
+
+            with self.factory(self.robot, num_checks=20):
+                pass
+
+        self.assertEqual(self.factory.get_statistics()['bakes'], 2)
+
+    def test_NewCheckerInstance_Rebakes(self):
+        self.UseBakingChecker()
+
+        with self.env:
+            with self.factory(self.robot, num_checks=20):
+                pass
+
+            self.UseBakingChecker()
+
+            with self.factory(self.robot, num_checks=20):
+                pass
+
+        stats = self.factory.get_statistics()
+        self.assertEqual(stats['bakes'], 2)
+        self.assertEqual(stats['reuses'], 0)
+
+    def test_DestroyedEnvironment_IsReleased(self):
+        other_env = self.env.CloneSelf(openravepy.CloningOptions.Bodies)
+        checker = openravepy.RaveCreateCollisionChecker(other_env, 'fcl_')
+        if checker is None:
+            self.skipTest('or_fcl is not available.')
+        other_env.SetCollisionChecker(checker)
+
+        other_robot = other_env.GetRobot(self.robot.GetName())
+        with other_env, self.factory(other_robot, num_checks=20):
+            pass
+        other_env.Destroy()
+
+        self.UseBakingChecker()
+        with self.env, self.factory(self.robot, num_checks=20):
+            pass
+
+        self.assertEqual(self.factory.get_statistics()['size'], 1)
+
+    def test_UnsupportedChecker_DoesNotBake(self):
+        checker = openravepy.RaveCreateCollisionChecker(self.env, 'ode')
+        if checker is None:
+            self.skipTest('ode is not available.')
+        self.env.SetCollisionChecker(checker)
+
+        with self.env, self.factory(self.robot) as checker:
+            in_collision = checker.CheckCollisionBatch([self.q_free] * 20)
+            self.assertFalse(checker.is_baked)
+
+        self.assertFalse(in_collision.any())
+
+
+class CachedRobotCollisionCheckerTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+
+        with self.env:
+            self.robot.SetActiveDOFs(self.manipulator.GetArmIndices())
+
+            self.box = openravepy.RaveCreateKinBody(self.env, '')
+            self.box.SetName('box')
+            self.box.InitFromBoxes(
+                numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]), True)
+            self.env.Add(self.box)
+
+            T = numpy.eye(4)
+            T[2, 3] = 20.
+            self.box.SetTransform(T)
+
+        self.factory = CachedRobotCollisionCheckerFactory(
+            SimpleRobotCollisionCheckerFactory())
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def test_RepeatedCheck_HitsCache(self):
+        with self.env:
+            with self.factory(self.robot) as checker:
+                self.assertFalse(checker.CheckCollision())
+                self.assertFalse(checker.CheckCollision())
+
+        statistics = self.factory.get_statistics()
+        self.assertEqual(statistics['hits'], 1)
+        self.assertEqual(statistics['misses'], 1)
+        self.assertEqual(statistics['size'], 1)
+
+    def test_EnvironmentChange_MissesCache(self):
+        with self.env:
+            with self.factory(self.robot) as checker:
+                self.assertFalse(checker.CheckCollision())
+
+            # Move the box onto the end-effector.
+            self.box.SetTransform(
+                self.manipulator.GetEndEffectorTransform())
+
+            with self.factory(self.robot) as checker:
+                self.assertTrue(checker.CheckCollision())
+
+        self.assertEqual(self.factory.get_statistics()['hits'], 0)
+
+    def test_MaxSize_EvictsLeastRecentlyUsed(self):
+        factory = CachedRobotCollisionCheckerFactory(
+            SimpleRobotCollisionCheckerFactory(), max_size=1)
+
+        with self.env:
+            q = self.robot.GetActiveDOFValues()
+            q_other = q.copy()
+            q_other[0] += 0.5
+
+            with factory(self.robot) as checker:
+                checker.CheckCollisionBatch([q, q_other], early_exit=False)
+
+        statistics = factory.get_statistics()
+        self.assertEqual(statistics['size'], 1)
+        self.assertEqual(statistics['evictions'], 1)
+
+    def test_SubsetOfDOFs_KeysOnOtherActiveDOFs(self):
+        arm_indices = self.manipulator.GetArmIndices()
+
+        with self.env:
+            q = self.robot.GetActiveDOFValues()
+
+            with self.factory(self.robot) as checker:
+                checker.CheckCollisionBatch(
+                    [q[:1]], dof_indices=arm_indices[:1])
+
+                # Move an active DOF that is not being checked.
+                q_other = q.copy()
+                q_other[1] += 0.5
+                self.robot.SetActiveDOFValues(q_other)
+
+                checker.CheckCollisionBatch(
+                    [q[:1]], dof_indices=arm_indices[:1])
+
+        statistics = self.factory.get_statistics()
+        self.assertEqual(statistics['hits'], 0)
+        self.assertEqual(statistics['misses'], 2)
+
+    def test_GrabbedBody_MovingRobot_HitsCache(self):
+        with self.env:
+            self.robot.Grab(self.box)
+            q = self.robot.GetActiveDOFValues()
+
+            with self.factory(self.robot) as checker:
+                checker.CheckCollisionBatch([q])
+
+            # Moving the robot also moves the grabbed box.
+            q_other = q.copy()
+            q_other[0] += 0.5
+            self.robot.SetActiveDOFValues(q_other)
+
+            with self.factory(self.robot) as checker:
+                checker.CheckCollisionBatch([q])
+
+        self.assertEqual(self.factory.get_statistics()['hits'], 1)
+
+
+class ParallelPathValidatorTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+
+        with self.env:
+            self.robot.SetActiveDOFs(self.manipulator.GetArmIndices())
+            self.q_start = self.robot.GetActiveDOFValues()
+
+            self.box = openravepy.RaveCreateKinBody(self.env, '')
+            self.box.SetName('box')
+            self.box.InitFromBoxes(
+                numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]), True)
+            self.env.Add(self.box)
+
+            T = numpy.eye(4)
+            T[2, 3] = 20.
+            self.box.SetTransform(T)
+
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.clone_pool = ClonePool(size=2)
+        self.validator = ParallelPathValidator(
+            num_workers=2, chunk_size=4, clone_pool=self.clone_pool,
+            executor=self.executor)
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+        self.clone_pool.clear()
+        self.env.Destroy()
+
+    def CreateTrajectory(self, q_start, q_goal):
+        cspec = self.robot.GetActiveConfigurationSpecification('linear')
+        traj = openravepy.RaveCreateTrajectory(self.env, '')
+        traj.Init(cspec)
+
+        for q in [q_start, q_goal]:
+            waypoint = numpy.zeros(cspec.GetDOF())
+            cspec.InsertJointValues(waypoint, q, self.robot,
+                                    self.robot.GetActiveDOFIndices(), False)
+            traj.Insert(traj.GetNumWaypoints(), waypoint)
+
+        return traj
+
+    def test_FreePath_HasNoCollision(self):
+        q_goal = self.q_start.copy()
+        q_goal[0] += 1.
+        traj = self.CreateTrajectory(self.q_start, q_goal)
+
+        self.assertIsNone(self.validator.FindFirstCollision(self.robot, traj))
+        self.assertFalse(self.validator.CheckCollision(self.robot, traj))
+
+    def test_CollidingPath_FindsFirstCollision(self):
+        q_goal = self.q_start.copy()
+        q_goal[0] += 1.
+        traj = self.CreateTrajectory(self.q_start, q_goal)
+
+        # Place the box at the end-effector pose halfway along the path.
+        with self.env:
+            q_middle = (self.q_start + q_goal) / 2.
+            self.robot.SetActiveDOFValues(q_middle)
+            self.box.SetTransform(self.manipulator.GetEndEffectorTransform())
+            self.robot.SetActiveDOFValues(self.q_start)
+
+        first_collision = self.validator.FindFirstCollision(self.robot, traj)
+        self.assertIsNotNone(first_collision)
+
+        serial_validator = ParallelPathValidator(
+            num_workers=1, executor=self.executor)
+        self.assertEqual(
+            first_collision[0],
+            serial_validator.FindFirstCollision(self.robot, traj)[0])
+
+        with self.assertRaises(CollisionPlanningError):
+            self.validator.VerifyCollisionFree(self.robot, traj)
+
+
+class NonAdjacentLinksPlanner(BasePlanner):
+    """Planner that records the non-adjacent links of the robot it plans with.
+    """
+    @ClonedPlanningMethod
+    def PlanTest(self, robot):
+        self.num_non_adjacent = len(robot.GetNonAdjacentLinks(0))
+        raise PlanningError('NonAdjacentLinksPlanner')
+
+
+class SelfCollisionFilterTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+
+        # Avoid writing to the OpenRAVE database in tests.
+        self.filter = SelfCollisionFilter(num_samples=100)
+        self.filter.load = self.filter.compute
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def GetNonAdjacentPairs(self):
+        links = self.robot.GetLinks()
+        return set(
+            tuple(sorted([links[pair & 0xffff].GetName(),
+                          links[pair >> 16].GetName()]))
+            for pair in self.robot.GetNonAdjacentLinks(0))
+
+    def test_Compute_ReturnsNonAdjacentPairs(self):
+        with self.env:
+            pairs = self.filter.compute(self.robot)
+
+        non_adjacent = self.GetNonAdjacentPairs()
+        self.assertTrue(len(pairs) > 0)
+        for pair in pairs:
+            self.assertIn(tuple(sorted(pair)), non_adjacent)
+
+    def test_Compute_IsDeterministic(self):
+        with self.env:
+            pairs1 = self.filter.compute(self.robot)
+            pairs2 = self.filter.compute(self.robot)
+
+        self.assertEqual(pairs1, pairs2)
+
+    def test_Apply_DisablesPairs(self):
+        with self.env:
+            num_before = len(self.GetNonAdjacentPairs())
+            pairs = self.filter.apply(self.robot)
+            num_after = len(self.GetNonAdjacentPairs())
+
+        self.assertEqual(num_after, num_before - len(pairs))
+
+
+    def test_ApplyTwice_ReturnsSamePairs(self):
+        with self.env:
+            pairs = self.filter.apply(self.robot)
+            num_after = len(self.GetNonAdjacentPairs())
+
+            self.assertEqual(self.filter.apply(self.robot), pairs)
+            self.assertEqual(len(self.GetNonAdjacentPairs()), num_after)
+
+    def test_PlannerFilter_OnlyAppliesToClone(self):
+        planner = NonAdjacentLinksPlanner()
+        planner.self_collision_filter = self.filter
+
+        with self.env:
+            num_before = len(self.GetNonAdjacentPairs())
+            pairs = self.filter.compute(self.robot)
+
+        with self.assertRaises(PlanningError):
+            planner.PlanTest(self.robot)
+
+        with self.env:
+            self.assertEqual(len(self.GetNonAdjacentPairs()), num_before)
+        self.assertEqual(planner.num_non_adjacent, num_before - len(pairs))
+
+
+if __name__ == '__main__':
+    unittest.main()
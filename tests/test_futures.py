@@ -0,0 +1,340 @@
+import threading
+import time
+import unittest
+from prpy.futures import (
+    CancellationToken,
+    CancelledError,
+    Deadline,
+    Future,
+    ThreadPoolExecutor,
+    cancellation_scope,
+    current_future,
+    defer,
+    get_cancellation_token,
+    get_deadline,
+    wrap_future,
+)
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+class CancellationTokenTests(unittest.TestCase):
+    def test_Cancel_CancelsChildren(self):
+        parent = CancellationToken()
+        child = CancellationToken(parent=parent)
+
+        parent.cancel()
+
+        self.assertTrue(parent.is_cancelled())
+        self.assertTrue(child.is_cancelled())
+        with self.assertRaises(CancelledError):
+            child.raise_if_cancelled()
+
+    def test_CancelChild_DoesNotCancelParent(self):
+        parent = CancellationToken()
+        child = CancellationToken(parent=parent)
+
+        child.cancel()
+
+        self.assertFalse(parent.is_cancelled())
+        self.assertTrue(child.is_cancelled())
+
+    def test_CancellationScope_RestoresPreviousToken(self):
+        outer = CancellationToken()
+        inner = CancellationToken()
+
+        with cancellation_scope(outer):
+            with cancellation_scope(inner):
+                self.assertIs(get_cancellation_token(), inner)
+            self.assertIs(get_cancellation_token(), outer)
+        self.assertIsNone(get_cancellation_token())
+
+
+class DeadlineTests(unittest.TestCase):
+    def test_Expired_NoRemainingTime(self):
+        deadline = Deadline(-1.)
+
+        self.assertTrue(deadline.is_expired())
+        self.assertEqual(deadline.get_remaining_time(), 0.)
+
+    def test_ChildToken_InheritsEarliestDeadline(self):
+        early_deadline = Deadline(1.)
+        late_deadline = Deadline(10.)
+
+        parent = CancellationToken(deadline=early_deadline)
+        child = CancellationToken(parent=parent, deadline=late_deadline)
+
+        self.assertIs(child.get_deadline(), early_deadline)
+        self.assertIsNone(CancellationToken().get_deadline())
+
+    def test_GetDeadline_UsesActiveToken(self):
+        deadline = Deadline(1.)
+
+        self.assertIsNone(get_deadline())
+        with cancellation_scope(CancellationToken(deadline=deadline)):
+            self.assertIs(get_deadline(), deadline)
+
+
+class ThreadPoolExecutorTests(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.timeout = 5.0
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def test_Submit_ReturnsResult(self):
+        future = self.executor.submit(lambda x, y: x + y, 1, y=2)
+        self.assertEqual(future.result(timeout=self.timeout), 3)
+
+    def test_Submit_PropagatesException(self):
+        def fail():
+            raise ValueError('failed')
+
+        future = self.executor.submit(fail)
+        with self.assertRaises(ValueError):
+            future.result(timeout=self.timeout)
+
+    def test_CancelQueued_IsNeverCalled(self):
+        release = threading.Event()
+        calls = []
+
+        blocker = self.executor.submit(release.wait)
+        queued = self.executor.submit(calls.append, 'called')
+
+        self.assertTrue(queued.cancel())
+        self.assertTrue(queued.cancelled())
+
+        release.set()
+        blocker.result(timeout=self.timeout)
+        self.executor.shutdown(wait=True)
+
+        self.assertEqual(calls, [])
+        with self.assertRaises(CancelledError):
+            queued.result(timeout=self.timeout)
+
+    def test_Submit_InheritsDeadline(self):
+        deadline = Deadline(1.)
+
+        with cancellation_scope(CancellationToken(deadline=deadline)):
+            future = self.executor.submit(get_deadline)
+
+        self.assertIs(future.result(timeout=1.), deadline)
+
+    def test_CancelRunning_RequestsCancellation(self):
+        started = threading.Event()
+
+        def poll():
+            started.set()
+            while not current_future().cancel_requested():
+                pass
+            raise CancelledError()
+
+        future = self.executor.submit(poll)
+        self.assertTrue(started.wait(self.timeout))
+        self.assertTrue(future.running())
+
+        self.assertTrue(future.cancel())
+        with self.assertRaises(CancelledError):
+            future.result(timeout=self.timeout)
+        self.assertTrue(future.cancelled())
+
+    def test_CancelDone_ReturnsFalse(self):
+        future = self.executor.submit(lambda: 1)
+        future.result(timeout=self.timeout)
+        self.assertFalse(future.cancel())
+
+    def test_RunInline_RunsQueuedCallInCallingThread(self):
+        release = threading.Event()
+        blocker = self.executor.submit(release.wait)
+        queued = self.executor.submit(threading.current_thread)
+
+        self.assertTrue(self.executor.run_inline(queued))
+        self.assertIs(queued.result(timeout=self.timeout),
+                      threading.current_thread())
+
+        release.set()
+        blocker.result(timeout=self.timeout)
+        self.assertFalse(self.executor.run_inline(blocker))
+
+    def test_Submit_RunsWithChildOfActiveToken(self):
+        parent = CancellationToken()
+
+        with cancellation_scope(parent):
+            future = self.executor.submit(get_cancellation_token)
+
+        token = future.result(timeout=self.timeout)
+        self.assertIs(token, future.token)
+        self.assertIs(token.parent, parent)
+
+    def test_CancelParentToken_CancelsQueuedCall(self):
+        release = threading.Event()
+        parent = CancellationToken()
+        calls = []
+
+        blocker = self.executor.submit(release.wait)
+        with cancellation_scope(parent):
+            queued = self.executor.submit(calls.append, 'called')
+
+        parent.cancel()
+        release.set()
+        blocker.result(timeout=self.timeout)
+
+        with self.assertRaises(CancelledError):
+            queued.result(timeout=self.timeout)
+        self.assertEqual(calls, [])
+
+    def test_SubmitToWarmPool_CallsOverlap(self):
+        num_calls = 4
+        executor = ThreadPoolExecutor(max_workers=num_calls)
+        condition = threading.Condition()
+        num_started = [0]
+
+        def wait_for_all():
+            with condition:
+                num_started[0] += 1
+                condition.notify_all()
+
+                deadline = time.time() + self.timeout
+                while num_started[0] < num_calls and time.time() < deadline:
+                    condition.wait(deadline - time.time())
+                return num_started[0] == num_calls
+
+        try:
+            # Start a worker that is idle when the calls are submitted.
+            executor.submit(lambda: None).result(timeout=self.timeout)
+            time.sleep(0.1)
+
+            futures = [executor.submit(wait_for_all)
+                       for _ in xrange(num_calls)]
+            for future in futures:
+                self.assertTrue(future.result(timeout=2 * self.timeout))
+        finally:
+            with condition:
+                num_started[0] = num_calls
+                condition.notify_all()
+            executor.shutdown(wait=True)
+
+
+class FutureTests(unittest.TestCase):
+    def setUp(self):
+        self.timeout = 5.0
+
+    def test_CancelRacingStart_CompletesOnce(self):
+        errors = []
+
+        for _ in xrange(200):
+            future = Future()
+            start = threading.Event()
+
+            def run():
+                start.wait()
+                try:
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(None)
+                except Exception as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=run)
+            thread.start()
+            start.set()
+            future.cancel()
+            thread.join()
+
+            self.assertTrue(future.done())
+
+        self.assertEqual(errors, [])
+
+    def test_Defer_ReturnsResult(self):
+        future = defer(lambda x: x + 1, args=(41,))
+        self.assertEqual(future.result(timeout=self.timeout), 42)
+
+    def test_DeferCancelRunning_CompletesWhenCallReturns(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def wait():
+            started.set()
+            release.wait()
+            return 42
+
+        future = defer(wait)
+        self.assertTrue(started.wait(self.timeout))
+
+        self.assertTrue(future.cancel())
+        self.assertTrue(future.cancel_requested())
+        self.assertFalse(future.done())
+
+        release.set()
+        self.assertEqual(future.result(timeout=self.timeout), 42)
+
+    def test_DeferCancelQueued_IsNeverCalled(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        release = threading.Event()
+        calls = []
+
+        blocker = executor.submit(release.wait)
+        future = defer(calls.append, executor=executor, args=('called',))
+
+        self.assertTrue(future.cancel())
+        release.set()
+        blocker.result(timeout=self.timeout)
+        executor.shutdown(wait=True)
+
+        self.assertEqual(calls, [])
+        with self.assertRaises(CancelledError):
+            future.result(timeout=self.timeout)
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class WrapFutureTests(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.loop = asyncio.new_event_loop()
+        self.timeout = 5.0
+
+    def tearDown(self):
+        self.loop.close()
+        self.executor.shutdown(wait=True)
+
+    def test_WrapFuture_ReturnsResult(self):
+        future = self.executor.submit(lambda: 42)
+        aio_future = wrap_future(future, loop=self.loop)
+
+        result = self.loop.run_until_complete(
+            asyncio.wait_for(aio_future, self.timeout))
+        self.assertEqual(result, 42)
+
+    def test_WrapFuture_PropagatesException(self):
+        def raise_error():
+            raise ValueError('error')
+
+        aio_future = wrap_future(self.executor.submit(raise_error),
+                                 loop=self.loop)
+
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(
+                asyncio.wait_for(aio_future, self.timeout))
+
+    def test_CancelWrapped_CancelsFuture(self):
+        started = threading.Event()
+
+        def wait_for_cancel():
+            started.set()
+            token = get_cancellation_token()
+            while not token.is_cancelled():
+                time.sleep(0.01)
+            raise CancelledError()
+
+        future = self.executor.submit(wait_for_cancel)
+        aio_future = wrap_future(future, loop=self.loop)
+        self.assertTrue(started.wait(self.timeout))
+
+        aio_future.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        with self.assertRaises(CancelledError):
+            future.result(timeout=self.timeout)
@@ -0,0 +1,173 @@
+import numpy
+import openravepy
+import unittest
+from prpy.bind import bind_subclass
+from prpy.clone import Clone
+
+# Initialize OpenRAVE.
+openravepy.RaveInitialize(True)
+openravepy.misc.InitOpenRAVELogging()
+openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+
+class BoundKinBody(openravepy.KinBody):
+    def __init__(self, label):
+        self.label = label
+
+    num_clones = 0
+
+    def CloneBindings(self, parent):
+        BoundKinBody.num_clones += 1
+        self.label = parent.label
+
+
+class IncrementalCloneTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+
+        self.box = openravepy.RaveCreateKinBody(self.env, '')
+        self.box.SetName('box')
+        self.box.InitFromBoxes(numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]),
+                               False)
+        self.env.Add(self.box)
+
+        T = numpy.eye(4)
+        T[2, 3] = 20.
+        self.box.SetTransform(T)
+
+        self.clone_env = openravepy.Environment()
+        with Clone(self.env, clone_env=self.clone_env, incremental=True):
+            pass
+
+    def tearDown(self):
+        self.clone_env.Destroy()
+        self.env.Destroy()
+
+    def test_Sync_ReusesBodies(self):
+        cloned_box = self.clone_env.GetKinBody('box')
+
+        with Clone(self.env, clone_env=self.clone_env, incremental=True):
+            pass
+
+        self.assertEqual(self.clone_env.GetKinBody('box'), cloned_box)
+
+    def test_Sync_UpdatesTransformAndDOFValues(self):
+        with self.env:
+            T = self.box.GetTransform()
+            T[0, 3] = 1.
+            self.box.SetTransform(T)
+
+            dof_values = self.robot.GetDOFValues()
+            dof_values[self.manipulator.GetArmIndices()[0]] = 0.5
+            self.robot.SetDOFValues(dof_values)
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            cloned_box = cloned_env.Cloned(self.box)
+            cloned_robot = cloned_env.Cloned(self.robot)
+
+            numpy.testing.assert_array_almost_equal(
+                cloned_box.GetTransform(), T)
+            numpy.testing.assert_array_almost_equal(
+                cloned_robot.GetDOFValues(), dof_values)
+
+    def test_Sync_UpdatesEnableState(self):
+        with self.env:
+            self.box.Enable(False)
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            self.assertFalse(cloned_env.Cloned(self.box).IsEnabled())
+
+    def test_Sync_UpdatesVelocityLimitsAndWeights(self):
+        with self.env:
+            velocity_limits = 0.5 * self.robot.GetDOFVelocityLimits()
+            self.robot.SetDOFVelocityLimits(velocity_limits)
+
+            weights = 2. * self.robot.GetDOFWeights()
+            self.robot.SetDOFWeights(weights)
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            cloned_robot = cloned_env.Cloned(self.robot)
+            numpy.testing.assert_array_almost_equal(
+                cloned_robot.GetDOFVelocityLimits(), velocity_limits)
+            numpy.testing.assert_array_almost_equal(
+                cloned_robot.GetDOFWeights(), weights)
+
+    def test_Sync_RefreshesBindings(self):
+        bind_subclass(self.box, BoundKinBody, 'old')
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            self.assertEqual(cloned_env.Cloned(self.box).label, 'old')
+
+        self.box.label = 'new'
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            cloned_box = cloned_env.Cloned(self.box)
+            self.assertEqual(cloned_box, cloned_env.GetKinBody('box'))
+            self.assertEqual(cloned_box.label, 'new')
+
+    def test_Sync_UnchangedBindingsAreKept(self):
+        bind_subclass(self.box, BoundKinBody, 'old')
+        BoundKinBody.num_clones = 0
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            self.assertEqual(cloned_env.Cloned(self.box).label, 'old')
+
+        with self.env:
+            self.robot.SetDOFValues(self.robot.GetDOFValues() + 0.1)
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            self.assertEqual(cloned_env.Cloned(self.box).label, 'old')
+
+        self.assertEqual(BoundKinBody.num_clones, 1)
+
+    def test_Sync_UpdatesGrabbedBodies(self):
+        with self.env:
+            self.robot.Grab(self.box)
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            cloned_robot = cloned_env.Cloned(self.robot)
+            self.assertEqual([b.GetName() for b in cloned_robot.GetGrabbed()],
+                             ['box'])
+
+        with self.env:
+            self.robot.ReleaseAllGrabbed()
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            cloned_robot = cloned_env.Cloned(self.robot)
+            self.assertEqual(cloned_robot.GetGrabbed(), [])
+
+    def test_AddBody_PerformsFullClone(self):
+        with self.env:
+            other_box = openravepy.RaveCreateKinBody(self.env, '')
+            other_box.SetName('other_box')
+            other_box.InitFromBoxes(
+                numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]), False)
+            self.env.Add(other_box)
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            self.assertIsNotNone(cloned_env.GetKinBody('other_box'))
+
+    def test_RemoveBody_PerformsFullClone(self):
+        with self.env:
+            self.env.Remove(self.box)
+
+        with Clone(self.env, clone_env=self.clone_env,
+                   incremental=True) as cloned_env:
+            self.assertIsNone(cloned_env.GetKinBody('box'))
+
+
+if __name__ == '__main__':
+    unittest.main()
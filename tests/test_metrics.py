@@ -0,0 +1,60 @@
+import unittest
+from prpy.metrics import Histogram, MetricsRegistry
+
+
+class HistogramTests(unittest.TestCase):
+    def test_Empty_PercentileIsNone(self):
+        histogram = Histogram()
+
+        self.assertIsNone(histogram.get_percentile(50))
+        self.assertIsNone(histogram.get_mean())
+
+    def test_Percentiles_WithinBucketResolution(self):
+        histogram = Histogram()
+        for i in range(1, 1001):
+            histogram.add(i * 1e-3)
+
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.get_percentile(50), 0.5, delta=0.5 * 0.15)
+        self.assertAlmostEqual(histogram.get_percentile(95), 0.95, delta=0.95 * 0.15)
+        self.assertAlmostEqual(histogram.get_percentile(99), 0.99, delta=0.99 * 0.15)
+
+    def test_Percentiles_ClampedToRecordedRange(self):
+        histogram = Histogram()
+        histogram.add(0.25)
+
+        self.assertEqual(histogram.get_percentile(0), 0.25)
+        self.assertEqual(histogram.get_percentile(100), 0.25)
+
+
+class MetricsRegistryTests(unittest.TestCase):
+    def test_Timed_RecordsSuccessAndFailure(self):
+        registry = MetricsRegistry()
+
+        with registry.timed('planner', 'TestPlanner', 'PlanTest'):
+            pass
+
+        with self.assertRaises(ValueError):
+            with registry.timed('planner', 'TestPlanner', 'PlanTest'):
+                raise ValueError()
+
+        stats = registry.dump()[('planner', 'TestPlanner', 'PlanTest')]
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['successes'], 1)
+        self.assertEqual(stats['failures'], {'ValueError': 1})
+
+    def test_Disabled_DoesNotRecord(self):
+        registry = MetricsRegistry()
+        registry.enabled = False
+
+        registry.record('planner', 'TestPlanner', 'PlanTest', 1.)
+
+        self.assertEqual(registry.dump(), {})
+
+    def test_Reset_RemovesMetrics(self):
+        registry = MetricsRegistry()
+        registry.record('clone', 'TestPlanner', 'PlanTest', 1.)
+
+        registry.reset()
+
+        self.assertEqual(registry.dump(), {})
@@ -0,0 +1,136 @@
+import numpy
+import openravepy
+import unittest
+from prpy.trajectory import ArrayTrajectory
+from prpy.util import ComputeUnitTiming, SimplifyTrajectory
+
+# Initialize OpenRAVE.
+openravepy.RaveInitialize(True)
+openravepy.misc.InitOpenRAVELogging()
+openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+
+class ArrayTrajectoryTests(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+
+        with self.env:
+            self.robot.SetActiveDOFs(self.manipulator.GetArmIndices())
+            self.dof_indices = self.robot.GetActiveDOFIndices()
+            self.cspec = self.robot.GetActiveConfigurationSpecification(
+                'linear')
+
+        self.configs = numpy.array([
+            numpy.zeros(7),
+            0.1 * numpy.ones(7),
+            0.2 * numpy.ones(7),
+        ])
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def CreatePath(self):
+        traj = openravepy.RaveCreateTrajectory(self.env, '')
+        traj.Init(self.cspec)
+
+        for q in self.configs:
+            waypoint = numpy.zeros(self.cspec.GetDOF())
+            self.cspec.InsertJointValues(waypoint, q, self.robot,
+                                         self.dof_indices, 0)
+            traj.Insert(traj.GetNumWaypoints(), waypoint)
+
+        return traj
+
+    def test_FromTrajectory_CopiesWaypoints(self):
+        traj = self.CreatePath()
+        array_traj = ArrayTrajectory.FromTrajectory(traj)
+
+        self.assertEqual(array_traj.GetNumWaypoints(), traj.GetNumWaypoints())
+        numpy.testing.assert_array_almost_equal(
+            array_traj.GetJointValuesArray(self.robot, self.dof_indices),
+            self.configs)
+
+    def test_ToTrajectory_RoundTrips(self):
+        array_traj = ArrayTrajectory.FromTrajectory(self.CreatePath())
+        traj = array_traj.ToTrajectory()
+
+        self.assertEqual(traj.GetNumWaypoints(), len(self.configs))
+        for i, q in enumerate(self.configs):
+            numpy.testing.assert_array_almost_equal(
+                self.cspec.ExtractJointValues(
+                    traj.GetWaypoint(i), self.robot, self.dof_indices),
+                q)
+
+    def test_SampleArray_MatchesOpenRAVE(self):
+        traj = ComputeUnitTiming(self.robot, self.CreatePath())
+        array_traj = ArrayTrajectory.FromTrajectory(traj)
+
+        times = numpy.linspace(0., traj.GetDuration(), 11)
+        samples = array_traj.SampleArray(times)
+        cspec = traj.GetConfigurationSpecification()
+
+        for t, sample in zip(times, samples):
+            numpy.testing.assert_array_almost_equal(
+                cspec.ExtractJointValues(sample, self.robot,
+                                         self.dof_indices),
+                cspec.ExtractJointValues(traj.Sample(t), self.robot,
+                                         self.dof_indices))
+
+    def test_FromTrajectory_CubicTrajectory_RaisesOnlyWhenSampled(self):
+        with self.env:
+            cspec = self.robot.GetActiveConfigurationSpecification('cubic')
+            cspec.AddDerivativeGroups(1, False)
+            cspec.AddDeltaTimeGroup()
+
+        traj = openravepy.RaveCreateTrajectory(self.env, '')
+        traj.Init(cspec)
+        traj.Insert(0, numpy.zeros(2 * cspec.GetDOF()))
+
+        array_traj = ArrayTrajectory.FromTrajectory(traj)
+
+        self.assertEqual(array_traj.GetNumWaypoints(), 2)
+        self.assertEqual(array_traj.ToTrajectory().GetNumWaypoints(), 2)
+        with self.assertRaises(ValueError):
+            array_traj.SampleArray([0.])
+
+    def test_ComputeUnitTiming_ReturnsArrayTrajectory(self):
+        array_traj = ArrayTrajectory.FromTrajectory(self.CreatePath())
+        timed_traj = ComputeUnitTiming(self.robot, array_traj)
+
+        self.assertIsInstance(timed_traj, ArrayTrajectory)
+        self.assertAlmostEqual(timed_traj.GetDuration(),
+                               2. * numpy.linalg.norm(0.1 * numpy.ones(7)))
+
+    def test_SimplifyTrajectory_RemovesCollinearWaypoints(self):
+        array_traj = ArrayTrajectory.FromTrajectory(self.CreatePath())
+        simplified_traj = SimplifyTrajectory(array_traj, self.robot)
+
+        self.assertIsInstance(simplified_traj, ArrayTrajectory)
+        self.assertEqual(simplified_traj.GetNumWaypoints(), 2)
+
+    def test_GetSlice_ResetsFirstDeltaTime(self):
+        traj = ComputeUnitTiming(self.robot, self.CreatePath())
+        array_traj = ArrayTrajectory.FromTrajectory(traj)
+        sliced_traj = array_traj.GetSlice(1, 3)
+
+        self.assertEqual(sliced_traj.GetNumWaypoints(), 2)
+        self.assertEqual(sliced_traj.GetDeltaTimesArray()[0], 0.)
+        self.assertAlmostEqual(sliced_traj.GetDuration(),
+                               numpy.linalg.norm(0.1 * numpy.ones(7)))
+
+    def test_Insert_Overwrite(self):
+        array_traj = ArrayTrajectory.FromTrajectory(self.CreatePath())
+        waypoint = array_traj.GetWaypoint(0)
+
+        array_traj.Insert(2, waypoint, overwrite=True)
+
+        self.assertEqual(array_traj.GetNumWaypoints(), 3)
+        numpy.testing.assert_array_almost_equal(
+            array_traj.GetWaypoint(2), waypoint)
+
+
+if __name__ == '__main__':
+    unittest.main()
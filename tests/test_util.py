@@ -382,6 +382,35 @@ class Tests(unittest.TestCase):
         else:
             pass # test passed
 
+    # GetLinearCollisionCheckSchedule()
+
+    def test_GetLinearCollisionCheckSchedule_SinglePointTraj(self):
+        q0 = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        traj = self.CreateTrajectory(q0, q0) # makes traj with 1 waypoint
+        times, configs = prpy.util.GetLinearCollisionCheckSchedule(
+            self.robot, traj, norm_order=2)
+        self.assertEqual(configs.shape, (1, 7))
+        numpy.testing.assert_array_almost_equal(configs[0], q0)
+
+    def test_GetLinearCollisionCheckSchedule_MatchesGenerator(self):
+        q0 = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        q1 = [0.1, 0.2, 0.3, 0.4, 0.3, 0.2, 0.1]
+        traj = self.CreateTrajectory(q0, q1)
+
+        for sampling_func in [None,
+                              prpy.util.SampleTimeGenerator,
+                              prpy.util.VanDerCorputSampleGenerator]:
+            checks = list(prpy.util.GetLinearCollisionCheckPts(
+                self.robot, traj, norm_order=2,
+                sampling_func=sampling_func))
+            times, configs = prpy.util.GetLinearCollisionCheckSchedule(
+                self.robot, traj, norm_order=2,
+                sampling_func=sampling_func)
+
+            self.assertIsNone(times)
+            numpy.testing.assert_array_almost_equal(
+                configs, numpy.array([q for _, q in checks]))
+
 
     # ConvertIntToBinaryString()
 
@@ -965,6 +994,97 @@ class Tests(unittest.TestCase):
         numpy.testing.assert_equal(result, True)
 
 
+    # SimplifyTrajectory()
+
+    def _CreatePath(self, configs, cspec):
+        traj = openravepy.RaveCreateTrajectory(self.env, '')
+        traj.Init(cspec)
+        for i, q in enumerate(configs):
+            waypoint = numpy.zeros(cspec.GetDOF())
+            cspec.InsertJointValues(waypoint, q, self.robot,
+                                    self.active_dof_indices, False)
+            traj.Insert(i, waypoint)
+        return traj
+
+    def test_SimplifyTrajectory_RemovesCollinearWaypoints(self):
+        q_corner = numpy.array([0.5, 0., 0., 0., 0., 0., 0.])
+        configs = numpy.vstack((
+            numpy.linspace(0., 1., 11)[:, None] * q_corner,
+            q_corner + numpy.linspace(0., 1., 11)[1:, None] * numpy.ones(7)))
+        cspec = self.robot.GetActiveConfigurationSpecification('linear')
+        traj = self._CreatePath(configs, cspec)
+
+        reduced_traj = prpy.util.SimplifyTrajectory(traj, self.robot)
+
+        self.assertEqual(reduced_traj.GetNumWaypoints(), 3)
+        numpy.testing.assert_array_almost_equal(
+            cspec.ExtractJointValues(reduced_traj.GetWaypoint(1), self.robot,
+                                     self.active_dof_indices, 0),
+            q_corner)
+
+    def test_SimplifyTrajectory_KeepsErrorWithinResolution(self):
+        random_state = numpy.random.RandomState(0)
+        configs = numpy.cumsum(
+            random_state.uniform(-1., 1., (50, 7)) * self.dof_resolutions,
+            axis=0)
+        cspec = self.robot.GetActiveConfigurationSpecification('linear')
+        traj = self._CreatePath(configs, cspec)
+
+        reduced_traj = prpy.util.SimplifyTrajectory(traj, self.robot)
+        reduced_configs = numpy.array([
+            cspec.ExtractJointValues(reduced_traj.GetWaypoint(i), self.robot,
+                                     self.active_dof_indices, 0)
+            for i in xrange(reduced_traj.GetNumWaypoints())])
+
+        self.assertLess(reduced_traj.GetNumWaypoints(), len(configs))
+
+        # Each reduced waypoint is one of the original waypoints; compare the
+        # original path to the reduced path at the same waypoint index.
+        indices = [numpy.flatnonzero(numpy.all(configs == q, axis=1))[0]
+                   for q in reduced_configs]
+        for dof in xrange(7):
+            interpolated = numpy.interp(numpy.arange(len(configs)), indices,
+                                        reduced_configs[:, dof])
+            errors = numpy.abs(interpolated - configs[:, dof])
+            self.assertTrue(numpy.all(
+                errors <= self.dof_resolutions[dof] + 1e-9))
+
+    def test_SimplifyTrajectory_PreservesTiming(self):
+        q_goal = numpy.array([1., 1., 0., 0., 0., 0., 0.])
+        configs = numpy.linspace(0., 1., 6)[:, None] * q_goal
+        delta_times = [0., 0.5, 0.5, 1., 1., 1.]
+
+        cspec = self.robot.GetActiveConfigurationSpecification('linear')
+        cspec.AddDeltaTimeGroup()
+        traj = self._CreatePath(configs, cspec)
+        for i, dt in enumerate(delta_times):
+            waypoint = traj.GetWaypoint(i)
+            cspec.InsertDeltaTime(waypoint, dt)
+            traj.Insert(i, waypoint, True)
+
+        reduced_traj = prpy.util.SimplifyTrajectory(traj, self.robot)
+
+        # The velocity changes at t = 1.0, so only that waypoint is kept.
+        self.assertEqual(reduced_traj.GetNumWaypoints(), 3)
+        self.assertAlmostEqual(reduced_traj.GetDuration(), traj.GetDuration())
+        self.assertAlmostEqual(
+            cspec.ExtractDeltaTime(reduced_traj.GetWaypoint(1)), 1.)
+        self.assertAlmostEqual(
+            cspec.ExtractDeltaTime(reduced_traj.GetWaypoint(2)), 3.)
+
+    def test_SimplifyTrajectory_RejectsNonlinearTimedTrajectory(self):
+        configs = numpy.zeros((3, 7))
+        cspec = self.robot.GetActiveConfigurationSpecification('quadratic')
+        cspec.AddDeltaTimeGroup()
+        traj = self._CreatePath(configs, cspec)
+        for i in xrange(1, 3):
+            waypoint = traj.GetWaypoint(i)
+            cspec.InsertDeltaTime(waypoint, 1.)
+            traj.Insert(i, waypoint, True)
+
+        with self.assertRaises(ValueError):
+            prpy.util.SimplifyTrajectory(traj, self.robot)
+
     # ComputeGeodesicUnitTiming()
 
     def test_ComputeGeodesicUnitTiming(self):
@@ -1138,6 +1258,26 @@ class Test_GetPointFrom(unittest.TestCase):
         list_result = prpy.util.GetPointFrom(list_coord)
         numpy.testing.assert_array_almost_equal(list_result, expected_coord)
 
+    # ComputeReachAABB()
+
+    def test_ComputeReachAABB_ContainsEndEffector(self):
+        with self.env:
+            reach_aabb = prpy.util.ComputeReachAABB(self.robot)
+            ee_position = self.manipulator.GetEndEffectorTransform()[0:3, 3]
+
+        self.assertTrue(numpy.all(
+            numpy.abs(ee_position - reach_aabb.pos()) <= reach_aabb.extents()))
+
+    def test_ComputeReachAABB_Padding(self):
+        with self.env:
+            reach_aabb = prpy.util.ComputeReachAABB(self.robot)
+            padded_aabb = prpy.util.ComputeReachAABB(self.robot, padding=0.5)
+
+        numpy.testing.assert_array_almost_equal(
+            padded_aabb.pos(), reach_aabb.pos())
+        numpy.testing.assert_array_almost_equal(
+            padded_aabb.extents(), reach_aabb.extents() + 0.5)
+
 
 if __name__ == '__main__':
     unittest.main()